@@ -0,0 +1,157 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Optional
+
+
+OUTPUT_DIR = os.getenv("OUTPUT_DIR", "output")
+ARTIFACT_MAX_BYTES = int(os.getenv("ARTIFACT_MAX_BYTES", str(2 * 1024 * 1024 * 1024)))
+ARTIFACT_MAX_AGE = float(os.getenv("ARTIFACT_MAX_AGE", str(7 * 24 * 3600)))  # seconds since last access
+ARTIFACT_GC_INTERVAL = float(os.getenv("ARTIFACT_GC_INTERVAL", "600"))
+# SQLite in WAL mode needs a local disk: keep the index out of OUTPUT_DIR, which may be a network share
+ARTIFACT_INDEX_PATH = os.getenv("ARTIFACT_INDEX_PATH", "cache/artifacts.sqlite")
+
+# bump when the rendering changes so that old decks are not served for new requests
+RENDERER_VERSION = "deck-v1"
+
+
+def content_hash(document: Dict[str, Any], kind: str = RENDERER_VERSION) -> str:
+    """Hash of the canonical JSON form of a document (key order and whitespace do not matter)."""
+    canonical = json.dumps(document, sort_keys=True, ensure_ascii=False, separators=(",", ":"))
+    return hashlib.sha256(f"{kind}\n{canonical}".encode("utf-8")).hexdigest()
+
+
+class ArtifactStore():
+    """
+    Content-addressed storage for generated files in the output directory. The
+    index (`index_path`, on local disk) maps content hashes to file names and
+    metadata so that identical requests reuse the existing file and name lookups
+    need no directory scan. When several hosts share the output directory each
+    keeps its own index; a file written by another host is adopted on lookup.
+    """
+
+    def __init__(self, root: str = OUTPUT_DIR, max_bytes: int = ARTIFACT_MAX_BYTES,
+                 max_age: float = ARTIFACT_MAX_AGE, gc_interval: float = ARTIFACT_GC_INTERVAL,
+                 index_path: str = ARTIFACT_INDEX_PATH):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.gc_interval = gc_interval
+        self.last_gc = 0.0
+        self.lock = threading.Lock()
+
+        os.makedirs(root, exist_ok=True)
+        if os.path.dirname(index_path):
+            os.makedirs(os.path.dirname(index_path), exist_ok=True)
+        self.conn = sqlite3.connect(index_path, timeout=30, check_same_thread=False, isolation_level=None)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS artifacts (
+                hash TEXT PRIMARY KEY,
+                filename TEXT NOT NULL UNIQUE,
+                size INTEGER NOT NULL,
+                created_at REAL NOT NULL,
+                accessed_at REAL NOT NULL,
+                metadata TEXT
+            )""")
+        self.conn.execute("CREATE INDEX IF NOT EXISTS artifacts_accessed ON artifacts(accessed_at)")
+
+    def path_for(self, digest: str, extension: str) -> str:
+        return os.path.join(self.root, f"{digest[:40]}{extension}")
+
+    def lookup(self, digest: str, extension: Optional[str] = None) -> Optional[str]:
+        """
+        Path of the stored artifact for `digest`, or None. Refreshes its access time.
+        With `extension`, an unindexed file at `path_for(digest, extension)` (written
+        by another host sharing the output directory) is registered and returned.
+        """
+        with self.lock:
+            row = self.conn.execute("SELECT filename FROM artifacts WHERE hash = ?", (digest,)).fetchone()
+            if row is None:
+                path = self.path_for(digest, extension) if extension else None
+                if path is None or not os.path.isfile(path):
+                    return None
+                now = time.time()
+                self.conn.execute(
+                    "INSERT OR REPLACE INTO artifacts (hash, filename, size, created_at, accessed_at, metadata) "
+                    "VALUES (?, ?, ?, ?, ?, ?)", (digest, os.path.basename(path), os.path.getsize(path), now, now, "{}"))
+                return path
+            path = os.path.join(self.root, row[0])
+            if not os.path.isfile(path):
+                self.conn.execute("DELETE FROM artifacts WHERE hash = ?", (digest,))
+                return None
+            self.conn.execute("UPDATE artifacts SET accessed_at = ? WHERE hash = ?", (time.time(), digest))
+            return path
+
+    def resolve(self, name: str) -> Optional[str]:
+        """Path for a file name (`<hash>.pptx`) or a bare hash prefix, via the index."""
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT hash, filename FROM artifacts WHERE filename = ? OR hash = ? OR substr(hash, 1, 40) = ?",
+                (name, name, name)).fetchone()
+            if row is None:
+                return None
+            self.conn.execute("UPDATE artifacts SET accessed_at = ? WHERE hash = ?", (time.time(), row[0]))
+        path = os.path.join(self.root, row[1])
+        return path if os.path.isfile(path) else None
+
+    def register(self, digest: str, path: str, metadata: Optional[Dict[str, Any]] = None):
+        now = time.time()
+        with self.lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO artifacts (hash, filename, size, created_at, accessed_at, metadata) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (digest, os.path.basename(path), os.path.getsize(path), now, now,
+                 json.dumps(metadata or {}, ensure_ascii=False)))
+        self.maybe_collect_garbage()
+
+    def maybe_collect_garbage(self):
+        if time.time() - self.last_gc >= self.gc_interval:
+            self.collect_garbage()
+
+    def collect_garbage(self) -> int:
+        """
+        Deletes artifacts not accessed for `max_age` seconds, then the least recently
+        accessed ones until the total size is below `max_bytes`. Returns the count removed.
+        """
+        now = time.time()
+        removed = []
+        with self.lock:
+            self.last_gc = now
+            rows = self.conn.execute(
+                "SELECT hash, filename, size, accessed_at FROM artifacts ORDER BY accessed_at ASC").fetchall()
+            total = sum(row[2] for row in rows)
+            for digest, filename, size, accessed_at in rows:
+                if accessed_at >= now - self.max_age and total <= self.max_bytes:
+                    break
+                removed.append((digest, filename))
+                total -= size
+            self.conn.executemany("DELETE FROM artifacts WHERE hash = ?", [(digest,) for digest, _ in removed])
+
+        for _, filename in removed:
+            try:
+                os.remove(os.path.join(self.root, filename))
+            except FileNotFoundError:
+                pass
+        return len(removed)
+
+    def stats(self) -> Dict[str, Any]:
+        with self.lock:
+            count, size = self.conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM artifacts").fetchone()
+        return {"artifacts": count, "size_bytes": size}
+
+
+_artifact_store = None
+_artifact_store_lock = threading.Lock()
+
+
+def get_artifact_store() -> ArtifactStore:
+    global _artifact_store
+    if _artifact_store is None:
+        with _artifact_store_lock:
+            if _artifact_store is None:
+                _artifact_store = ArtifactStore()
+    return _artifact_store
@@ -0,0 +1,15 @@
+"""Deterministic stand-ins used to run the pipeline without OpenAI, Serper or memento."""
+import os
+
+from bench.stub_server import start_stub_server, stub_environment
+
+
+def install_stub_environment(latency=0.0, llm_latency=0.0, rate_limiter=None):
+    """
+    Starts the stub server and points the process at it. Must run before `main`
+    (and the tool modules) are imported because they read their endpoints at import.
+    Returns (server, base_url).
+    """
+    server, base_url = start_stub_server(latency=latency, llm_latency=llm_latency, rate_limiter=rate_limiter)
+    os.environ.update(stub_environment(base_url))
+    return server, base_url
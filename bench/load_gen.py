@@ -0,0 +1,97 @@
+"""
+Opens N concurrent websocket sessions against server.py, sends one topic per
+session and measures end-to-end latency, time to first log and event rate.
+
+    python -m bench.load_gen --uri ws://localhost:6789 --sessions 20
+"""
+import argparse
+import asyncio
+import json
+import math
+import time
+
+
+def percentiles(values, points=(50, 95, 99)):
+    if not values:
+        return {f"p{point}": None for point in points}
+    ordered = sorted(values)
+    result = {}
+    for point in points:
+        index = min(len(ordered) - 1, max(0, math.ceil(point / 100 * len(ordered)) - 1))
+        result[f"p{point}"] = ordered[index]
+    return result
+
+
+async def run_session(uri, topic, timeout=300):
+    import websockets
+
+    started = time.perf_counter()
+    first_log = None
+    events = 0
+    status = "timeout"
+    async with websockets.connect(uri, max_size=None) as websocket:
+        await websocket.send(topic)
+        try:
+            while True:
+                remaining = timeout - (time.perf_counter() - started)
+                frame = await asyncio.wait_for(websocket.recv(), timeout=max(0.001, remaining))
+                if first_log is None:
+                    first_log = time.perf_counter() - started
+                if not isinstance(frame, str) or not frame.startswith("{"):
+                    continue
+                frame = json.loads(frame)
+                if frame.get("type") != "batch":
+                    continue
+                events += len(frame["events"])
+                types = {event["type"] for event in frame["events"]}
+                if "result" in types:
+                    status = "ok"
+                    break
+                if "error" in types:
+                    status = "error"
+                    break
+        except asyncio.TimeoutError:
+            pass
+    return {
+        "status": status,
+        "latency": time.perf_counter() - started,
+        "time_to_first_log": first_log,
+        "events": events,
+    }
+
+
+async def run_load(uri, sessions, topic="benchmark topic", timeout=300):
+    started = time.perf_counter()
+    results = await asyncio.gather(*[run_session(uri, f"{topic} {i}", timeout) for i in range(sessions)],
+                                   return_exceptions=True)
+    duration = time.perf_counter() - started
+    results = [result if isinstance(result, dict) else {"status": f"failed: {result}", "latency": None,
+                                                          "time_to_first_log": None, "events": 0}
+               for result in results]
+    return summarize(results, duration)
+
+
+def summarize(results, duration):
+    ok = [result for result in results if result["status"] == "ok"]
+    events = sum(result["events"] for result in results)
+    return {
+        "sessions": len(results),
+        "ok": len(ok),
+        "failed": len(results) - len(ok),
+        "duration": duration,
+        "latency": percentiles([result["latency"] for result in ok]),
+        "time_to_first_log": percentiles([result["time_to_first_log"] for result in results
+                                          if result["time_to_first_log"] is not None]),
+        "events": events,
+        "events_per_second": events / duration if duration else 0.0,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--uri", default="ws://localhost:6789")
+    parser.add_argument("--sessions", type=int, default=10)
+    parser.add_argument("--topic", default="benchmark topic")
+    parser.add_argument("--timeout", type=float, default=300)
+    args = parser.parse_args()
+    print(json.dumps(asyncio.run(run_load(args.uri, args.sessions, args.topic, args.timeout)), indent=2))
@@ -0,0 +1,226 @@
+"""
+Offline benchmark of the hot paths. Every remote dependency is replaced by the
+local stub server (bench/stub_server.py), so results are reproducible on a laptop.
+
+    python -m bench.run_bench                      # all scenarios
+    python -m bench.run_bench --scenarios tools,chain --runs 20
+    python -m bench.run_bench --scenarios server --sessions 50 --llm-latency 0.5
+
+Scenarios:
+    tools   SearchTools / CalculatorTools calls against the stub endpoints
+    crew    create_crew_from_json construction cost, fresh agents vs. pooled agent shells
+    chain   get_chain().invoke end to end (planner + crew), in process
+    server  server.py in a subprocess, driven by N concurrent websocket sessions
+    ratelimit  concurrent LLM calls against a stub that enforces --rpm/--tpm, with and
+               without the LLM scheduler holding the same limits (not in the default set,
+               it runs for about a minute: python -m bench.run_bench --scenarios ratelimit)
+"""
+import argparse
+import asyncio
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from bench.fakes import install_stub_environment
+from bench.load_gen import percentiles, run_load
+from bench.stub_server import CREW_PLAN, RateLimiter, start_stub_server, stub_environment
+
+
+def timed_runs(fn, runs):
+    latencies = []
+    peaks = []
+    for i in range(runs):
+        tracemalloc.start()
+        started = time.perf_counter()
+        fn(i)
+        latencies.append(time.perf_counter() - started)
+        peaks.append(tracemalloc.get_traced_memory()[1])
+        tracemalloc.stop()
+    total = sum(latencies)
+    return {
+        "runs": runs,
+        "latency": percentiles(latencies),
+        "ops_per_second": runs / total if total else 0.0,
+        "peak_memory_bytes": percentiles(peaks),
+    }
+
+
+def bench_tools(runs):
+    from calculator_tools import CalculatorTools
+    from search_tools import SearchTools
+
+    return {
+        "search_internet": timed_runs(lambda i: SearchTools.search_internet.run(f"query {i}"), runs),
+        "search_internal_documents": timed_runs(lambda i: SearchTools.search_internal_documents.run(f"query {i}"), runs),
+        "search_internet_repeated": timed_runs(lambda i: SearchTools.search_internet.run("query 0"), runs),
+        "calculate": timed_runs(lambda i: CalculatorTools.calculate.run(f"{i}*7+200/3"), runs),
+    }
+
+
+def bench_crew(runs):
+    from main import create_crew_from_json, release_crew
+
+    plan = json.dumps(CREW_PLAN, ensure_ascii=False)
+    return {
+        # crews are never released, so every run constructs new agents
+        "create_crew_from_json": timed_runs(lambda i: create_crew_from_json(plan), runs),
+        "create_crew_from_json_pooled": timed_runs(lambda i: release_crew(create_crew_from_json(plan)), runs),
+    }
+
+
+def bench_chain(runs):
+    from crew_factory import get_chain
+    from execution_context import ExecutionContext
+
+    def run(i):
+        return get_chain().invoke({"topic": f"benchmark topic {i}"}, config=ExecutionContext().to_config())
+
+    return {"chain": timed_runs(run, runs)}
+
+
+def bench_rate_limit(calls, sessions, rpm, tpm, llm_latency):
+    """
+    `calls` chat calls from `sessions` sessions at once (every fifth one a planner
+    call) against a stub that answers 429 beyond `rpm`/`tpm`. Without limits the
+    scheduler only pauses on 429s; with them, calls queue instead of being rejected.
+    """
+    from concurrent.futures import ThreadPoolExecutor
+
+    import crew_factory
+    import llm_scheduler
+    from langchain_core.messages import HumanMessage
+
+    results = {}
+    for name, limits in (("unscheduled", (0, 0)), ("scheduled", (rpm, tpm))):
+        limiter = RateLimiter(rpm, tpm)
+        server, base_url = start_stub_server(llm_latency=llm_latency, rate_limiter=limiter)
+        os.environ["OPENAI_API_BASE"] = os.environ["OPENAI_BASE_URL"] = f"{base_url}/v1"
+        crew_factory._openai_clients = None  # clients pointing at this run's stub
+        llm_scheduler._llm_scheduler = llm_scheduler.LLMCallScheduler(*limits)
+
+        def call(i):
+            priority = "planner" if i % 5 == 0 else "batch"
+            llm = crew_factory.make_llm("gpt-3.5-turbo", priority=priority, session_key=f"session-{i % sessions}")
+            started = time.perf_counter()
+            try:
+                llm.invoke([HumanMessage(content=f"rate limit call {i}")])
+                error = None
+            except Exception as e:
+                error = type(e).__name__
+            return priority, time.perf_counter() - started, error
+
+        with ThreadPoolExecutor(max_workers=calls) as executor:
+            outcomes = list(executor.map(call, range(calls)))
+        server.shutdown()
+
+        results[name] = {
+            "calls": calls,
+            "errors": sum(1 for _, _, error in outcomes if error),
+            "responses_429": limiter.rejected,
+            "latency": {priority: percentiles([latency for p, latency, _ in outcomes if p == priority])
+                        for priority in ("planner", "batch")},
+            "scheduler": llm_scheduler.get_llm_scheduler().stats(),
+        }
+    return results
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _rss_bytes(pid):
+    try:
+        with open(f"/proc/{pid}/status") as status:
+            for line in status:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return None
+
+
+def bench_server(sessions, base_url, timeout):
+    port = _free_port()
+    env = {**os.environ, **stub_environment(base_url), "SERVER_PORT": str(port)}
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    process = subprocess.Popen([sys.executable, "server.py"], cwd=root, env=env,
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        deadline = time.time() + 60
+        while time.time() < deadline:
+            try:
+                socket.create_connection(("127.0.0.1", port), timeout=1).close()
+                break
+            except OSError:
+                time.sleep(0.2)
+        else:
+            raise RuntimeError("server.py did not start listening")
+
+        rss_before = _rss_bytes(process.pid)
+        summary = asyncio.run(run_load(f"ws://127.0.0.1:{port}", sessions, timeout=timeout))
+        rss_after = _rss_bytes(process.pid)
+        if rss_before is not None and rss_after is not None:
+            summary["rss_bytes"] = rss_after
+            summary["memory_per_session_bytes"] = (rss_after - rss_before) / max(1, sessions)
+        return {"server": summary}
+    finally:
+        process.terminate()
+        process.wait(timeout=10)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scenarios", default="tools,crew,chain,server")
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--sessions", type=int, default=10)
+    parser.add_argument("--latency", type=float, default=0.05, help="stub search/retrieve latency in seconds")
+    parser.add_argument("--llm-latency", type=float, default=0.1, help="stub chat completion latency in seconds")
+    parser.add_argument("--timeout", type=float, default=300)
+    parser.add_argument("--calls", type=int, default=30, help="concurrent LLM calls of the ratelimit scenario")
+    parser.add_argument("--rpm", type=int, default=20, help="stub requests per minute for the ratelimit scenario")
+    parser.add_argument("--tpm", type=int, default=0, help="stub tokens per minute for the ratelimit scenario")
+    parser.add_argument("--output", help="also write the JSON report to this file")
+    args = parser.parse_args()
+
+    # isolate caches so every benchmark starts cold
+    cache_dir = tempfile.mkdtemp(prefix="bench-cache-")
+    os.environ.setdefault("SEARCH_CACHE_PATH", os.path.join(cache_dir, "search_cache.sqlite"))
+    os.environ.setdefault("CONFIG_CACHE_BACKEND", "none")
+
+    _, base_url = install_stub_environment(latency=args.latency, llm_latency=args.llm_latency)
+
+    scenarios = [scenario.strip() for scenario in args.scenarios.split(",") if scenario.strip()]
+    report = {"base_url": base_url, "scenarios": {}}
+    for scenario in scenarios:
+        started = time.perf_counter()
+        if scenario == "tools":
+            result = bench_tools(args.runs)
+        elif scenario == "crew":
+            result = bench_crew(args.runs)
+        elif scenario == "chain":
+            result = bench_chain(args.runs)
+        elif scenario == "server":
+            result = bench_server(args.sessions, base_url, args.timeout)
+        elif scenario == "ratelimit":
+            result = bench_rate_limit(args.calls, args.sessions, args.rpm, args.tpm, args.llm_latency)
+        else:
+            raise SystemExit(f"Unknown scenario: {scenario}")
+        report["scenarios"][scenario] = result
+        print(f"{scenario}: done in {time.perf_counter() - started:.2f}s", file=sys.stderr)
+
+    output = json.dumps(report, indent=2)
+    print(output)
+    if args.output:
+        with open(args.output, "w") as file:
+            file.write(output)
+
+
+if __name__ == "__main__":
+    main()
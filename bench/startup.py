@@ -0,0 +1,120 @@
+"""
+Cold-start cost of the server modules: wall time and resident memory of a fresh
+interpreter after importing each target, compared with a bare interpreter.
+
+    python -m bench.startup                         # all targets, 5 runs each
+    python -m bench.startup --targets server,main --runs 10
+    python -m bench.startup --importtime server     # slowest imports of one target (python -X importtime)
+
+Targets:
+    baseline     bare interpreter
+    server       `import server` (what runs before the websocket listens)
+    main         `import main`, tools registered but not imported
+    main_eager   `import main` plus every tool module, as main.py imported them before the tool registry
+    tools        every registered tool resolved
+    chain        get_chain() built (planner model, prompts, tools listed)
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+from bench.stub_server import stub_environment
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+TARGETS = {
+    "baseline": "",
+    "server": "import server",
+    "main": "import main",
+    "main_eager": "import main, calculator_tools, search_tools, powerpoint_tools",
+    "tools": "from tool_registry import tool_registry; [tool_registry[name] for name in tool_registry]",
+    "chain": "from crew_factory import get_chain; get_chain()",
+}
+
+# runs the target, then reports its own timing and memory as JSON on the last line
+PROBE = """
+import json, time
+started = time.perf_counter()
+{code}
+seconds = time.perf_counter() - started
+rss = None
+with open("/proc/self/status") as status:
+    for line in status:
+        if line.startswith("VmRSS:"):
+            rss = int(line.split()[1]) * 1024
+print(json.dumps({{"seconds": seconds, "rss_bytes": rss}}))
+"""
+
+
+def _environment():
+    # nothing is contacted at import; the stub endpoints only keep the OpenAI client from requiring a real key
+    return {**os.environ, **stub_environment("http://127.0.0.1:9"), "PYTHONDONTWRITEBYTECODE": "1"}
+
+
+def probe(code):
+    result = subprocess.run([sys.executable, "-c", PROBE.format(code=code)], cwd=ROOT, env=_environment(),
+                            capture_output=True, text=True, timeout=300)
+    if result.returncode != 0:
+        return {"error": (result.stderr.strip().splitlines() or ["failed"])[-1]}
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def bench_target(code, runs):
+    samples = [probe(code) for _ in range(runs)]
+    errors = [sample["error"] for sample in samples if "error" in sample]
+    if errors:
+        return {"error": errors[0]}
+    return {
+        "runs": runs,
+        "import_seconds": statistics.median(sample["seconds"] for sample in samples),
+        "rss_bytes": statistics.median(sample["rss_bytes"] or 0 for sample in samples),
+    }
+
+
+def import_times(code, top=20):
+    """Slowest modules (cumulative microseconds) from `python -X importtime`."""
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", code], cwd=ROOT, env=_environment(),
+                            capture_output=True, text=True, timeout=300)
+    rows = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        self_us, cumulative_us, module = [part.strip() for part in line.split(":", 1)[1].split("|")]
+        rows.append({"module": module.strip(), "cumulative_us": int(cumulative_us), "self_us": int(self_us)})
+    return sorted(rows, key=lambda row: row["cumulative_us"], reverse=True)[:top]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--targets", default=",".join(TARGETS))
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--importtime", metavar="TARGET", help="list the slowest imports of one target instead")
+    parser.add_argument("--output", help="also write the JSON report to this file")
+    args = parser.parse_args()
+
+    if args.importtime:
+        report = {"target": args.importtime, "imports": import_times(TARGETS[args.importtime])}
+    else:
+        report = {"targets": {}}
+        for name in [target.strip() for target in args.targets.split(",") if target.strip()]:
+            report["targets"][name] = bench_target(TARGETS[name], args.runs)
+            print(f"{name}: done", file=sys.stderr)
+        baseline = report["targets"].get("baseline")
+        if baseline and "error" not in baseline:
+            for name, result in report["targets"].items():
+                if "error" not in result:
+                    result["rss_over_baseline_bytes"] = result["rss_bytes"] - baseline["rss_bytes"]
+
+    output = json.dumps(report, indent=2)
+    print(output)
+    if args.output:
+        with open(args.output, "w") as file:
+            file.write(output)
+
+
+if __name__ == "__main__":
+    main()
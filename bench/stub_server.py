@@ -0,0 +1,237 @@
+"""
+Local stand-ins for every remote endpoint the crew talks to, so benchmarks run
+offline and deterministically:
+
+    POST /search, /news           Serper-shaped results
+    POST /retrieve                memento-shaped results
+    POST /v1/chat/completions     OpenAI-compatible chat (planner and ReAct agents, stream or not)
+
+    python -m bench.stub_server --port 8765 --latency 0.05 --llm-latency 0.2
+    python -m bench.stub_server --rpm 60 --tpm 40000   # answer 429 like a rate-limited account
+"""
+import argparse
+import hashlib
+import json
+import threading
+import time
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+PLANNER_MARKER = "configurations for an Agent framework called CrewAI"
+
+CREW_PLAN = {
+    "agents": [
+        {
+            "name": "Researcher",
+            "role": "Market Researcher",
+            "goal": "Collect facts about the topic",
+            "backstory": "A meticulous researcher.",
+            "tools": ["SearchTools.search_internet", "SearchTools.search_internal_documents"],
+        },
+        {
+            "name": "Analyst",
+            "role": "Financial Analyst",
+            "goal": "Estimate the business impact",
+            "backstory": "A seasoned analyst.",
+            "tools": ["CalculatorTools.calculate"],
+        },
+    ],
+    "tasks": [
+        {"name": "market_research", "description": "Research the market for the topic", "agent": "Researcher", "depends_on": []},
+        {"name": "internal_research", "description": "Search internal documents about the topic", "agent": "Researcher", "depends_on": []},
+        {"name": "roi", "description": "Estimate the ROI based on the research", "agent": "Analyst",
+         "depends_on": ["market_research", "internal_research"]},
+    ],
+}
+
+
+def _seed(text):
+    return int(hashlib.sha256(text.encode("utf-8")).hexdigest()[:8], 16)
+
+
+def serper_results(query, kind):
+    seed = _seed(query)
+    key = "news" if kind == "news" else "organic"
+    return {key: [{
+        "title": f"{query} result {i}",
+        "link": f"https://example.com/{seed % 1000}/{i}",
+        "snippet": f"Deterministic snippet {i} about {query}. " * 3,
+    } for i in range(8)]}
+
+
+def memento_results(query):
+    seed = _seed(query)
+    return [{
+        "node": {
+            "metadata": {"file_name": f"doc-{(seed + i) % 97}.pdf", "page_label": str(i + 1)},
+            "text": f"Internal passage {i} discussing {query}. " * 20,
+        },
+        "score": 1.0 - i / 10,
+    } for i in range(5)]
+
+
+def chat_reply(messages):
+    prompt = "\n".join(str(message.get("content", "")) for message in messages)
+    if PLANNER_MARKER in prompt:
+        return json.dumps(CREW_PLAN, ensure_ascii=False)
+    if "Observation:" not in prompt:
+        if "Search the internet" in prompt:
+            return 'Thought: I should look this up.\nAction: Search the internet\nAction Input: {"query": "benchmark topic"}'
+        if "Make a calculation" in prompt:
+            return 'Thought: I need to compute the ROI.\nAction: Make a calculation\nAction Input: {"operation": "1200*3/4"}'
+    return "Thought: I now know the final answer\nFinal Answer: " + ("Deterministic benchmark answer. " * 10).strip()
+
+
+def count_tokens(text):
+    return max(1, len(text) // 4)
+
+
+class RateLimiter():
+    """
+    Requests and tokens per minute over a sliding window, like a provider's account
+    limits. Used as the StubHandler `rate_limiter`; counts the calls it rejected.
+    """
+
+    def __init__(self, rpm=0, tpm=0, window=60.0):
+        self.rpm = rpm
+        self.tpm = tpm
+        self.window = window
+        self.calls = deque()  # (time, tokens)
+        self.tokens = 0
+        self.accepted = 0
+        self.rejected = 0
+        self.lock = threading.Lock()
+
+    def __call__(self, tokens):
+        with self.lock:
+            now = time.monotonic()
+            while self.calls and self.calls[0][0] <= now - self.window:
+                self.tokens -= self.calls.popleft()[1]
+            if (self.rpm and len(self.calls) + 1 > self.rpm) or (self.tpm and self.tokens + tokens > self.tpm):
+                self.rejected += 1
+                return False
+            self.calls.append((now, tokens))
+            self.tokens += tokens
+            self.accepted += 1
+            return True
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    latency = 0.0
+    llm_latency = 0.0
+    rate_limiter = None  # optional callable(tokens) -> bool, False answers 429
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status, body):
+        data = json.dumps(body, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        body = json.loads(self.rfile.read(length) or b"{}")
+
+        if self.path.endswith("/chat/completions"):
+            return self._chat(body)
+
+        time.sleep(self.latency)
+        if self.path.endswith("/search"):
+            return self._send_json(200, serper_results(body.get("q", ""), "search"))
+        if self.path.endswith("/news"):
+            return self._send_json(200, serper_results(body.get("q", ""), "news"))
+        if self.path.endswith("/retrieve"):
+            return self._send_json(200, memento_results(body.get("query", "")))
+        self._send_json(404, {"error": "not found"})
+
+    def _chat(self, body):
+        messages = body.get("messages", [])
+        reply = chat_reply(messages)
+        prompt_tokens = count_tokens(json.dumps(messages))
+        completion_tokens = count_tokens(reply)
+
+        if self.rate_limiter is not None and not self.rate_limiter(prompt_tokens + completion_tokens):
+            self.send_response(429)
+            self.send_header("Retry-After", "1")
+            self.send_header("Content-Type", "application/json")
+            data = b'{"error": {"message": "Rate limit reached", "type": "requests"}}'
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+            return
+
+        time.sleep(self.llm_latency)
+        model = body.get("model", "stub")
+        usage = {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+                 "total_tokens": prompt_tokens + completion_tokens}
+
+        if not body.get("stream"):
+            return self._send_json(200, {
+                "id": "chatcmpl-stub", "object": "chat.completion", "created": int(time.time()), "model": model,
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": reply}, "finish_reason": "stop"}],
+                "usage": usage,
+            })
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        words = reply.split(" ")
+        for i, word in enumerate(words):
+            delta = word if i == 0 else " " + word
+            chunk = {"id": "chatcmpl-stub", "object": "chat.completion.chunk", "created": int(time.time()), "model": model,
+                     "choices": [{"index": 0, "delta": {"content": delta}, "finish_reason": None}]}
+            self.wfile.write(f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n".encode("utf-8"))
+        final = {"id": "chatcmpl-stub", "object": "chat.completion.chunk", "created": int(time.time()), "model": model,
+                 "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}]}
+        self.wfile.write(f"data: {json.dumps(final)}\n\ndata: [DONE]\n\n".encode("utf-8"))
+        self.close_connection = True
+
+
+def start_stub_server(port=0, latency=0.0, llm_latency=0.0, rate_limiter=None):
+    """Starts the stub server on a daemon thread and returns (server, base_url)."""
+    handler = type("ConfiguredStubHandler", (StubHandler,), {
+        "latency": latency, "llm_latency": llm_latency, "rate_limiter": staticmethod(rate_limiter) if rate_limiter else None,
+    })
+    server = ThreadingHTTPServer(("127.0.0.1", port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+
+def stub_environment(base_url):
+    """Environment variables that point the tools and OpenAI clients at the stub server."""
+    return {
+        "OPENAI_API_KEY": "sk-stub",
+        "OPENAI_API_BASE": f"{base_url}/v1",
+        "OPENAI_BASE_URL": f"{base_url}/v1",
+        "SERPER_API_KEY": "stub",
+        "SERPER_URL": base_url,
+        "MEMENTO_URL": f"{base_url}/retrieve",
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.05, help="seconds added to search/retrieve calls")
+    parser.add_argument("--llm-latency", type=float, default=0.2, help="seconds added to chat completions")
+    parser.add_argument("--rpm", type=int, default=0, help="chat requests per minute before 429, 0 = unlimited")
+    parser.add_argument("--tpm", type=int, default=0, help="chat tokens per minute before 429, 0 = unlimited")
+    args = parser.parse_args()
+
+    rate_limiter = RateLimiter(args.rpm, args.tpm) if args.rpm or args.tpm else None
+    server, base_url = start_stub_server(args.port, args.latency, args.llm_latency, rate_limiter=rate_limiter)
+    print(f"Stub server listening on {base_url}")
+    for key, value in stub_environment(base_url).items():
+        print(f"export {key}={value}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
@@ -0,0 +1,184 @@
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
+
+
+class MemoryCacheBackend():
+    """In-process LRU cache with per-entry TTL. Values are strings."""
+
+    def __init__(self, max_entries: int = 1024, ttl: Optional[float] = None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.entries = OrderedDict()  # key -> (value, expires_at)
+        self.lock = threading.Lock()
+        self.evictions = 0
+
+    def get(self, key: str) -> Optional[str]:
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if expires_at is not None and expires_at < time.time():
+                del self.entries[key]
+                return None
+            self.entries.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: str, ttl: Optional[float] = None):
+        ttl = ttl if ttl is not None else self.ttl
+        expires_at = time.time() + ttl if ttl else None
+        with self.lock:
+            self.entries[key] = (value, expires_at)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+
+    def delete(self, key: str):
+        with self.lock:
+            self.entries.pop(key, None)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+    def __len__(self):
+        return len(self.entries)
+
+
+class SQLiteCacheBackend():
+    """
+    On-disk LRU cache with per-entry TTL, shared by every process that opens the
+    same file. Recency is tracked with an `accessed_at` column. The entry count
+    and value bytes are kept in a `<table>_totals` row by triggers, so writes and
+    stats never scan the table.
+    """
+
+    def __init__(self, path: str, table: str = "cache", max_entries: int = 10000, ttl: Optional[float] = None,
+                 max_bytes: Optional[int] = None):
+        self.path = path
+        self.table = table
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        self.evictions = 0
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.conn = sqlite3.connect(path, timeout=30, check_same_thread=False, isolation_level=None)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute(f"""
+            CREATE TABLE IF NOT EXISTS {table} (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL,
+                expires_at REAL,
+                accessed_at REAL NOT NULL
+            )""")
+        self.conn.execute(f"CREATE INDEX IF NOT EXISTS {table}_accessed ON {table}(accessed_at)")
+        self.conn.execute(f"CREATE INDEX IF NOT EXISTS {table}_expires ON {table}(expires_at)")
+        self._create_totals()
+
+    def _create_totals(self):
+        table = self.table
+        self.conn.execute("BEGIN IMMEDIATE")
+        try:
+            exists = self.conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?",
+                                       (f"{table}_totals",)).fetchone()
+            if exists is None:
+                # seeded from the rows already in the file, in the same transaction as the triggers
+                self.conn.execute(f"""
+                    CREATE TABLE {table}_totals (
+                        id INTEGER PRIMARY KEY CHECK (id = 0),
+                        entries INTEGER NOT NULL,
+                        bytes INTEGER NOT NULL
+                    )""")
+                self.conn.execute(f"INSERT INTO {table}_totals "
+                                  f"SELECT 0, COUNT(*), COALESCE(SUM(LENGTH(value)), 0) FROM {table}")
+                self.conn.execute(f"""
+                    CREATE TRIGGER {table}_totals_insert AFTER INSERT ON {table} BEGIN
+                        UPDATE {table}_totals SET entries = entries + 1, bytes = bytes + LENGTH(NEW.value);
+                    END""")
+                self.conn.execute(f"""
+                    CREATE TRIGGER {table}_totals_delete AFTER DELETE ON {table} BEGIN
+                        UPDATE {table}_totals SET entries = entries - 1, bytes = bytes - LENGTH(OLD.value);
+                    END""")
+                self.conn.execute(f"""
+                    CREATE TRIGGER {table}_totals_update AFTER UPDATE OF value ON {table} BEGIN
+                        UPDATE {table}_totals SET bytes = bytes + LENGTH(NEW.value) - LENGTH(OLD.value);
+                    END""")
+            self.conn.execute("COMMIT")
+        except BaseException:
+            self.conn.execute("ROLLBACK")
+            raise
+
+    def _totals(self):
+        return self.conn.execute(f"SELECT entries, bytes FROM {self.table}_totals").fetchone()
+
+    def get(self, key: str) -> Optional[str]:
+        now = time.time()
+        with self.lock:
+            row = self.conn.execute(
+                f"SELECT value, expires_at FROM {self.table} WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            value, expires_at = row
+            if expires_at is not None and expires_at < now:
+                self.conn.execute(f"DELETE FROM {self.table} WHERE key = ?", (key,))
+                return None
+            self.conn.execute(f"UPDATE {self.table} SET accessed_at = ? WHERE key = ?", (now, key))
+            return value
+
+    def set(self, key: str, value: str, ttl: Optional[float] = None):
+        ttl = ttl if ttl is not None else self.ttl
+        now = time.time()
+        expires_at = now + ttl if ttl else None
+        with self.lock:
+            # an upsert rather than INSERT OR REPLACE: REPLACE deletes without firing the delete trigger
+            self.conn.execute(
+                f"INSERT INTO {self.table} (key, value, expires_at, accessed_at) VALUES (?, ?, ?, ?) "
+                f"ON CONFLICT(key) DO UPDATE SET value = excluded.value, expires_at = excluded.expires_at, "
+                f"accessed_at = excluded.accessed_at",
+                (key, value, expires_at, now))
+            self._evict()
+
+    def _evict(self):
+        self.conn.execute(f"DELETE FROM {self.table} WHERE expires_at IS NOT NULL AND expires_at < ?", (time.time(),))
+        entries, total = self._totals()
+        overflow = entries - self.max_entries
+        if overflow <= 0 and not (self.max_bytes and total > self.max_bytes):
+            return
+        # least recently used first, through the accessed_at index, until both limits hold
+        victims = []
+        cursor = self.conn.execute(f"SELECT key, LENGTH(value) FROM {self.table} ORDER BY accessed_at ASC")
+        for key, size in cursor:
+            if overflow <= 0 and not (self.max_bytes and total > self.max_bytes):
+                break
+            victims.append((key,))
+            overflow -= 1
+            total -= size
+        cursor.close()
+        self.conn.executemany(f"DELETE FROM {self.table} WHERE key = ?", victims)
+        self.evictions += len(victims)
+
+    def delete(self, key: str):
+        with self.lock:
+            self.conn.execute(f"DELETE FROM {self.table} WHERE key = ?", (key,))
+
+    def clear(self):
+        with self.lock:
+            self.conn.execute(f"DELETE FROM {self.table}")
+
+    def __len__(self):
+        with self.lock:
+            return self._totals()[0]
+
+    def size_bytes(self) -> int:
+        with self.lock:
+            return self._totals()[1]
@@ -1,5 +1,24 @@
+import json
+
 from langchain.tools import tool
 
+from expression_engine import ExpressionError, evaluate, evaluate_batch
+
+
+def _split_batch(operation):
+  if isinstance(operation, (list, tuple)):
+    return [str(item) for item in operation]
+  text = str(operation).strip()
+  if text.startswith("["):
+    try:
+      items = json.loads(text)
+      if isinstance(items, list):
+        return [str(item) for item in items]
+    except ValueError:
+      pass
+  items = [item.strip() for item in text.replace(";", "\n").splitlines() if item.strip()]
+  return items if len(items) > 1 else None
+
 
 class CalculatorTools():
 
@@ -8,6 +27,16 @@ class CalculatorTools():
     """Useful to perform any mathematical calculations, 
     like sum, minus, multiplication, division, etc.
     The input to this tool should be a mathematical 
-    expression, a couple examples are `200*7` or `5000/2*10`
+    expression, a couple examples are `200*7` or `5000/2*10`.
+    Several expressions can be calculated at once by separating
+    them with `;` or passing a list, e.g. `1200*0.15; 1200*1.08**3`.
+    Supports + - * / // % ** ( ), pi, e and abs, round, min, max,
+    sum, sqrt, exp, ln, log, log10, floor, ceil, pow.
     """
-    return eval(operation)
+    batch = _split_batch(operation)
+    if batch is not None:
+      return '\n'.join(f"{expression} = {result}" for expression, result in zip(batch, evaluate_batch(batch)))
+    try:
+      return evaluate(operation)
+    except ExpressionError as e:
+      return f"Error: {e}"
@@ -0,0 +1,124 @@
+import hashlib
+import json
+import os
+import threading
+from typing import Any, Callable, Dict, List, Optional
+
+from cache_backends import SQLiteCacheBackend
+from tracing import record_cache
+
+
+CHECKPOINTS_ENABLED = os.getenv("CHECKPOINTS_ENABLED", "false").lower() == "true"
+CHECKPOINT_PATH = os.getenv("CHECKPOINT_PATH", "cache/checkpoints.sqlite")
+CHECKPOINT_MAX_ENTRIES = int(os.getenv("CHECKPOINT_MAX_ENTRIES", "20000"))
+CHECKPOINT_MAX_BYTES = int(os.getenv("CHECKPOINT_MAX_BYTES", str(256 * 1024 * 1024)))
+CHECKPOINT_TTL = float(os.getenv("CHECKPOINT_TTL", str(24 * 3600)))
+
+# bump when task execution changes in a way that invalidates stored outputs
+CHECKPOINT_VERSION = "task-v1"
+
+
+def agent_definition(agent: Any) -> Dict[str, Any]:
+    """What an agent contributes to a task's output: its persona, tools and model."""
+    llm = getattr(agent, "llm", None)
+    return {
+        "role": agent.role,
+        "goal": agent.goal,
+        "backstory": agent.backstory,
+        "tools": sorted(tool.name for tool in agent.tools or []),
+        "model": getattr(llm, "model_name", None) or getattr(llm, "model", None),
+    }
+
+
+def task_checkpoint_key(task: Any, upstream_outputs: List[Any], scope: str) -> str:
+    data = {
+        "version": CHECKPOINT_VERSION,
+        "scope": scope,
+        "description": task.description,
+        "expected_output": getattr(task, "expected_output", None),
+        "agent": agent_definition(task.agent) if task.agent is not None else None,
+        "upstream": [str(output) for output in upstream_outputs],
+    }
+    canonical = json.dumps(data, sort_keys=True, ensure_ascii=False, separators=(",", ":"))
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+class CheckpointStore():
+    """
+    Outputs of finished crew tasks, keyed by a scope (the session), the task
+    description, the assigned agent's definition and the outputs of the task's
+    upstream tasks. A rerun of the same plan in the same scope (retry after a
+    failure, a requeued job, or a plan with one task changed) skips every task
+    whose key is unchanged; a changed task gets a new key, and so does every task
+    downstream of it once its output differs. Other sessions never see the outputs.
+    """
+
+    def __init__(self, backend: SQLiteCacheBackend):
+        self.backend = backend
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[str]:
+        value = self.backend.get(key)
+        with self.lock:
+            if value is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        record_cache("task_checkpoint", value is not None)
+        return value
+
+    def set(self, key: str, output: str):
+        self.backend.set(key, output)
+
+    def for_crew(self, crew: Any, scope: str,
+                 on_restore: Optional[Callable[[Any, str], None]] = None) -> "TaskCheckpoints":
+        return TaskCheckpoints(self, crew.tasks, scope, on_restore)
+
+    def stats(self) -> Dict[str, Any]:
+        with self.lock:
+            hits, misses = self.hits, self.misses
+        return {"hits": hits, "misses": misses, "entries": len(self.backend),
+                "size_bytes": self.backend.size_bytes(), "evictions": self.backend.evictions}
+
+
+class TaskCheckpoints():
+    """Checkpoint lookups for the tasks of one crew run (see `dag_executor.run_crew_graph`)."""
+
+    def __init__(self, store: CheckpointStore, tasks: List[Any], scope: str,
+                 on_restore: Optional[Callable[[Any, str], None]] = None):
+        self.store = store
+        self.tasks = tasks
+        self.scope = scope
+        self.on_restore = on_restore
+        self.restored: List[int] = []
+
+    def restore(self, i: int, upstream_outputs: List[Any]) -> Optional[str]:
+        output = self.store.get(task_checkpoint_key(self.tasks[i], upstream_outputs, self.scope))
+        if output is not None:
+            self.restored.append(i)
+            if self.on_restore is not None:
+                self.on_restore(self.tasks[i], output)
+        return output
+
+    def save(self, i: int, upstream_outputs: List[Any], output: Any):
+        if output:
+            self.store.set(task_checkpoint_key(self.tasks[i], upstream_outputs, self.scope), str(output))
+
+
+_checkpoint_store = None
+_checkpoint_store_lock = threading.Lock()
+
+
+def get_checkpoint_store() -> Optional[CheckpointStore]:
+    """Process-wide checkpoint store, opened on first use (None when CHECKPOINTS_ENABLED is false)."""
+    global _checkpoint_store
+    if _checkpoint_store is None and CHECKPOINTS_ENABLED:
+        with _checkpoint_store_lock:
+            if _checkpoint_store is None:
+                backend = SQLiteCacheBackend(CHECKPOINT_PATH, table="task_checkpoints",
+                                             max_entries=CHECKPOINT_MAX_ENTRIES, max_bytes=CHECKPOINT_MAX_BYTES,
+                                             ttl=CHECKPOINT_TTL or None)
+                _checkpoint_store = CheckpointStore(backend)
+    return _checkpoint_store
@@ -0,0 +1,102 @@
+import hashlib
+import json
+import os
+import re
+import threading
+import unicodedata
+from typing import Any, Dict, Optional
+
+from cache_backends import MemoryCacheBackend, SQLiteCacheBackend
+from tracing import record_cache
+
+
+CONFIG_CACHE_BACKEND = os.getenv("CONFIG_CACHE_BACKEND", "memory")  # memory | sqlite | none
+CONFIG_CACHE_PATH = os.getenv("CONFIG_CACHE_PATH", "cache/config_cache.sqlite")
+CONFIG_CACHE_TTL = float(os.getenv("CONFIG_CACHE_TTL", "86400"))
+CONFIG_CACHE_MAX_ENTRIES = int(os.getenv("CONFIG_CACHE_MAX_ENTRIES", "1024"))
+
+
+def normalize_topic(topic: str) -> str:
+    """Normalizes trivial differences (width, case, whitespace, trailing punctuation) of a topic."""
+    topic = unicodedata.normalize("NFKC", topic).casefold()
+    topic = re.sub(r"\s+", " ", topic).strip()
+    return topic.rstrip(" .!?。")
+
+
+class ConfigCache():
+    """
+    Caches planner output (the CrewAI JSON config) by normalized topic and prompt
+    template hash, so repeated topics skip the planner LLM call.
+    """
+
+    def __init__(self, backend: Any, prompt_template: str):
+        self.backend = backend
+        self.template_hash = hashlib.sha256(prompt_template.encode("utf-8")).hexdigest()[:16]
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    def key(self, topic: str) -> str:
+        digest = hashlib.sha256(normalize_topic(topic).encode("utf-8")).hexdigest()
+        return f"{self.template_hash}:{digest}"
+
+    def get(self, topic: str) -> Optional[str]:
+        crew_config = self.backend.get(self.key(topic)) if self.backend is not None else None
+        with self.lock:
+            if crew_config is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        record_cache("config", crew_config is not None)
+        return crew_config
+
+    def set(self, topic: str, crew_config: str):
+        if self.backend is None:
+            return
+        try:
+            json.loads(crew_config)
+        except (TypeError, ValueError):
+            return  # never cache a config that cannot be executed
+        self.backend.set(self.key(topic), crew_config)
+
+    def stats(self) -> Dict[str, Any]:
+        with self.lock:
+            hits, misses = self.hits, self.misses
+        return {
+            "hits": hits,
+            "misses": misses,
+            "hit_ratio": hits / (hits + misses) if hits + misses else 0.0,
+            "entries": len(self.backend) if self.backend is not None else 0,
+            "evictions": getattr(self.backend, "evictions", 0),
+        }
+
+    def wrap(self, planner):
+        """Returns a runnable that serves `planner` results from the cache when possible."""
+        from langchain.schema.runnable import RunnableLambda
+
+        def plan(inputs, config):
+            crew_config = self.get(inputs["topic"])
+            if crew_config is None:
+                crew_config = planner.invoke(inputs, config=config)
+                self.set(inputs["topic"], crew_config)
+            return crew_config
+
+        async def aplan(inputs, config):
+            crew_config = self.get(inputs["topic"])
+            if crew_config is None:
+                crew_config = await planner.ainvoke(inputs, config=config)
+                self.set(inputs["topic"], crew_config)
+            return crew_config
+
+        return RunnableLambda(plan, afunc=aplan, name="cached_planner")
+
+
+def create_config_cache(prompt_template: str, backend: str = CONFIG_CACHE_BACKEND) -> ConfigCache:
+    if backend == "sqlite":
+        cache_backend = SQLiteCacheBackend(CONFIG_CACHE_PATH, table="crew_configs",
+                                           max_entries=CONFIG_CACHE_MAX_ENTRIES, ttl=CONFIG_CACHE_TTL)
+    elif backend == "memory":
+        cache_backend = MemoryCacheBackend(max_entries=CONFIG_CACHE_MAX_ENTRIES, ttl=CONFIG_CACHE_TTL)
+    else:
+        cache_backend = None
+    return ConfigCache(cache_backend, prompt_template)
@@ -0,0 +1,154 @@
+import os
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+from http_client import HTTP_CONNECT_TIMEOUT
+from tracing import metrics
+
+
+AGENT_MODEL_NAME = os.getenv("OPENAI_MODEL_NAME", "gpt-4")  # same default as CrewAI
+LLM_POOL_SIZE = int(os.getenv("LLM_POOL_SIZE", "32"))
+LLM_TIMEOUT = float(os.getenv("LLM_TIMEOUT", "120"))
+AGENT_POOL_MAX_PER_KEY = int(os.getenv("AGENT_POOL_MAX_PER_KEY", "4"))
+AGENT_POOL_MAX_KEYS = int(os.getenv("AGENT_POOL_MAX_KEYS", "128"))
+
+
+# ---- chain ---------------------------------------------------------------------------------
+
+_chain = None
+_chain_lock = threading.Lock()
+
+
+def get_chain():
+    """
+    The planner/crew chain, built once per process. The chain holds no per-request
+    state: callbacks and session data travel in the invoke config.
+    """
+    global _chain
+    if _chain is None:
+        with _chain_lock:
+            if _chain is None:
+                from main import create_chain
+                _chain = create_chain()
+    return _chain
+
+
+# ---- LLM clients ---------------------------------------------------------------------------
+
+_openai_clients = None
+_openai_clients_lock = threading.Lock()
+
+
+def shared_openai_clients() -> Tuple[Any, Any]:
+    """
+    Chat completion clients shared by every ChatOpenAI instance of the process.
+    A new ChatOpenAI otherwise creates its own OpenAI/AsyncOpenAI clients, each with
+    a fresh connection pool and TLS context.
+    """
+    global _openai_clients
+    if _openai_clients is None:
+        with _openai_clients_lock:
+            if _openai_clients is None:
+                import httpx
+                import openai
+
+                base_url = os.getenv("OPENAI_API_BASE") or os.getenv("OPENAI_BASE_URL") or None
+                limits = httpx.Limits(max_connections=LLM_POOL_SIZE, max_keepalive_connections=LLM_POOL_SIZE)
+                timeout = httpx.Timeout(LLM_TIMEOUT, connect=HTTP_CONNECT_TIMEOUT)
+                client = openai.OpenAI(base_url=base_url, timeout=timeout,
+                                       http_client=httpx.Client(limits=limits, timeout=timeout))
+                # the server invokes the chain synchronously from worker threads; the async
+                # client is only used by ainvoke and is created with openai's defaults
+                async_client = openai.AsyncOpenAI(base_url=base_url, timeout=timeout)
+                _openai_clients = (client.chat.completions, async_client.chat.completions)
+    return _openai_clients
+
+
+def make_llm(model_name: str = AGENT_MODEL_NAME, streaming: bool = False, callbacks: Optional[List[Any]] = None,
+             priority: str = "interactive", session_key: Optional[str] = None, **kwargs: Any):
+    """
+    A ChatOpenAI that reuses the shared clients; cheap enough to create per agent and
+    request. Its calls queue in the process-wide LLM scheduler under `priority`
+    (llm_scheduler.PRIORITIES) and take turns with the other sessions' calls.
+    """
+    from llm_cache import get_llm_cache
+    from llm_scheduler import ScheduledChatOpenAI
+
+    get_llm_cache()  # installs the global LLM cache when LLM_CACHE_MODE is set
+    client, async_client = shared_openai_clients()
+    llm = ScheduledChatOpenAI(model=model_name, streaming=streaming, callbacks=list(callbacks or []),
+                              client=client, async_client=async_client, **kwargs)
+    # set after construction so that they stay out of the serialized model (the LLM cache key)
+    llm.priority = priority
+    llm.session_key = session_key
+    return llm
+
+
+# ---- agent shells --------------------------------------------------------------------------
+
+def agent_pool_key(agent_data: Dict[str, Any]) -> Tuple[str, Tuple[str, ...]]:
+    return agent_data["role"], tuple(sorted(agent_data.get("tools") or []))
+
+
+class AgentPool():
+    """
+    Idle agent objects keyed by role and tool set. An agent taken from the pool is
+    reset by the caller for the new crew, which skips pydantic validation and the
+    tool/LLM wiring of a fresh construction. Agents must be released only after the
+    crew that used them has finished.
+    """
+
+    def __init__(self, max_per_key: int = AGENT_POOL_MAX_PER_KEY, max_keys: int = AGENT_POOL_MAX_KEYS):
+        self.max_per_key = max_per_key
+        self.max_keys = max_keys
+        self.idle: "OrderedDict[Tuple, List[Any]]" = OrderedDict()
+        self.keys: Dict[int, Tuple] = {}  # id(agent) -> pool key of agents handed out
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    def acquire(self, agent_data: Dict[str, Any], build: Callable[[], Any], reset: Callable[[Any], None]) -> Any:
+        key = agent_pool_key(agent_data)
+        agent = None
+        with self.lock:
+            shells = self.idle.get(key)
+            if shells:
+                agent = shells.pop()
+                self.hits += 1
+            else:
+                self.misses += 1
+        metrics.inc("crew_agent_pool_total", help="Agent pool lookups", result="hit" if agent else "miss")
+
+        if agent is None:
+            agent = build()
+        else:
+            reset(agent)
+        with self.lock:
+            self.keys[id(agent)] = key
+        return agent
+
+    def release(self, agents: Iterable[Any]):
+        with self.lock:
+            for agent in agents:
+                key = self.keys.pop(id(agent), None)
+                if key is None:
+                    continue  # not from this pool (or released twice)
+                shells = self.idle.setdefault(key, [])
+                self.idle.move_to_end(key)
+                if len(shells) < self.max_per_key:
+                    shells.append(agent)
+            while len(self.idle) > self.max_keys:
+                self.idle.popitem(last=False)
+
+    def stats(self) -> Dict[str, Any]:
+        with self.lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "idle": sum(len(shells) for shells in self.idle.values()),
+                "in_use": len(self.keys),
+            }
+
+
+agent_pool = AgentPool()
@@ -0,0 +1,239 @@
+import json
+import os
+import re
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Any, Dict, FrozenSet, Iterable, List, Tuple
+
+from dag_executor import parse_task_dependencies
+from tracing import metrics
+
+
+CREW_PLAN_MAX_REASKS = int(os.getenv("CREW_PLAN_MAX_REASKS", "2"))
+
+AGENT_FIELDS = ("name", "role", "goal", "backstory")
+CODE_FENCE = re.compile(r"```[a-zA-Z]*\s*(.*?)```", re.S)
+
+
+class CrewPlanError(ValueError):
+    """The planner output cannot be turned into a crew. `errors` lists every problem found."""
+
+    def __init__(self, errors: List[str]):
+        super().__init__("Invalid crew configuration:\n" + "\n".join(f"- {error}" for error in errors))
+        self.errors = errors
+
+
+@dataclass(frozen=True)
+class AgentSpec:
+    name: str
+    role: str
+    goal: str
+    backstory: str
+    tools: Tuple[str, ...]
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"name": self.name, "role": self.role, "goal": self.goal,
+                "backstory": self.backstory, "tools": list(self.tools)}
+
+
+@dataclass(frozen=True)
+class TaskSpec:
+    name: str
+    description: str
+    agent: str
+    depends_on: Tuple[int, ...]  # upstream task indexes
+
+
+@dataclass(frozen=True)
+class CrewPlan:
+    """Validated, immutable crew configuration. Safe to cache and share between runs."""
+    agents: Tuple[AgentSpec, ...]
+    tasks: Tuple[TaskSpec, ...]
+    parallel: bool  # the planner declared `depends_on`; otherwise tasks run sequentially
+
+    def agents_data(self) -> List[Dict[str, Any]]:
+        return [agent.to_dict() for agent in self.agents]
+
+    def dependencies(self) -> List[List[int]]:
+        return [list(task.depends_on) for task in self.tasks]
+
+    def to_dict(self) -> Dict[str, Any]:
+        tasks = []
+        for task in self.tasks:
+            task_data = {"name": task.name, "description": task.description, "agent": task.agent}
+            if self.parallel:
+                task_data["depends_on"] = [self.tasks[j].name for j in task.depends_on]
+            tasks.append(task_data)
+        return {"agents": self.agents_data(), "tasks": tasks}
+
+    def to_json(self) -> str:
+        """Canonical JSON; compiling it again yields an equal plan."""
+        return json.dumps(self.to_dict(), ensure_ascii=False)
+
+
+def repair_json(text: str) -> str:
+    """
+    Fixes the JSON defects LLMs commonly produce: surrounding prose or code fences,
+    single-quoted strings and trailing commas. Raw newlines inside strings are left
+    to `json.loads(strict=False)`.
+    """
+    fenced = CODE_FENCE.search(text)
+    if fenced:
+        text = fenced.group(1)
+    start, end = text.find("{"), text.rfind("}")
+    if start != -1 and end > start:
+        text = text[start:end + 1]
+
+    out = []
+    i, n = 0, len(text)
+    while i < n:
+        c = text[i]
+        if c in "\"'":
+            j = i + 1
+            chars = []
+            while j < n and text[j] != c:
+                if text[j] == "\\" and j + 1 < n:
+                    chars.append("'" if text[j + 1] == "'" else text[j:j + 2])
+                    j += 2
+                    continue
+                chars.append('\\"' if text[j] == '"' else text[j])
+                j += 1
+            out.append('"' + "".join(chars) + '"')
+            i = j + 1
+            continue
+        if c == ",":
+            k = i + 1
+            while k < n and text[k].isspace():
+                k += 1
+            if k < n and text[k] in "}]":
+                i += 1  # trailing comma
+                continue
+        out.append(c)
+        i += 1
+    return "".join(out)
+
+
+def load_plan_json(text: str) -> Any:
+    try:
+        return json.loads(text, strict=False)
+    except ValueError:
+        pass
+    try:
+        return json.loads(repair_json(text), strict=False)
+    except ValueError as e:
+        raise CrewPlanError([f"The output is not valid JSON ({e})"])
+
+
+def _as_list(value: Any) -> List[Any]:
+    if value is None:
+        return []
+    return value if isinstance(value, list) else [value]
+
+
+def validate_plan(data: Any, tool_names: Iterable[str]) -> CrewPlan:
+    tool_names = set(tool_names)
+    errors = []
+
+    if not isinstance(data, dict):
+        raise CrewPlanError(["The configuration must be a JSON object with 'agents' and 'tasks'"])
+    agents_data, tasks_data = data.get("agents"), data.get("tasks")
+    if not isinstance(agents_data, list) or not agents_data:
+        errors.append("'agents' must be a non-empty list")
+        agents_data = []
+    if not isinstance(tasks_data, list) or not tasks_data:
+        errors.append("'tasks' must be a non-empty list")
+        tasks_data = []
+
+    agents = []
+    name_by_alias = {}
+    for i, agent_data in enumerate(agents_data):
+        if not isinstance(agent_data, dict):
+            errors.append(f"agents[{i}] must be an object")
+            continue
+        missing = [field for field in AGENT_FIELDS
+                   if not isinstance(agent_data.get(field), str) or not agent_data[field].strip()]
+        if missing:
+            errors.append(f"agents[{i}] is missing {', '.join(missing)}")
+            continue
+        tools = _as_list(agent_data.get("tools"))
+        unknown = [tool for tool in tools if not isinstance(tool, str) or tool not in tool_names]
+        if unknown:
+            errors.append(f"agent '{agent_data['name']}' uses unknown tools {unknown}; "
+                          f"available tools: {sorted(tool_names)}")
+        if agent_data["name"] in name_by_alias:
+            errors.append(f"agent name '{agent_data['name']}' is used more than once")
+        name_by_alias[agent_data["name"]] = agent_data["name"]
+        name_by_alias.setdefault(agent_data["role"], agent_data["name"])  # tasks sometimes refer to the role
+        agents.append(AgentSpec(agent_data["name"], agent_data["role"], agent_data["goal"],
+                                agent_data["backstory"],
+                                tuple(dict.fromkeys(tool for tool in tools if isinstance(tool, str)))))
+
+    tasks = []
+    task_names = set()
+    for i, task_data in enumerate(tasks_data):
+        if not isinstance(task_data, dict):
+            errors.append(f"tasks[{i}] must be an object")
+            continue
+        name = task_data.get("name") or f"task_{i}"
+        if name in task_names:
+            errors.append(f"task name '{name}' is used more than once")
+        task_names.add(name)
+        description = task_data.get("description")
+        if not isinstance(description, str) or not description.strip():
+            errors.append(f"task '{name}' has no description")
+        agent = task_data.get("agent")
+        agent_name = name_by_alias.get(agent) if isinstance(agent, str) else None
+        if agent_name is None:
+            errors.append(f"task '{name}' is assigned to unknown agent '{agent}'; "
+                          f"agents: {[spec.name for spec in agents]}")
+        tasks.append(TaskSpec(name, description or "", agent_name or "", ()))
+
+    parallel = any(isinstance(task_data, dict) and "depends_on" in task_data for task_data in tasks_data)
+    if parallel and not errors:
+        normalized = {"tasks": [dict(task_data, name=task.name) for task_data, task in zip(tasks_data, tasks)]}
+        try:
+            dependencies = parse_task_dependencies(normalized)
+        except ValueError as e:
+            errors.append(f"invalid depends_on: {e}")
+        else:
+            tasks = [TaskSpec(task.name, task.description, task.agent, tuple(upstream))
+                     for task, upstream in zip(tasks, dependencies)]
+
+    if errors:
+        raise CrewPlanError(errors)
+    return CrewPlan(tuple(agents), tuple(tasks), parallel)
+
+
+@lru_cache(maxsize=256)
+def _compile_plan(text: str, tool_names: FrozenSet[str]) -> CrewPlan:
+    return validate_plan(load_plan_json(text), tool_names)
+
+
+def compile_plan(text: str, tool_names: Iterable[str]) -> CrewPlan:
+    """Parses, repairs and validates planner output. Compiled plans are memoized by text."""
+    return _compile_plan(text, frozenset(tool_names))
+
+
+def reasking_planner(planner, reask, tool_names: Iterable[str], max_reasks: int = CREW_PLAN_MAX_REASKS):
+    """
+    Returns a runnable producing the canonical JSON of a valid plan. When the output of
+    `planner` does not compile, `reask` is invoked with `topic`, `output` (the rejected
+    configuration) and `errors`, up to `max_reasks` times.
+    """
+    from langchain.schema.runnable import RunnableLambda
+
+    tool_names = frozenset(tool_names)
+
+    def plan(inputs, config):
+        output = planner.invoke(inputs, config=config)
+        for attempt in range(max_reasks + 1):
+            try:
+                return compile_plan(output, tool_names).to_json()
+            except CrewPlanError as e:
+                metrics.inc("crew_plan_errors_total", help="Planner outputs rejected by validation")
+                if attempt == max_reasks:
+                    raise
+                output = reask.invoke({"topic": inputs["topic"], "output": output,
+                                       "errors": "\n".join(f"- {error}" for error in e.errors)}, config=config)
+
+    return RunnableLambda(plan, name="validated_planner")
@@ -0,0 +1,162 @@
+import os
+import threading
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Any, Callable, Dict, List, Optional
+
+
+MAX_PARALLEL_TASKS = int(os.getenv("MAX_PARALLEL_TASKS", "4"))
+
+
+def has_task_dependencies(data: Dict[str, Any]) -> bool:
+    """True when the planner output declares `depends_on` on any task."""
+    return any("depends_on" in task_data for task_data in data.get("tasks", []))
+
+
+def parse_task_dependencies(data: Dict[str, Any]) -> List[List[int]]:
+    """
+    Resolves the optional per-task `depends_on` lists of the planner output into
+    task indexes. A dependency may be given as a task name or as a task index.
+    """
+    tasks = data.get("tasks", [])
+    index_by_name = {task_data["name"]: i for i, task_data in enumerate(tasks) if task_data.get("name")}
+
+    dependencies = []
+    for i, task_data in enumerate(tasks):
+        depends_on = task_data.get("depends_on") or []
+        if isinstance(depends_on, (str, int)):
+            depends_on = [depends_on]
+
+        upstream = []
+        for ref in depends_on:
+            if isinstance(ref, int) or (isinstance(ref, str) and ref.isdigit() and ref not in index_by_name):
+                j = int(ref)
+            elif ref in index_by_name:
+                j = index_by_name[ref]
+            else:
+                raise ValueError(f"Task {i} depends on unknown task: {ref}")
+            if j == i or not 0 <= j < len(tasks):
+                raise ValueError(f"Task {i} has an invalid dependency: {ref}")
+            if j not in upstream:
+                upstream.append(j)
+        dependencies.append(upstream)
+
+    check_acyclic(dependencies)
+    return dependencies
+
+
+def sequential_dependencies(count: int) -> List[List[int]]:
+    """Dependencies that reproduce the classic sequential process."""
+    return [[i - 1] if i > 0 else [] for i in range(count)]
+
+
+def check_acyclic(dependencies: List[List[int]]):
+    remaining = {i: set(upstream) for i, upstream in enumerate(dependencies)}
+    while remaining:
+        ready = [i for i, upstream in remaining.items() if not upstream]
+        if not ready:
+            raise ValueError(f"Task dependencies contain a cycle: {sorted(remaining)}")
+        for i in ready:
+            del remaining[i]
+        for upstream in remaining.values():
+            upstream.difference_update(ready)
+
+
+def run_task_graph(dependencies: List[List[int]],
+                   run_node: Callable[[int, List[Any]], Any],
+                   max_workers: int = MAX_PARALLEL_TASKS) -> List[Any]:
+    """
+    Executes nodes `0..n-1` as soon as all of their upstream nodes finished, with at
+    most `max_workers` nodes in flight. `run_node(i, upstream_outputs)` receives the
+    outputs of its dependencies in declaration order. Returns outputs by node index.
+    The first failing node stops scheduling and its exception is re-raised.
+    """
+    count = len(dependencies)
+    outputs: List[Optional[Any]] = [None] * count
+    done = set()
+    started = set()
+
+    with ThreadPoolExecutor(max_workers=max(1, max_workers), thread_name_prefix="task") as executor:
+        in_flight = {}
+        while len(done) < count:
+            for i in range(count):
+                if i not in started and all(j in done for j in dependencies[i]):
+                    started.add(i)
+                    upstream_outputs = [outputs[j] for j in dependencies[i]]
+                    in_flight[executor.submit(run_node, i, upstream_outputs)] = i
+
+            finished, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in finished:
+                i = in_flight.pop(future)
+                error = future.exception()
+                if error is not None:
+                    for pending in in_flight:
+                        pending.cancel()
+                    raise error
+                outputs[i] = future.result()
+                done.add(i)
+
+    return outputs
+
+
+def sink_nodes(dependencies: List[List[int]]) -> List[int]:
+    """Nodes no other node depends on, in declaration order."""
+    used = {j for upstream in dependencies for j in upstream}
+    return [i for i in range(len(dependencies)) if i not in used]
+
+
+def run_crew_graph(crew, dependencies: List[List[int]], max_workers: int = MAX_PARALLEL_TASKS,
+                   checkpoints: Optional[Any] = None) -> str:
+    """
+    Runs the tasks of a CrewAI `Crew` following `dependencies` instead of the strict
+    sequential process. Independent tasks execute concurrently and receive the raw
+    outputs of their upstream tasks as context; tasks assigned to the same agent are
+    serialized because an agent's executor is not thread-safe. Delegation is off when
+    tasks run concurrently: a delegated call would run another agent's executor
+    outside that agent's lock, and waiting for its lock instead could deadlock two
+    agents delegating to each other. With `checkpoints`
+    (checkpoint_store.TaskCheckpoints) a task whose inputs are unchanged since an
+    earlier run is restored instead of executed, and every finished task is saved.
+    """
+    from crewai.utilities import I18N
+
+    # mirrors the agent setup Crew.kickoff() performs before running its process. Not mirrored:
+    # kickoff's input interpolation (kickoff(inputs=...) placeholders in task descriptions) and
+    # its task callbacks (crew.task_callback assigned to tasks without one); callers of this path
+    # pass neither.
+    i18n = I18N(prompt_file=crew.prompt_file)
+    for agent in crew.agents:
+        agent.i18n = i18n
+        agent.crew = crew
+        if not agent.function_calling_llm:
+            agent.function_calling_llm = crew.function_calling_llm
+            agent.create_agent_executor()
+        if not agent.step_callback and crew.step_callback:
+            agent.step_callback = crew.step_callback
+            agent.create_agent_executor()
+
+    agent_locks = {id(agent): threading.Lock() for agent in crew.agents}
+    delegation = max_workers <= 1
+    tasks = crew.tasks
+
+    def run_node(i, upstream_outputs):
+        if checkpoints is not None:
+            output = checkpoints.restore(i, upstream_outputs)
+            if output is not None:
+                return output
+        output = execute_task(i, upstream_outputs)
+        if checkpoints is not None:
+            checkpoints.save(i, upstream_outputs, output)
+        return output
+
+    def execute_task(i, upstream_outputs):
+        task = tasks[i]
+        if delegation and task.agent is not None and task.agent.allow_delegation:
+            agents_for_delegation = [agent for agent in crew.agents if agent != task.agent]
+            if agents_for_delegation:
+                task.tools += task.agent.get_delegation_tools(agents_for_delegation)
+        context = "\n".join(str(output) for output in upstream_outputs if output)
+        with agent_locks.get(id(task.agent), threading.Lock()):
+            return task.execute(context=context)
+
+    outputs = run_task_graph(dependencies, run_node, max_workers=max_workers)
+    return "\n\n".join(str(outputs[i]) for i in sink_nodes(dependencies))
@@ -0,0 +1,173 @@
+import asyncio
+import json
+import os
+import time
+from collections import deque
+from typing import Any, Dict, List, Optional
+
+from tracing import record_payload, record_span
+
+
+EVENT_FLUSH_INTERVAL = float(os.getenv("EVENT_FLUSH_INTERVAL", "0.05"))  # seconds
+EVENT_FLUSH_MAX_EVENTS = int(os.getenv("EVENT_FLUSH_MAX_EVENTS", "50"))
+EVENT_FLUSH_MAX_BYTES = int(os.getenv("EVENT_FLUSH_MAX_BYTES", str(64 * 1024)))
+EVENT_MAX_CONTENT_CHARS = int(os.getenv("EVENT_MAX_CONTENT_CHARS", "4000"))
+EVENT_LARGE_CONTENT_MODE = os.getenv("EVENT_LARGE_CONTENT_MODE", "truncate")  # truncate | chunk
+EVENT_BUFFER_MAX_EVENTS = int(os.getenv("EVENT_BUFFER_MAX_EVENTS", "1000"))
+
+# events that are never dropped for slow clients
+PRESERVED_EVENT_TYPES = {"chain_end", "error", "result", "cancelled"}
+# the last event of a run
+FINAL_EVENT_TYPES = {"result", "error", "cancelled"}
+
+
+def make_event(type: str, content: Any = None, agent: Optional[str] = None, tool: Optional[str] = None,
+               **extra: Any) -> Dict[str, Any]:
+    event = {"type": type, "ts": time.time()}
+    if agent is not None:
+        event["agent"] = agent
+    if tool is not None:
+        event["tool"] = tool
+    if content is not None:
+        event["content"] = content if isinstance(content, str) else str(content)
+    event.update({key: value for key, value in extra.items() if value is not None})
+    return event
+
+
+def split_large_event(event: Dict[str, Any], max_chars: int = EVENT_MAX_CONTENT_CHARS,
+                      mode: str = EVENT_LARGE_CONTENT_MODE) -> List[Dict[str, Any]]:
+    """Truncates, or chunks into `part`/`parts` events, an event whose content is too large."""
+    content = event.get("content")
+    if content is None or len(content) <= max_chars:
+        return [event]
+    if mode == "chunk":
+        parts = (len(content) + max_chars - 1) // max_chars
+        return [{**event, "content": content[i * max_chars:(i + 1) * max_chars], "part": i + 1, "parts": parts}
+                for i in range(parts)]
+    return [{**event, "content": content[:max_chars], "truncated": len(content) - max_chars}]
+
+
+class EventStream():
+    """
+    Per-session outbound buffer. Events are emitted from any thread and coalesced
+    into JSON frames `{"type": "batch", "events": [...]}` that are flushed every
+    `flush_interval` seconds or as soon as `max_events`/`max_bytes` is reached.
+
+    Sending never blocks the emitter: when the client reads slower than events are
+    produced the buffer fills up and the oldest droppable events are discarded.
+    """
+
+    def __init__(self, websocket, session_id: Any = None,
+                 flush_interval: float = EVENT_FLUSH_INTERVAL,
+                 max_events: int = EVENT_FLUSH_MAX_EVENTS,
+                 max_bytes: int = EVENT_FLUSH_MAX_BYTES,
+                 buffer_max_events: int = EVENT_BUFFER_MAX_EVENTS):
+        self.websocket = websocket
+        self.session_id = session_id
+        self.loop = asyncio.get_running_loop()
+        self.flush_interval = flush_interval
+        self.max_events = max_events
+        self.max_bytes = max_bytes
+        self.buffer_max_events = buffer_max_events
+        self.buffer = deque()
+        self.buffered_bytes = 0
+        self.dropped = 0
+        self.sent_frames = 0
+        self.sent_events = 0
+        self.wakeup = asyncio.Event()
+        self.closed = False
+        self.task = None
+
+    def start(self):
+        self.task = asyncio.create_task(self.run())
+        return self
+
+    def emit(self, event: Dict[str, Any]):
+        """Thread-safe; may be called from worker threads or temporary event loops."""
+        try:
+            running_loop = asyncio.get_running_loop()
+        except RuntimeError:
+            running_loop = None
+        if running_loop is self.loop:
+            self._enqueue(event)
+        elif not self.loop.is_closed():
+            self.loop.call_soon_threadsafe(self._enqueue, event)
+
+    def _enqueue(self, event: Dict[str, Any]):
+        if self.closed:
+            return
+        for part in split_large_event(event):
+            size = len(part.get("content") or "")
+            self.buffer.append((part, size))
+            self.buffered_bytes += size
+        while len(self.buffer) > self.buffer_max_events and self._drop_oldest():
+            pass
+        if len(self.buffer) >= self.max_events or self.buffered_bytes >= self.max_bytes:
+            self.wakeup.set()
+
+    def _drop_oldest(self) -> bool:
+        for i, (event, size) in enumerate(self.buffer):
+            if event["type"] not in PRESERVED_EVENT_TYPES:
+                del self.buffer[i]
+                self.buffered_bytes -= size
+                self.dropped += 1
+                return True
+        return False
+
+    def _take_frame(self) -> Optional[str]:
+        if not self.buffer and not self.dropped:
+            return None
+        events = []
+        size = 0
+        while self.buffer and len(events) < self.max_events and (not events or size < self.max_bytes):
+            event, event_size = self.buffer.popleft()
+            self.buffered_bytes -= event_size
+            size += event_size
+            events.append(event)
+        frame = {"type": "batch", "events": events}
+        if self.dropped:
+            frame["dropped"] = self.dropped
+            self.dropped = 0
+        self.sent_events += len(events)
+        return json.dumps(frame, ensure_ascii=False, default=str)
+
+    async def flush(self):
+        while True:
+            frame = self._take_frame()
+            if frame is None:
+                return
+            started = time.perf_counter()
+            await self.websocket.send(frame)
+            record_span("ws_send", time.perf_counter() - started, self.session_id, bytes=len(frame))
+            record_payload("ws_frame", len(frame))
+            self.sent_frames += 1
+
+    async def run(self):
+        try:
+            while not self.closed:
+                try:
+                    await asyncio.wait_for(self.wakeup.wait(), timeout=self.flush_interval)
+                except asyncio.TimeoutError:
+                    pass
+                self.wakeup.clear()
+                await self.flush()
+        except Exception as e:
+            # the client went away; stop buffering for it
+            print(f"Event stream stopped: {str(e)}")
+            self.closed = True
+            self.buffer.clear()
+
+    async def close(self):
+        if self.closed:
+            return
+        self.closed = True
+        self.wakeup.set()
+        if self.task is not None:
+            try:
+                await self.task
+            except Exception:
+                pass
+        try:
+            await self.flush()
+        except Exception:
+            pass
@@ -0,0 +1,230 @@
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
+
+from langchain.callbacks.base import BaseCallbackHandler
+
+
+RUN_MAX_TOOL_CALLS = int(os.getenv("RUN_MAX_TOOL_CALLS", "0"))  # 0 = unlimited
+RUN_MAX_LLM_TOKENS = int(os.getenv("RUN_MAX_LLM_TOKENS", "0"))   # 0 = unlimited
+RUN_TIMEOUT = float(os.getenv("RUN_TIMEOUT", "900"))  # seconds from submission, 0 = no deadline
+CANCEL_POLL_INTERVAL = 0.25
+
+CONFIG_KEY = "execution_context"
+
+
+class RunCancelled(Exception):
+    pass
+
+
+class BudgetExceeded(RunCancelled):
+    pass
+
+
+class CancelToken():
+    """
+    Cooperative cancellation with an optional deadline. Set once when a run must
+    stop (disconnect, superseded, deadline); checked between agent steps, on LLM
+    callbacks, before tool calls and while waiting on I/O.
+    """
+
+    def __init__(self, timeout: Optional[float] = None):
+        self.event = threading.Event()
+        self.reason: Optional[str] = None
+        self.deadline = time.monotonic() + timeout if timeout else None
+
+    def cancel(self, reason: str = "cancelled"):
+        if not self.event.is_set():
+            self.reason = reason
+            self.event.set()
+
+    @property
+    def cancelled(self) -> bool:
+        if not self.event.is_set() and self.deadline is not None and time.monotonic() >= self.deadline:
+            self.cancel("deadline exceeded")
+        return self.event.is_set()
+
+    def remaining(self) -> Optional[float]:
+        """Seconds until the deadline (None without one); 0 once cancelled."""
+        if self.cancelled:
+            return 0.0
+        return None if self.deadline is None else max(0.0, self.deadline - time.monotonic())
+
+    def cap_timeout(self, timeout: Optional[float]) -> Optional[float]:
+        """`timeout` shortened to the time left before the deadline."""
+        remaining = self.remaining()
+        if remaining is None:
+            return timeout
+        return remaining if timeout is None else min(timeout, remaining)
+
+    def raise_if_cancelled(self):
+        if self.cancelled:
+            raise RunCancelled(f"Run cancelled: {self.reason}")
+
+
+_current_token: ContextVar[Optional[CancelToken]] = ContextVar("cancel_token", default=None)
+
+
+def current_cancel_token() -> Optional[CancelToken]:
+    """Token of the tool call running in this thread, if any (see `bind_tool`)."""
+    return _current_token.get()
+
+
+@contextmanager
+def active_cancel_token(token: CancelToken):
+    reset = _current_token.set(token)
+    try:
+        yield token
+    finally:
+        _current_token.reset(reset)
+
+
+def wait_future(future: Future, token: Optional[CancelToken] = None) -> Any:
+    """`future.result()` that gives up with RunCancelled as soon as `token` is cancelled."""
+    token = token or current_cancel_token()
+    if token is None:
+        return future.result()
+    while True:
+        token.raise_if_cancelled()
+        try:
+            return future.result(timeout=token.cap_timeout(CANCEL_POLL_INTERVAL))
+        except FutureTimeoutError:
+            pass
+
+
+class CancellationCallbackHandler(BaseCallbackHandler):
+    """Aborts LLM calls (also mid-stream) and tool runs of a cancelled run."""
+
+    raise_error = True  # let RunCancelled propagate instead of being logged by the callback manager
+
+    def __init__(self, token: CancelToken):
+        self.token = token
+
+    def on_llm_start(self, serialized: Dict[str, Any], prompts: Any, **kwargs: Any) -> Any:
+        self.token.raise_if_cancelled()
+
+    def on_chat_model_start(self, serialized: Dict[str, Any], messages: Any, **kwargs: Any) -> Any:
+        self.token.raise_if_cancelled()
+
+    def on_llm_new_token(self, token: str, **kwargs: Any) -> Any:
+        self.token.raise_if_cancelled()
+
+    def on_tool_start(self, serialized: Dict[str, Any], input_str: str, **kwargs: Any) -> Any:
+        self.token.raise_if_cancelled()
+
+
+class Budget():
+    """Per-run limits on tool calls and LLM tokens (0 disables a limit)."""
+
+    def __init__(self, max_tool_calls: int = RUN_MAX_TOOL_CALLS, max_llm_tokens: int = RUN_MAX_LLM_TOKENS):
+        self.max_tool_calls = max_tool_calls
+        self.max_llm_tokens = max_llm_tokens
+        self.tool_calls = 0
+        self.llm_tokens = 0
+        self.lock = threading.Lock()
+
+    def charge_tool_call(self):
+        with self.lock:
+            self.tool_calls += 1
+            if self.max_tool_calls and self.tool_calls > self.max_tool_calls:
+                raise BudgetExceeded(f"Tool call budget of {self.max_tool_calls} exceeded")
+            if self.max_llm_tokens and self.llm_tokens > self.max_llm_tokens:
+                raise BudgetExceeded(f"LLM token budget of {self.max_llm_tokens} exceeded")
+
+    def charge_tokens(self, tokens: int):
+        with self.lock:
+            self.llm_tokens += tokens
+
+    def stats(self) -> Dict[str, int]:
+        with self.lock:
+            return {"tool_calls": self.tool_calls, "llm_tokens": self.llm_tokens}
+
+
+@dataclass(eq=False)  # compared and hashed by identity
+class ExecutionContext:
+    """
+    Everything one chain run needs besides its input: the session it reports to,
+    the websocket callback handler, budgets and the cancel token.
+    It travels explicitly in `config["configurable"]["execution_context"]` and is
+    handed to agents and tools, so concurrent runs never share per-session state.
+    """
+    session_id: Any = None
+    callback_handler: Any = None  # websocket_callbacks.WebSocketCallbackHandler, None outside the server
+    budget: Budget = field(default_factory=Budget)
+    cancel_token: CancelToken = field(default_factory=lambda: CancelToken(timeout=RUN_TIMEOUT))
+    run_id: str = field(default_factory=lambda: uuid.uuid4().hex)
+    cancel_handler: CancellationCallbackHandler = field(init=False, repr=False)
+
+    def __post_init__(self):
+        self.cancel_handler = CancellationCallbackHandler(self.cancel_token)
+
+    def cancel(self, reason: str = "cancelled"):
+        self.cancel_token.cancel(reason)
+
+    def check_step(self, *args: Any):
+        """CrewAI `step_callback`: stops the agent loop between steps of a cancelled run."""
+        self.cancel_token.raise_if_cancelled()
+
+    async def send_log(self, message: Any, **kwargs: Any):
+        if self.callback_handler is not None:
+            await self.callback_handler.send_log(message, **kwargs)
+
+    def log(self, message: Any, **kwargs: Any):
+        """`send_log` for synchronous code (crew worker threads); the event is only buffered."""
+        if self.callback_handler is not None:
+            self.callback_handler.emit_log(message, **kwargs)
+
+    def to_config(self, callbacks: Optional[List[Any]] = None) -> Dict[str, Any]:
+        """A runnable config carrying this context (and the given callbacks)."""
+        if callbacks is None:
+            callbacks = [self.callback_handler] if self.callback_handler is not None else []
+        return {"callbacks": [*callbacks, self.cancel_handler], "configurable": {CONFIG_KEY: self},
+                "metadata": {"session_id": self.session_id}}
+
+
+def get_execution_context(config: Optional[Dict[str, Any]]) -> ExecutionContext:
+    """The context of the run `config` belongs to; a fresh one for runs started without it."""
+    context = ((config or {}).get("configurable") or {}).get(CONFIG_KEY)
+    return context if context is not None else ExecutionContext()
+
+
+def bind_tools(tools: List[Any], context: ExecutionContext) -> List[Any]:
+    """
+    Per-agent copies of the shared tool objects whose calls are checked against the
+    run's cancel token and budget. While a tool runs its token is active, so HTTP
+    timeouts and waits inside the tool are capped by the run's deadline.
+    """
+    return [bind_tool(tool, context) for tool in tools]
+
+
+def bind_tool(tool: Any, context: ExecutionContext) -> Any:
+    def check():
+        context.cancel_token.raise_if_cancelled()
+        context.budget.charge_tool_call()
+
+    update = {}
+    if getattr(tool, "func", None) is not None:
+        func = tool.func
+
+        def bound_func(*args, **kwargs):
+            check()
+            with active_cancel_token(context.cancel_token):
+                return func(*args, **kwargs)
+
+        update["func"] = bound_func
+    if getattr(tool, "coroutine", None) is not None:
+        coroutine = tool.coroutine
+
+        async def bound_coroutine(*args, **kwargs):
+            check()
+            with active_cancel_token(context.cancel_token):
+                return await coroutine(*args, **kwargs)
+
+        update["coroutine"] = bound_coroutine
+    return tool.copy(update=update) if update else tool
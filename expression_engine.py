@@ -0,0 +1,197 @@
+import ast
+import decimal
+import os
+import re
+from decimal import Decimal
+from functools import lru_cache
+from typing import Any, Callable, Dict, Iterable, List
+
+
+EXPR_PRECISION = int(os.getenv("EXPR_PRECISION", "28"))           # significant digits
+EXPR_MAX_EXPONENT = int(os.getenv("EXPR_MAX_EXPONENT", "1000"))   # largest |b| in a ** b
+EXPR_MAX_MAGNITUDE = int(os.getenv("EXPR_MAX_MAGNITUDE", "1000"))  # largest decimal exponent of any value
+EXPR_MAX_STEPS = int(os.getenv("EXPR_MAX_STEPS", "10000"))        # evaluated nodes per expression
+EXPR_MAX_LENGTH = int(os.getenv("EXPR_MAX_LENGTH", "2000"))       # characters per expression
+EXPR_CACHE_SIZE = int(os.getenv("EXPR_CACHE_SIZE", "4096"))
+
+
+class ExpressionError(ValueError):
+    pass
+
+
+def _context() -> decimal.Context:
+    return decimal.Context(
+        prec=EXPR_PRECISION, rounding=decimal.ROUND_HALF_EVEN,
+        Emax=EXPR_MAX_MAGNITUDE, Emin=-EXPR_MAX_MAGNITUDE,
+        traps=[decimal.InvalidOperation, decimal.DivisionByZero, decimal.Overflow],
+    )
+
+
+def _integer(value: Decimal, what: str) -> int:
+    if value != value.to_integral_value():
+        raise ExpressionError(f"{what} must be an integer")
+    return int(value)
+
+
+def _round(value: Decimal, digits: Decimal = Decimal(0)) -> Decimal:
+    digits = _integer(digits, "round() digits")
+    if abs(digits) > EXPR_PRECISION:
+        raise ExpressionError(f"round() digits must be within ±{EXPR_PRECISION}")
+    return value.quantize(Decimal(1).scaleb(-digits), rounding=decimal.ROUND_HALF_UP)
+
+
+def _log(value: Decimal, base: Decimal = None) -> Decimal:
+    return value.ln() if base is None else value.ln() / base.ln()
+
+
+def _power(base: Decimal, exponent: Decimal) -> Decimal:
+    if abs(exponent) > EXPR_MAX_EXPONENT:
+        raise ExpressionError(f"Exponent {exponent} exceeds the limit of {EXPR_MAX_EXPONENT}")
+    return base ** exponent
+
+
+FUNCTIONS: Dict[str, Callable[..., Decimal]] = {
+    "abs": abs,
+    "round": _round,
+    "min": min,
+    "max": max,
+    "sum": lambda *values: sum(values, Decimal(0)),
+    "sqrt": lambda value: value.sqrt(),
+    "exp": lambda value: value.exp(),
+    "ln": lambda value: value.ln(),
+    "log": _log,
+    "log10": lambda value: value.log10(),
+    "floor": lambda value: value.to_integral_value(rounding=decimal.ROUND_FLOOR),
+    "ceil": lambda value: value.to_integral_value(rounding=decimal.ROUND_CEILING),
+    "pow": _power,
+}
+
+CONSTANTS: Dict[str, Decimal] = {
+    "pi": Decimal("3.141592653589793238462643383279502884197"),
+    "e": Decimal("2.718281828459045235360287471352662497757"),
+}
+
+BINARY_OPERATORS: Dict[type, Callable[[Decimal, Decimal], Decimal]] = {
+    ast.Add: lambda a, b: a + b,
+    ast.Sub: lambda a, b: a - b,
+    ast.Mult: lambda a, b: a * b,
+    ast.Div: lambda a, b: a / b,
+    ast.FloorDiv: lambda a, b: a // b,
+    ast.Mod: lambda a, b: a % b,
+    ast.Pow: _power,
+}
+
+UNARY_OPERATORS: Dict[type, Callable[[Decimal], Decimal]] = {
+    ast.UAdd: lambda a: +a,
+    ast.USub: lambda a: -a,
+}
+
+# notation LLMs use that Python does not (`^` would be XOR)
+_REWRITES = [("^", "**"), ("×", "*"), ("÷", "/"), ("−", "-")]
+_THOUSANDS = re.compile(r"(?<=\d),(?=\d{3}(?!\d))")
+
+
+def normalize(expression: str) -> str:
+    text = str(expression).strip().strip("`").strip()
+    if text.endswith("="):
+        text = text[:-1].rstrip()
+    for old, new in _REWRITES:
+        text = text.replace(old, new)
+    # 1,200,000 -> 1200000 unless the commas separate function arguments
+    if "(" not in text:
+        text = _THOUSANDS.sub("", text)
+    return text
+
+
+class _Evaluator():
+    """Walks a parsed expression with a step budget; every value is a Decimal."""
+
+    def __init__(self, source: str):
+        self.source = source
+        self.steps = 0
+
+    def eval(self, node: ast.AST) -> Decimal:
+        self.steps += 1
+        if self.steps > EXPR_MAX_STEPS:
+            raise ExpressionError(f"Expression exceeds the limit of {EXPR_MAX_STEPS} evaluation steps")
+
+        if isinstance(node, ast.Expression):
+            return self.eval(node.body)
+        if isinstance(node, ast.Constant):
+            if isinstance(node.value, bool) or not isinstance(node.value, (int, float)):
+                raise ExpressionError(f"Unsupported literal: {node.value!r}")
+            # parse the literal text, not the float Python made of it (0.1 stays exactly 0.1)
+            return Decimal(ast.get_source_segment(self.source, node).replace("_", ""))
+        if isinstance(node, ast.BinOp) and type(node.op) in BINARY_OPERATORS:
+            return BINARY_OPERATORS[type(node.op)](self.eval(node.left), self.eval(node.right))
+        if isinstance(node, ast.UnaryOp) and type(node.op) in UNARY_OPERATORS:
+            return UNARY_OPERATORS[type(node.op)](self.eval(node.operand))
+        if isinstance(node, ast.Name):
+            if node.id not in CONSTANTS:
+                raise ExpressionError(f"Unknown name: {node.id}")
+            return +CONSTANTS[node.id]
+        if isinstance(node, ast.Call) and isinstance(node.func, ast.Name) and not node.keywords:
+            function = FUNCTIONS.get(node.func.id)
+            if function is None:
+                raise ExpressionError(f"Unknown function: {node.func.id}")
+            try:
+                return function(*[self.eval(arg) for arg in node.args])
+            except (TypeError, ValueError):
+                raise ExpressionError(f"Wrong number of arguments for {node.func.id}()")
+        raise ExpressionError(f"Unsupported syntax: {ast.dump(node)[:80]}")
+
+
+def format_number(value: Decimal) -> str:
+    if value.is_zero():
+        return "0"
+    value = value.normalize(_context())
+    if abs(value.adjusted()) > EXPR_PRECISION:
+        return str(value)  # scientific notation instead of hundreds of zeros
+    return f"{value:f}"
+
+
+@lru_cache(maxsize=EXPR_CACHE_SIZE)
+def _evaluate(text: str) -> str:
+    if len(text) > EXPR_MAX_LENGTH:
+        raise ExpressionError(f"Expression is longer than {EXPR_MAX_LENGTH} characters")
+    try:
+        tree = ast.parse(text, mode="eval")
+    except (SyntaxError, ValueError) as e:
+        raise ExpressionError(f"Invalid expression: {e.msg if isinstance(e, SyntaxError) else e}")
+    try:
+        with decimal.localcontext(_context()):
+            return format_number(_Evaluator(text).eval(tree))
+    except decimal.DivisionByZero:
+        raise ExpressionError("Division by zero")
+    except decimal.Overflow:
+        raise ExpressionError(f"Result exceeds 1e{EXPR_MAX_MAGNITUDE}")
+    except decimal.InvalidOperation:
+        raise ExpressionError("Invalid operation (e.g. log or sqrt of a negative number, 0/0)")
+    except RecursionError:
+        raise ExpressionError("Expression is nested too deeply")
+
+
+def evaluate(expression: str) -> str:
+    """
+    Evaluates an arithmetic expression with Decimal precision and returns the result
+    as text. Only numbers, + - * / // % ** (or ^), parentheses, CONSTANTS and
+    FUNCTIONS are accepted; anything else raises ExpressionError. Results are
+    memoized by normalized expression.
+    """
+    return _evaluate(normalize(expression))
+
+
+def evaluate_batch(expressions: Iterable[str]) -> List[str]:
+    """Evaluates each expression; failures become "Error: ..." entries instead of raising."""
+    results = []
+    for expression in expressions:
+        try:
+            results.append(evaluate(expression))
+        except ExpressionError as e:
+            results.append(f"Error: {e}")
+    return results
+
+
+def cache_info() -> Dict[str, Any]:
+    info = _evaluate.cache_info()
+    return {"hits": info.hits, "misses": info.misses, "size": info.currsize, "max_size": info.maxsize}
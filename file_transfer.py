@@ -0,0 +1,158 @@
+import asyncio
+import hashlib
+import json
+import os
+import re
+import threading
+from collections import OrderedDict
+from typing import Optional, Tuple
+
+import websockets
+
+from artifact_store import get_artifact_store
+
+
+OUTPUT_DIR = os.getenv("OUTPUT_DIR", "output")
+FILE_CHUNK_SIZE = int(os.getenv("FILE_CHUNK_SIZE", str(256 * 1024)))
+
+SAFE_FILENAME = re.compile(r"^[A-Za-z0-9][A-Za-z0-9._-]{0,254}$")
+RANGE_PATTERN = re.compile(r"^(\d+)-(\d*)$")
+
+
+class FileTransferError(Exception):
+    pass
+
+
+def parse_file_request(request: str) -> Tuple[str, Optional[Tuple[int, Optional[int]]]]:
+    """
+    Parses the part after `request_file:`, i.e. `<name>` or `<name>:<start>-<end>`
+    where the byte range is inclusive and `<end>` may be omitted to read to EOF.
+    """
+    name, _, byte_range = request.strip().partition(":")
+    if not byte_range:
+        return name, None
+    match = RANGE_PATTERN.match(byte_range.strip())
+    if not match:
+        raise FileTransferError(f"Invalid range: {byte_range}")
+    start = int(match.group(1))
+    end = int(match.group(2)) if match.group(2) else None
+    if end is not None and end < start:
+        raise FileTransferError(f"Invalid range: {byte_range}")
+    return name, (start, end)
+
+
+def resolve_output_path(name: str, root: str = OUTPUT_DIR) -> str:
+    """
+    Maps a requested file name to a path inside `root`, rejecting anything else.
+    Content-addressed decks are found through the artifact index, by file name or hash.
+    """
+    name = name.strip()
+    if name.startswith(root + "/"):
+        name = name[len(root) + 1:]  # tools return "output/<file>"; accept it as-is
+    if not SAFE_FILENAME.match(name) or ".." in name:
+        raise FileTransferError(f"Invalid file name: {name}")
+    if root == OUTPUT_DIR:
+        indexed = get_artifact_store().resolve(name)
+        if indexed is not None:
+            return os.path.realpath(indexed)
+    root_path = os.path.realpath(root)
+    path = os.path.realpath(os.path.join(root_path, name))
+    if os.path.dirname(path) != root_path:
+        raise FileTransferError(f"Invalid file name: {name}")
+    if not os.path.isfile(path):
+        raise FileTransferError("File not found.")
+    return path
+
+
+_checksums = OrderedDict()  # (path, size, mtime_ns) -> sha256
+_checksums_lock = threading.Lock()
+
+
+def file_checksum(path: str) -> str:
+    """sha256 of a file, read in chunks and memoized by path, size and mtime."""
+    stat = os.stat(path)
+    key = (path, stat.st_size, stat.st_mtime_ns)
+    with _checksums_lock:
+        if key in _checksums:
+            _checksums.move_to_end(key)
+            return _checksums[key]
+
+    digest = hashlib.sha256()
+    with open(path, "rb") as file:
+        for chunk in iter(lambda: file.read(FILE_CHUNK_SIZE), b""):
+            digest.update(chunk)
+    checksum = digest.hexdigest()
+
+    with _checksums_lock:
+        _checksums[key] = checksum
+        while len(_checksums) > 1024:
+            _checksums.popitem(last=False)
+    return checksum
+
+
+async def send_file(websocket, request: str, chunk_size: int = FILE_CHUNK_SIZE):
+    """
+    Streams a file from the output directory:
+
+        {"type": "file_header", "name", "size", "sha256", "offset", "length", "chunk_size"}
+        <binary frame> * ceil(length / chunk_size)
+        {"type": "file_end", "name", "sent"}
+
+    Only one chunk is held in memory at a time and disk reads run off the event loop.
+    Errors are reported as {"type": "file_error", "name", "error"}.
+    """
+    name = request
+    try:
+        name, byte_range = parse_file_request(request)
+        path = await asyncio.to_thread(resolve_output_path, name)
+        size = os.path.getsize(path)
+        start, end = byte_range or (0, None)
+        end = size - 1 if end is None else min(end, size - 1)
+        if start >= size and size > 0:
+            raise FileTransferError(f"Range start {start} is beyond the file size {size}")
+        length = max(0, end - start + 1)
+        checksum = await asyncio.to_thread(file_checksum, path)
+    except FileTransferError as e:
+        await websocket.send(json.dumps({"type": "file_error", "name": name, "error": str(e)}))
+        return
+
+    await websocket.send(json.dumps({
+        "type": "file_header",
+        "name": os.path.basename(path),
+        "size": size,
+        "sha256": checksum,
+        "offset": start,
+        "length": length,
+        "chunk_size": chunk_size,
+    }))
+
+    sent = 0
+    with open(path, "rb") as file:
+        file.seek(start)
+        while sent < length:
+            chunk = await asyncio.to_thread(file.read, min(chunk_size, length - sent))
+            if not chunk:
+                break
+            await websocket.send(chunk)
+            sent += len(chunk)
+
+    await websocket.send(json.dumps({"type": "file_end", "name": os.path.basename(path), "sent": sent}))
+
+
+async def serve_file_request(websocket, request: str, lock: asyncio.Lock):
+    """
+    `send_file` for a task detached from the message loop. Transfers of one session
+    hold `lock`, so their header/binary/end frames never interleave (binary frames
+    carry no transfer id). Errors end the transfer here instead of in an unobserved task.
+    """
+    try:
+        async with lock:
+            await send_file(websocket, request)
+    except websockets.ConnectionClosed:
+        pass
+    except Exception as e:
+        print(f"File transfer failed: {str(e)}")
+        try:
+            await websocket.send(json.dumps({"type": "file_error", "name": request, "error": str(e)}))
+        except websockets.ConnectionClosed:
+            pass
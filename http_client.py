@@ -0,0 +1,120 @@
+import asyncio
+import json
+import os
+import threading
+from typing import Any, Callable, Dict, Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from execution_context import CANCEL_POLL_INTERVAL, current_cancel_token
+
+
+HTTP_CONNECT_TIMEOUT = float(os.getenv("HTTP_CONNECT_TIMEOUT", "3.05"))
+HTTP_READ_TIMEOUT = float(os.getenv("HTTP_READ_TIMEOUT", "20"))
+HTTP_MAX_RETRIES = int(os.getenv("HTTP_MAX_RETRIES", "3"))
+HTTP_BACKOFF_FACTOR = float(os.getenv("HTTP_BACKOFF_FACTOR", "0.5"))
+HTTP_POOL_SIZE = int(os.getenv("HTTP_POOL_SIZE", "32"))
+
+_session = None
+_session_lock = threading.Lock()
+
+
+def get_session() -> requests.Session:
+    """Process-wide session with keep-alive connection pooling and bounded retries."""
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                retry = Retry(
+                    total=HTTP_MAX_RETRIES,
+                    backoff_factor=HTTP_BACKOFF_FACTOR,
+                    status_forcelist=(429, 500, 502, 503, 504),
+                    allowed_methods=None,  # search and retrieve POSTs are idempotent
+                    respect_retry_after_header=True,
+                    raise_on_status=False,
+                )
+                adapter = HTTPAdapter(pool_connections=HTTP_POOL_SIZE, pool_maxsize=HTTP_POOL_SIZE, max_retries=retry)
+                session = requests.Session()
+                session.mount("http://", adapter)
+                session.mount("https://", adapter)
+                _session = session
+    return _session
+
+
+class _InFlightCall():
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+_in_flight: Dict[Any, _InFlightCall] = {}
+_in_flight_lock = threading.Lock()
+
+
+def post_json(url: str, payload: Dict[str, Any], headers: Optional[Dict[str, str]] = None,
+              timeout: Optional[float] = None, decode: Optional[Callable[[requests.Response], Any]] = None) -> Any:
+    """
+    POSTs `payload` as JSON and returns the decoded response body. With `decode`
+    the body is streamed and `decode(response)` produces the result instead of
+    `response.json()` (e.g. to parse a large array item by item).
+
+    Identical requests issued concurrently (e.g. by agents of different crews) are
+    coalesced: only the first one goes upstream, the others wait for its result.
+    The returned object is shared between coalesced callers and must not be mutated.
+
+    Inside a bound tool call the read timeout is capped by the run's deadline and a
+    cancelled run stops waiting for a coalesced result.
+    """
+    token = current_cancel_token()
+    if token is not None:
+        token.raise_if_cancelled()
+    body = json.dumps(payload, sort_keys=True)
+    headers = {'content-type': 'application/json', **(headers or {})}
+    key = (url, body, tuple(sorted(headers.items())), decode)
+
+    with _in_flight_lock:
+        call = _in_flight.get(key)
+        leader = call is None
+        if leader:
+            call = _InFlightCall()
+            _in_flight[key] = call
+
+    if not leader:
+        if token is None:
+            call.done.wait()
+        else:
+            while not call.done.wait(CANCEL_POLL_INTERVAL):
+                token.raise_if_cancelled()
+        if call.error is not None:
+            raise call.error
+        return call.result
+
+    try:
+        read_timeout = timeout or HTTP_READ_TIMEOUT
+        if token is not None:
+            read_timeout = max(0.1, token.cap_timeout(read_timeout))
+        response = get_session().post(
+            url, data=body, headers=headers, stream=decode is not None,
+            timeout=(min(HTTP_CONNECT_TIMEOUT, read_timeout), read_timeout))
+        try:
+            response.raise_for_status()
+            call.result = decode(response) if decode is not None else response.json()
+        finally:
+            response.close()
+        return call.result
+    except Exception as e:
+        call.error = e
+        raise
+    finally:
+        with _in_flight_lock:
+            _in_flight.pop(key, None)
+        call.done.set()
+
+
+async def apost_json(url: str, payload: Dict[str, Any], headers: Optional[Dict[str, str]] = None,
+                     timeout: Optional[float] = None, decode: Optional[Callable[[requests.Response], Any]] = None) -> Any:
+    """Async variant of `post_json`; shares the same connection pool and coalescing."""
+    return await asyncio.to_thread(post_json, url, payload, headers, timeout, decode)
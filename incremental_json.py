@@ -0,0 +1,106 @@
+import json
+from typing import Any, List, Tuple
+
+
+class IncrementalJsonScanner():
+    """
+    Consumes a JSON object as it is streamed (e.g. LLM token deltas) and reports each
+    top-level member as soon as its value is complete, long before the whole
+    document has arrived:
+
+        scanner = IncrementalJsonScanner()
+        for delta in stream:
+            for key, value in scanner.feed(delta):
+                ...
+
+    Text before the first `{` (code fences, prose) is ignored.
+    """
+
+    def __init__(self):
+        self.text = ""
+        self.position = 0
+        self.started = False
+        self.depth = 0
+        self.in_string = False
+        self.escape = False
+        self.string_start = None
+        self.last_string = None
+        self.key = None
+        self.value_start = None
+        self.expect_key = True
+        self.finished = False
+
+    def feed(self, delta: str) -> List[Tuple[str, Any]]:
+        if self.finished or not delta:
+            return []
+        self.text += delta
+        members = []
+
+        text = self.text
+        while self.position < len(text):
+            i = self.position
+            char = text[i]
+            self.position += 1
+
+            if not self.started:
+                if char == "{":
+                    self.started = True
+                    self.depth = 1
+                continue
+
+            if self.in_string:
+                if self.escape:
+                    self.escape = False
+                elif char == "\\":
+                    self.escape = True
+                elif char == '"':
+                    self.in_string = False
+                    if self.depth == 1 and self.value_start is None:
+                        self.last_string = text[self.string_start:i + 1]
+                    elif self.depth == 1 and self.value_start is not None:
+                        # a top-level string value just closed
+                        members.append(self._complete(i + 1))
+                continue
+
+            if char == '"':
+                self.in_string = True
+                self.string_start = i
+                if self.depth == 1 and not self.expect_key and self.value_start is None:
+                    self.value_start = i
+            elif char == ":" and self.depth == 1:
+                self.key = json.loads(self.last_string) if self.last_string else None
+                self.expect_key = False
+            elif char in "[{":
+                if self.depth == 1 and self.value_start is None:
+                    self.value_start = i
+                self.depth += 1
+            elif char in "]}":
+                self.depth -= 1
+                if self.depth == 1 and self.value_start is not None:
+                    members.append(self._complete(i + 1))
+                elif self.depth == 0:
+                    if self.value_start is not None:
+                        members.append(self._complete(i))
+                    self.finished = True
+                    break
+            elif char == "," and self.depth == 1:
+                if self.value_start is not None:
+                    members.append(self._complete(i))
+                self.expect_key = True
+            elif self.depth == 1 and not self.expect_key and self.value_start is None and not char.isspace():
+                # number, true, false or null
+                self.value_start = i
+
+        return [member for member in members if member is not None]
+
+    def _complete(self, end: int):
+        raw = self.text[self.value_start:end].strip()
+        key = self.key
+        self.value_start = None
+        self.key = None
+        self.last_string = None
+        self.expect_key = True
+        try:
+            return key, json.loads(raw)
+        except ValueError:
+            return None
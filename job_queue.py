@@ -0,0 +1,297 @@
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from typing import Any, Dict, List, Optional
+
+
+JOB_QUEUE_URL = os.getenv("JOB_QUEUE_URL", "sqlite:///cache/jobs.sqlite")  # sqlite:///<path> | redis://host:port/db
+JOB_EVENT_TTL = float(os.getenv("JOB_EVENT_TTL", "3600"))  # undelivered events of vanished front-ends expire
+JOB_QUEUE_POLL_INTERVAL = 0.05
+JOB_WORKER_TTL = float(os.getenv("JOB_WORKER_TTL", "30"))  # seconds without heartbeat before a worker's jobs are requeued
+WORKER_ID = os.getenv("WORKER_ID")  # stable id, so that a restarted worker requeues its own jobs at once
+
+
+class JobQueue(ABC):
+    """
+    Jobs flow from front-end nodes to workers; events flow back to the front-end
+    node (`node_id`) that holds the session's websocket. Messages are JSON dicts:
+
+        job:     {"job_id", "node_id", "session_id", "topic", "deadline"}
+        message: {"job_id", "session_id", "event"}
+    """
+
+    @abstractmethod
+    def enqueue(self, job: Dict[str, Any]):
+        ...
+
+    @abstractmethod
+    def dequeue(self, timeout: float) -> Optional[Dict[str, Any]]:
+        """Claims the oldest queued job, waiting up to `timeout` seconds."""
+        ...
+
+    @abstractmethod
+    def complete(self, job_id: str):
+        ...
+
+    @abstractmethod
+    def cancel(self, job_id: str, reason: str):
+        ...
+
+    @abstractmethod
+    def cancelled(self, job_id: str) -> Optional[str]:
+        """Cancellation reason of a job, None while it may run."""
+        ...
+
+    @abstractmethod
+    def publish(self, node_id: str, messages: List[Dict[str, Any]]):
+        ...
+
+    @abstractmethod
+    def consume(self, node_id: str, timeout: float, limit: int = 500) -> List[Dict[str, Any]]:
+        """Removes and returns the pending messages for `node_id`, waiting up to `timeout` for the first."""
+        ...
+
+    @abstractmethod
+    def stats(self) -> Dict[str, Any]:
+        ...
+
+
+class SQLiteJobQueue(JobQueue):
+    """
+    File-backed queue for front-ends and workers on one host (or a shared local
+    volume). Claims are atomic across processes through `BEGIN IMMEDIATE`.
+    """
+
+    def __init__(self, path: str, poll_interval: float = JOB_QUEUE_POLL_INTERVAL):
+        self.path = path
+        self.poll_interval = poll_interval
+        self.lock = threading.Lock()
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.conn = sqlite3.connect(path, timeout=30, check_same_thread=False, isolation_level=None)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS jobs (
+                job_id TEXT PRIMARY KEY,
+                payload TEXT NOT NULL,
+                status TEXT NOT NULL,
+                created_at REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS jobs_status ON jobs(status, created_at);
+            CREATE TABLE IF NOT EXISTS events (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                node_id TEXT NOT NULL,
+                payload TEXT NOT NULL,
+                created_at REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS events_node ON events(node_id, id);
+            CREATE TABLE IF NOT EXISTS cancels (
+                job_id TEXT PRIMARY KEY,
+                reason TEXT NOT NULL
+            );
+        """)
+
+    def enqueue(self, job: Dict[str, Any]):
+        now = time.time()
+        with self.lock:
+            self.conn.execute("INSERT INTO jobs (job_id, payload, status, created_at) VALUES (?, ?, 'queued', ?)",
+                              (job["job_id"], json.dumps(job, ensure_ascii=False), now))
+            self.conn.execute("DELETE FROM events WHERE created_at < ?", (now - JOB_EVENT_TTL,))
+
+    def dequeue(self, timeout: float) -> Optional[Dict[str, Any]]:
+        deadline = time.monotonic() + timeout
+        while True:
+            with self.lock:
+                self.conn.execute("BEGIN IMMEDIATE")
+                try:
+                    row = self.conn.execute(
+                        "SELECT job_id, payload FROM jobs WHERE status = 'queued' ORDER BY created_at LIMIT 1").fetchone()
+                    if row is not None:
+                        self.conn.execute("UPDATE jobs SET status = 'running' WHERE job_id = ?", (row[0],))
+                    self.conn.execute("COMMIT")
+                except BaseException:
+                    self.conn.execute("ROLLBACK")
+                    raise
+            if row is not None:
+                return json.loads(row[1])
+            if time.monotonic() >= deadline:
+                return None
+            time.sleep(self.poll_interval)
+
+    def complete(self, job_id: str):
+        with self.lock:
+            self.conn.execute("DELETE FROM jobs WHERE job_id = ?", (job_id,))
+            self.conn.execute("DELETE FROM cancels WHERE job_id = ?", (job_id,))
+
+    def cancel(self, job_id: str, reason: str):
+        with self.lock:
+            self.conn.execute("INSERT OR IGNORE INTO cancels (job_id, reason) VALUES (?, ?)", (job_id, reason))
+
+    def cancelled(self, job_id: str) -> Optional[str]:
+        with self.lock:
+            row = self.conn.execute("SELECT reason FROM cancels WHERE job_id = ?", (job_id,)).fetchone()
+        return row[0] if row else None
+
+    def publish(self, node_id: str, messages: List[Dict[str, Any]]):
+        now = time.time()
+        with self.lock:
+            self.conn.executemany("INSERT INTO events (node_id, payload, created_at) VALUES (?, ?, ?)",
+                                  [(node_id, json.dumps(message, ensure_ascii=False), now) for message in messages])
+
+    def consume(self, node_id: str, timeout: float, limit: int = 500) -> List[Dict[str, Any]]:
+        deadline = time.monotonic() + timeout
+        while True:
+            with self.lock:
+                rows = self.conn.execute("SELECT id, payload FROM events WHERE node_id = ? ORDER BY id LIMIT ?",
+                                         (node_id, limit)).fetchall()
+                if rows:
+                    self.conn.execute("DELETE FROM events WHERE node_id = ? AND id <= ?", (node_id, rows[-1][0]))
+            if rows:
+                return [json.loads(payload) for _, payload in rows]
+            if time.monotonic() >= deadline:
+                return []
+            time.sleep(self.poll_interval)
+
+    def stats(self) -> Dict[str, Any]:
+        with self.lock:
+            counts = dict(self.conn.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall())
+            events = self.conn.execute("SELECT COUNT(*) FROM events").fetchone()[0]
+        return {"backend": "sqlite", "queued": counts.get("queued", 0), "running": counts.get("running", 0),
+                "undelivered_events": events}
+
+
+class RedisJobQueue(JobQueue):
+    """
+    Queue on Redis (6.2 or later, or a compatible server) for front-ends and workers
+    on different nodes. A claimed job is moved atomically (`BLMOVE`) into the
+    worker's own processing list and stays there until it completes. Workers keep a
+    heartbeat key alive; the processing list of a worker whose heartbeat expired
+    (it died or was restarted) is moved back to the head of the queue by the next
+    worker that claims jobs.
+    """
+
+    def __init__(self, url: str, prefix: str = "crew", worker_id: Optional[str] = None):
+        try:
+            import redis
+        except ImportError:
+            raise ImportError("JOB_QUEUE_URL points to Redis but the redis package is not installed (pip install redis)")
+        self.redis = redis.Redis.from_url(url)
+        self.prefix = prefix
+        self.worker_id = worker_id or WORKER_ID or f"{socket.gethostname()}:{os.getpid()}"
+        self.heartbeat_thread = None
+        self.heartbeat_lock = threading.Lock()
+
+    def key(self, *parts: str) -> str:
+        return ":".join((self.prefix, *parts))
+
+    def enqueue(self, job: Dict[str, Any]):
+        self.redis.rpush(self.key("jobs"), json.dumps(job, ensure_ascii=False))
+
+    def dequeue(self, timeout: float) -> Optional[Dict[str, Any]]:
+        self.start_heartbeat()
+        item = self.redis.blmove(self.key("jobs"), self.key("processing", self.worker_id), max(timeout, 0.01),
+                                 "LEFT", "RIGHT")
+        if item is None:
+            return None
+        job = json.loads(item)
+        # the job is already safe in the processing list; this only serves lookups and stats
+        self.redis.hset(self.key("running"), job["job_id"], item)
+        return job
+
+    def complete(self, job_id: str):
+        item = self.redis.hget(self.key("running"), job_id)
+        pipeline = self.redis.pipeline()
+        if item is not None:
+            pipeline.lrem(self.key("processing", self.worker_id), 1, item)
+        pipeline.hdel(self.key("running"), job_id)
+        pipeline.delete(self.key("cancel", job_id))
+        pipeline.execute()
+
+    def start_heartbeat(self):
+        if self.heartbeat_thread is not None:
+            return
+        with self.heartbeat_lock:
+            if self.heartbeat_thread is None:
+                # jobs left by an earlier process with the same WORKER_ID
+                self.requeue(self.key("processing", self.worker_id))
+                self.beat()  # before the first claim, so that no other worker recovers our list
+                self.heartbeat_thread = threading.Thread(target=self.run_heartbeat, name="job-heartbeat", daemon=True)
+                self.heartbeat_thread.start()
+
+    def beat(self):
+        self.redis.set(self.key("worker", self.worker_id), time.time(), ex=max(1, int(JOB_WORKER_TTL)))
+
+    def run_heartbeat(self):
+        while True:
+            try:
+                self.beat()
+                self.recover()
+            except Exception as e:
+                print(f"Job queue heartbeat failed: {str(e)}")
+            time.sleep(JOB_WORKER_TTL / 3)
+
+    def recover(self) -> int:
+        """Requeues the jobs of workers whose heartbeat expired. Returns the number of jobs requeued."""
+        requeued = 0
+        prefix = self.key("processing", "")
+        for key in self.redis.scan_iter(match=prefix + "*"):
+            key = key.decode("utf-8") if isinstance(key, bytes) else key
+            worker_id = key[len(prefix):]
+            if worker_id == self.worker_id or self.redis.exists(self.key("worker", worker_id)):
+                continue
+            requeued += self.requeue(key)
+        return requeued
+
+    def requeue(self, processing_key: str) -> int:
+        requeued = 0
+        while True:
+            # newest claim first, so that the oldest one ends up at the head of the queue
+            item = self.redis.lmove(processing_key, self.key("jobs"), "RIGHT", "LEFT")
+            if item is None:
+                break
+            self.redis.hdel(self.key("running"), json.loads(item)["job_id"])
+            requeued += 1
+        if requeued:
+            print(f"Requeued {requeued} jobs from {processing_key}")
+        return requeued
+
+    def cancel(self, job_id: str, reason: str):
+        self.redis.set(self.key("cancel", job_id), reason, ex=int(JOB_EVENT_TTL), nx=True)
+
+    def cancelled(self, job_id: str) -> Optional[str]:
+        reason = self.redis.get(self.key("cancel", job_id))
+        return reason.decode("utf-8") if reason is not None else None
+
+    def publish(self, node_id: str, messages: List[Dict[str, Any]]):
+        key = self.key("events", node_id)
+        pipeline = self.redis.pipeline()
+        pipeline.rpush(key, *[json.dumps(message, ensure_ascii=False) for message in messages])
+        pipeline.expire(key, int(JOB_EVENT_TTL))
+        pipeline.execute()
+
+    def consume(self, node_id: str, timeout: float, limit: int = 500) -> List[Dict[str, Any]]:
+        key = self.key("events", node_id)
+        first = self.redis.blpop([key], timeout=max(timeout, 0.01))
+        if first is None:
+            return []
+        rest = (self.redis.lpop(key, limit - 1) or []) if limit > 1 else []
+        return [json.loads(item) for item in [first[1], *rest]]
+
+    def stats(self) -> Dict[str, Any]:
+        return {"backend": "redis", "queued": self.redis.llen(self.key("jobs")),
+                "running": self.redis.hlen(self.key("running"))}
+
+
+def create_job_queue(url: str = JOB_QUEUE_URL) -> JobQueue:
+    if url.startswith(("redis://", "rediss://", "unix://")):
+        return RedisJobQueue(url)
+    if url.startswith("sqlite:///"):
+        url = url[len("sqlite:///"):]
+    return SQLiteJobQueue(url)
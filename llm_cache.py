@@ -0,0 +1,196 @@
+import hashlib
+import json
+import os
+import threading
+from collections import defaultdict
+from typing import Any, Dict, List, Optional, Sequence
+
+from langchain_core.caches import BaseCache
+from langchain_core.load import dumps, loads
+
+from cache_backends import SQLiteCacheBackend
+from tracing import record_cache
+
+
+LLM_CACHE_MODE = os.getenv("LLM_CACHE_MODE", "off").lower()  # off | readwrite | record | replay
+LLM_CACHE_PATH = os.getenv("LLM_CACHE_PATH", "cache/llm_cache.sqlite")
+LLM_CACHE_MAX_ENTRIES = int(os.getenv("LLM_CACHE_MAX_ENTRIES", "50000"))
+LLM_CACHE_MAX_BYTES = int(os.getenv("LLM_CACHE_MAX_BYTES", str(512 * 1024 * 1024)))
+LLM_CACHE_TTL = float(os.getenv("LLM_CACHE_TTL", "0"))  # seconds, 0 = keep until evicted
+LLM_CACHE_PREFIX_BLOCK = int(os.getenv("LLM_CACHE_PREFIX_BLOCK", "512"))  # characters per prefix hash
+LLM_CACHE_PREFIX_MIN_RATIO = float(os.getenv("LLM_CACHE_PREFIX_MIN_RATIO", "0.5"))
+
+MODES = ("off", "readwrite", "record", "replay")
+
+
+class LLMCacheMiss(RuntimeError):
+    """Replay mode found no recorded response; the call is not sent to the provider."""
+
+
+def prefix_hashes(prompt: str, block: int = LLM_CACHE_PREFIX_BLOCK) -> List[tuple]:
+    """(length, sha256 of prompt[:length]) at every block boundary shorter than the prompt."""
+    digest = hashlib.sha256()
+    hashes = []
+    for start in range(0, len(prompt) - block, block):
+        digest.update(prompt[start:start + block].encode("utf-8"))
+        hashes.append((start + block, digest.copy().hexdigest()))
+    return hashes
+
+
+class LLMCallCache(BaseCache):
+    """
+    LangChain LLM cache (installed with `set_llm_cache`) over SQLite, keyed by the
+    serialized model parameters (`llm_string`: model, temperature, stop, ...) and the
+    serialized messages. Entries are evicted least recently used first, bounded by
+    count and bytes.
+
+        readwrite  answer from the cache, record misses
+        record     always call the provider and (over)write the recorded response
+        replay     never call the provider: exact match, else the recorded call of the
+                   same model sharing the longest prompt prefix; LLMCacheMiss otherwise
+
+    Prefix matching lets a replayed agent loop continue when a tool observation late
+    in the prompt differs from the recording (timestamps, live search results).
+    """
+
+    def __init__(self, backend: SQLiteCacheBackend, mode: str = "readwrite",
+                 min_prefix_ratio: float = LLM_CACHE_PREFIX_MIN_RATIO):
+        if mode not in MODES or mode == "off":
+            raise ValueError(f"Unsupported LLM cache mode: {mode}")
+        self.backend = backend
+        self.mode = mode
+        self.min_prefix_ratio = min_prefix_ratio
+        self.counts = defaultdict(int)
+        self.lock = threading.Lock()
+        with backend.lock:
+            backend.conn.execute("""
+                CREATE TABLE IF NOT EXISTS llm_call_prefixes (
+                    scope TEXT NOT NULL,
+                    prefix_hash TEXT NOT NULL,
+                    length INTEGER NOT NULL,
+                    key TEXT NOT NULL
+                )""")
+            backend.conn.execute("CREATE INDEX IF NOT EXISTS llm_call_prefixes_hash ON llm_call_prefixes(scope, prefix_hash)")
+            backend.conn.execute("CREATE INDEX IF NOT EXISTS llm_call_prefixes_key ON llm_call_prefixes(key)")
+            # the prefixes of an entry go with it, whether evicted, expired or deleted (like ON DELETE CASCADE)
+            backend.conn.execute("BEGIN IMMEDIATE")
+            try:
+                exists = backend.conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'trigger' AND name = ?",
+                                              (f"{backend.table}_prefixes_delete",)).fetchone()
+                if exists is None:
+                    backend.conn.execute(f"""
+                        CREATE TRIGGER {backend.table}_prefixes_delete AFTER DELETE ON {backend.table} BEGIN
+                            DELETE FROM llm_call_prefixes WHERE key = OLD.key;
+                        END""")
+                    # prefixes orphaned before the trigger existed
+                    backend.conn.execute(
+                        f"DELETE FROM llm_call_prefixes WHERE key NOT IN (SELECT key FROM {backend.table})")
+                backend.conn.execute("COMMIT")
+            except BaseException:
+                backend.conn.execute("ROLLBACK")
+                raise
+
+    def scope(self, llm_string: str) -> str:
+        return hashlib.sha256(llm_string.encode("utf-8")).hexdigest()
+
+    def key(self, prompt: str, llm_string: str) -> str:
+        return f"{self.scope(llm_string)}:{hashlib.sha256(prompt.encode('utf-8')).hexdigest()}"
+
+    def count(self, result: str):
+        with self.lock:
+            self.counts[result] += 1
+        record_cache("llm", result in ("hit", "prefix_hit"))
+
+    def decode(self, value: str) -> List[Any]:
+        return [loads(generation) for generation in json.loads(value)]
+
+    def lookup(self, prompt: str, llm_string: str) -> Optional[Sequence[Any]]:
+        if self.mode == "record":
+            return None
+        value = self.backend.get(self.key(prompt, llm_string))
+        if value is not None:
+            self.count("hit")
+            return self.decode(value)
+        if self.mode == "replay":
+            value = self.lookup_prefix(prompt, llm_string)
+            if value is not None:
+                self.count("prefix_hit")
+                return self.decode(value)
+            self.count("miss")
+            raise LLMCacheMiss(f"No recorded LLM response for this call ({len(prompt)} prompt characters)")
+        self.count("miss")
+        return None
+
+    def lookup_prefix(self, prompt: str, llm_string: str) -> Optional[str]:
+        hashes = [digest for length, digest in prefix_hashes(prompt)
+                  if length >= self.min_prefix_ratio * len(prompt)]
+        if not hashes:
+            return None
+        scope = self.scope(llm_string)
+        placeholders = ",".join("?" * len(hashes))
+        with self.backend.lock:
+            # longest shared prefix first; among equals the earliest recording, so replays are deterministic
+            rows = self.backend.conn.execute(
+                f"SELECT key FROM llm_call_prefixes WHERE scope = ? AND prefix_hash IN ({placeholders}) "
+                f"ORDER BY length DESC, rowid ASC LIMIT 20", (scope, *hashes)).fetchall()
+        for (key,) in rows:
+            value = self.backend.get(key)
+            if value is not None:
+                return value
+            with self.backend.lock:  # entry was evicted
+                self.backend.conn.execute("DELETE FROM llm_call_prefixes WHERE key = ?", (key,))
+        return None
+
+    def update(self, prompt: str, llm_string: str, return_val: Sequence[Any]):
+        if self.mode == "replay":
+            return
+        key = self.key(prompt, llm_string)
+        scope = self.scope(llm_string)
+        self.backend.set(key, json.dumps([dumps(generation) for generation in return_val]))
+        with self.backend.lock:
+            self.backend.conn.execute("DELETE FROM llm_call_prefixes WHERE key = ?", (key,))
+            self.backend.conn.executemany(
+                "INSERT INTO llm_call_prefixes (scope, prefix_hash, length, key) VALUES (?, ?, ?, ?)",
+                [(scope, digest, length, key) for length, digest in prefix_hashes(prompt)])
+
+    def clear(self, **kwargs: Any):
+        self.backend.clear()
+        with self.backend.lock:
+            self.backend.conn.execute("DELETE FROM llm_call_prefixes")
+
+    def stats(self) -> Dict[str, Any]:
+        with self.lock:
+            counts = dict(self.counts)
+        return {
+            "mode": self.mode,
+            "hits": counts.get("hit", 0),
+            "prefix_hits": counts.get("prefix_hit", 0),
+            "misses": counts.get("miss", 0),
+            "entries": len(self.backend),
+            "size_bytes": self.backend.size_bytes(),
+            "evictions": self.backend.evictions,
+        }
+
+
+_llm_cache = None
+_llm_cache_lock = threading.Lock()
+
+
+def llm_cache_enabled() -> bool:
+    return LLM_CACHE_MODE != "off"
+
+
+def get_llm_cache() -> Optional[LLMCallCache]:
+    """The process-wide LLM cache, installed as LangChain's global cache on first use (None when off)."""
+    global _llm_cache
+    if _llm_cache is None and llm_cache_enabled():
+        with _llm_cache_lock:
+            if _llm_cache is None:
+                from langchain.globals import set_llm_cache
+
+                backend = SQLiteCacheBackend(LLM_CACHE_PATH, table="llm_calls", max_entries=LLM_CACHE_MAX_ENTRIES,
+                                             max_bytes=LLM_CACHE_MAX_BYTES, ttl=LLM_CACHE_TTL or None)
+                cache = LLMCallCache(backend, mode=LLM_CACHE_MODE)
+                set_llm_cache(cache)
+                _llm_cache = cache
+    return _llm_cache
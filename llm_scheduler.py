@@ -0,0 +1,367 @@
+import asyncio
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+from contextvars import ContextVar
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional
+
+import openai
+from langchain.chat_models import ChatOpenAI
+from langchain.pydantic_v1 import Field
+
+from execution_context import CANCEL_POLL_INTERVAL, CancellationCallbackHandler, CancelToken
+from tracing import metrics, token_usage
+
+
+LLM_RPM_LIMIT = int(os.getenv("LLM_RPM_LIMIT", "0"))            # requests per minute, 0 = unlimited
+LLM_TPM_LIMIT = int(os.getenv("LLM_TPM_LIMIT", "0"))            # tokens per minute, 0 = unlimited
+LLM_MAX_CONCURRENT = int(os.getenv("LLM_MAX_CONCURRENT", "0"))  # calls in flight, 0 = unlimited
+LLM_COMPLETION_TOKENS_ESTIMATE = int(os.getenv("LLM_COMPLETION_TOKENS_ESTIMATE", "500"))
+LLM_RATE_LIMIT_RETRIES = int(os.getenv("LLM_RATE_LIMIT_RETRIES", "3"))
+LLM_RATE_LIMIT_BACKOFF = float(os.getenv("LLM_RATE_LIMIT_BACKOFF", "1.0"))  # seconds when no Retry-After
+
+# served strictly in this order; sessions within a class take turns
+PRIORITIES = ("planner", "interactive", "batch")
+
+QUEUE_WAIT_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+
+class TokenBucket():
+    """Refills `per_minute` units per minute up to `capacity`; `per_minute <= 0` never limits."""
+
+    def __init__(self, per_minute: float, capacity: Optional[float] = None):
+        self.rate = per_minute / 60.0
+        self.capacity = capacity or per_minute
+        self.level = self.capacity
+        self.updated = time.monotonic()
+
+    @property
+    def unlimited(self) -> bool:
+        return self.rate <= 0
+
+    def refill(self, now: float):
+        if not self.unlimited:
+            self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount: float, now: float) -> float:
+        """Seconds until `amount` can be taken (a request larger than the bucket waits for a full bucket)."""
+        if self.unlimited:
+            return 0.0
+        self.refill(now)
+        missing = min(amount, self.capacity) - self.level
+        return max(0.0, missing / self.rate)
+
+    def consume(self, amount: float):
+        """Takes `amount`; the level may go negative when actual usage exceeded the estimate."""
+        if not self.unlimited:
+            self.level -= amount
+
+
+class _Waiter():
+    __slots__ = ("session", "priority", "tokens", "enqueued_at", "granted")
+
+    def __init__(self, session: Any, priority: str, tokens: int):
+        self.session = session
+        self.priority = priority
+        self.tokens = tokens
+        self.enqueued_at = time.monotonic()
+        self.granted = False
+
+
+class LLMCallScheduler():
+    """
+    Process-wide admission control for LLM calls. A call waits until the request
+    and token buckets (LLM_RPM_LIMIT / LLM_TPM_LIMIT) and the concurrency limit
+    allow it. Waiting calls are served by priority class first. Within a class,
+    sessions take turns, so one session's crew cannot crowd out the others. A 429
+    from the provider pauses every call for the Retry-After period.
+    """
+
+    def __init__(self, rpm: int = LLM_RPM_LIMIT, tpm: int = LLM_TPM_LIMIT, max_concurrent: int = LLM_MAX_CONCURRENT):
+        self.requests = TokenBucket(rpm)
+        self.tokens = TokenBucket(tpm)
+        self.max_concurrent = max_concurrent
+        self.in_flight = 0
+        self.paused_until = 0.0
+        self.queues: Dict[str, "OrderedDict[Any, deque]"] = {priority: OrderedDict() for priority in PRIORITIES}
+        self.granted = {priority: 0 for priority in PRIORITIES}
+        self.rate_limited_count = 0
+        self.cond = threading.Condition()
+
+    def acquire(self, tokens: int, priority: str = "interactive", session: Any = None,
+                cancel_token: Optional[CancelToken] = None) -> _Waiter:
+        """Blocks until the call may start; pair with `release`. Raises RunCancelled if the run is cancelled meanwhile."""
+        if priority not in self.queues:
+            priority = "batch"
+        waiter = _Waiter(session, priority, tokens)
+        with self.cond:
+            self.queues[priority].setdefault(session, deque()).append(waiter)
+            try:
+                while True:
+                    self._dispatch()
+                    if waiter.granted:
+                        break
+                    if cancel_token is not None:
+                        cancel_token.raise_if_cancelled()
+                    self.cond.wait(timeout=self._next_wakeup())
+            except BaseException:
+                if not waiter.granted:
+                    self._remove(waiter)
+                    self.cond.notify_all()
+                raise
+        metrics.observe("crew_llm_queue_wait_seconds", time.monotonic() - waiter.enqueued_at,
+                        help="Time LLM calls waited for the rate limits", buckets=QUEUE_WAIT_BUCKETS,
+                        priority=priority)
+        return waiter
+
+    def release(self, waiter: _Waiter, used_tokens: Optional[int] = None):
+        with self.cond:
+            self.in_flight -= 1
+            if used_tokens:
+                # settle the estimate against the usage the provider reported
+                self.tokens.consume(used_tokens - waiter.tokens)
+            self.cond.notify_all()
+
+    def rate_limited(self, retry_after: Optional[float] = None):
+        with self.cond:
+            self.rate_limited_count += 1
+            self.paused_until = max(self.paused_until, time.monotonic() + (retry_after or LLM_RATE_LIMIT_BACKOFF))
+            self.cond.notify_all()
+        metrics.inc("crew_llm_rate_limited_total", help="LLM calls answered with 429")
+
+    def _head(self) -> Optional[_Waiter]:
+        for priority in PRIORITIES:
+            sessions = self.queues[priority]
+            if sessions:
+                return next(iter(sessions.values()))[0]
+        return None
+
+    def _remove(self, waiter: _Waiter):
+        sessions = self.queues[waiter.priority]
+        waiters = sessions.get(waiter.session)
+        if waiters is None:
+            return
+        if waiter in waiters:
+            waiters.remove(waiter)
+        if not waiters:
+            del sessions[waiter.session]
+
+    def _dispatch(self):
+        while True:
+            now = time.monotonic()
+            if now < self.paused_until:
+                return
+            if self.max_concurrent and self.in_flight >= self.max_concurrent:
+                return
+            waiter = self._head()
+            if waiter is None:
+                return
+            # the head of the queue blocks everyone behind it, so large calls are not starved
+            if self.requests.wait_time(1, now) > 0 or self.tokens.wait_time(waiter.tokens, now) > 0:
+                return
+
+            sessions = self.queues[waiter.priority]
+            sessions[waiter.session].popleft()
+            if sessions[waiter.session]:
+                sessions.move_to_end(waiter.session)  # next call of this session waits for the others
+            else:
+                del sessions[waiter.session]
+            self.requests.consume(1)
+            self.tokens.consume(waiter.tokens)
+            self.in_flight += 1
+            self.granted[waiter.priority] += 1
+            waiter.granted = True
+            self.cond.notify_all()
+
+    def _next_wakeup(self) -> float:
+        now = time.monotonic()
+        wait = CANCEL_POLL_INTERVAL
+        if now < self.paused_until:
+            return min(wait, self.paused_until - now)
+        waiter = self._head()
+        if waiter is not None and not (self.max_concurrent and self.in_flight >= self.max_concurrent):
+            bucket_wait = max(self.requests.wait_time(1, now), self.tokens.wait_time(waiter.tokens, now))
+            wait = min(wait, max(bucket_wait, 0.001))
+        return wait
+
+    def stats(self) -> Dict[str, Any]:
+        with self.cond:
+            now = time.monotonic()
+            self.requests.refill(now)
+            self.tokens.refill(now)
+            return {
+                "queued": {priority: sum(len(waiters) for waiters in sessions.values())
+                           for priority, sessions in self.queues.items()},
+                "granted": dict(self.granted),
+                "in_flight": self.in_flight,
+                "rate_limited": self.rate_limited_count,
+                "paused_for": max(0.0, self.paused_until - now),
+                "requests_available": None if self.requests.unlimited else self.requests.level,
+                "tokens_available": None if self.tokens.unlimited else self.tokens.level,
+            }
+
+
+_llm_scheduler = None
+_llm_scheduler_lock = threading.Lock()
+
+
+def get_llm_scheduler() -> LLMCallScheduler:
+    global _llm_scheduler
+    if _llm_scheduler is None:
+        with _llm_scheduler_lock:
+            if _llm_scheduler is None:
+                _llm_scheduler = LLMCallScheduler()
+    return _llm_scheduler
+
+
+# ---- chat model ----------------------------------------------------------------------------
+
+# set while a call holds a grant, so that the streaming path of _generate does not queue twice
+_scheduled: ContextVar[bool] = ContextVar("llm_call_scheduled", default=False)
+
+
+def _cancel_token(run_manager: Any) -> Optional[CancelToken]:
+    for handler in getattr(run_manager, "handlers", None) or []:
+        if isinstance(handler, CancellationCallbackHandler):
+            return handler.token
+    return None
+
+
+def _retry_after(error: Exception) -> Optional[float]:
+    response = getattr(error, "response", None)
+    try:
+        return float(response.headers.get("retry-after"))
+    except (AttributeError, TypeError, ValueError):
+        return None
+
+
+class ScheduledChatOpenAI(ChatOpenAI):
+    """
+    ChatOpenAI whose calls are admitted by the process-wide LLMCallScheduler. The
+    session of a call is `session_key` (set on agent LLMs), or the `session_id` in
+    the run metadata for the shared planner model. Neither field is serialized, so
+    LLM cache keys stay independent of the session. A 429 that survives the
+    client's own retries pauses the scheduler and the call is queued again, up to
+    LLM_RATE_LIMIT_RETRIES times; streamed calls only until the first chunk. Streams
+    report no usage, so their tokens are counted from the streamed text.
+    """
+
+    priority: str = Field("interactive", exclude=True)
+    session_key: Optional[str] = Field(None, exclude=True)
+
+    def _prompt_tokens(self, messages: List[Any]) -> int:
+        try:
+            return self.get_num_tokens_from_messages(messages)
+        except Exception:
+            return sum(len(str(message.content)) for message in messages) // 4
+
+    def _estimate_tokens(self, messages: List[Any]) -> int:
+        return self._prompt_tokens(messages) + (self.max_tokens or LLM_COMPLETION_TOKENS_ESTIMATE)
+
+    def _streamed_tokens(self, messages: List[Any], text: str) -> int:
+        """Usage of a streamed call, which reports none: the prompt plus the tokens of the streamed text."""
+        try:
+            completion_tokens = self.get_num_tokens(text)
+        except Exception:
+            completion_tokens = len(text) // 4
+        return self._prompt_tokens(messages) + completion_tokens
+
+    def _acquire_args(self, messages: List[Any], run_manager: Any) -> tuple:
+        session = self.session_key
+        if session is None:
+            session = (getattr(run_manager, "metadata", None) or {}).get("session_id")
+        return self._estimate_tokens(messages), self.priority, session, _cancel_token(run_manager)
+
+    def _generate(self, messages: List[Any], stop: Optional[List[str]] = None, run_manager: Any = None,
+                  **kwargs: Any) -> Any:
+        if _scheduled.get():
+            return super()._generate(messages, stop=stop, run_manager=run_manager, **kwargs)
+        scheduler = get_llm_scheduler()
+        args = self._acquire_args(messages, run_manager)
+        for attempt in range(LLM_RATE_LIMIT_RETRIES + 1):
+            grant = scheduler.acquire(*args)
+            used = None
+            reset = _scheduled.set(True)
+            try:
+                result = super()._generate(messages, stop=stop, run_manager=run_manager, **kwargs)
+                used = sum(token_usage(result)) or self._streamed_tokens(
+                    messages, "".join(generation.text for generation in result.generations))
+                return result
+            except openai.RateLimitError as e:
+                scheduler.rate_limited(_retry_after(e))
+                if attempt >= LLM_RATE_LIMIT_RETRIES:
+                    raise
+            finally:
+                _scheduled.reset(reset)
+                scheduler.release(grant, used)
+
+    def _stream(self, messages: List[Any], stop: Optional[List[str]] = None, run_manager: Any = None,
+                **kwargs: Any) -> Iterator[Any]:
+        if _scheduled.get():
+            yield from super()._stream(messages, stop=stop, run_manager=run_manager, **kwargs)
+            return
+        scheduler = get_llm_scheduler()
+        args = self._acquire_args(messages, run_manager)
+        for attempt in range(LLM_RATE_LIMIT_RETRIES + 1):
+            grant = scheduler.acquire(*args)
+            streamed = []
+            try:
+                for chunk in super()._stream(messages, stop=stop, run_manager=run_manager, **kwargs):
+                    streamed.append(chunk.text)
+                    yield chunk
+                return
+            except openai.RateLimitError as e:
+                scheduler.rate_limited(_retry_after(e))
+                if streamed or attempt >= LLM_RATE_LIMIT_RETRIES:
+                    raise
+            finally:
+                scheduler.release(grant, self._streamed_tokens(messages, "".join(streamed)) if streamed else None)
+
+    async def _agenerate(self, messages: List[Any], stop: Optional[List[str]] = None, run_manager: Any = None,
+                         **kwargs: Any) -> Any:
+        if _scheduled.get():
+            return await super()._agenerate(messages, stop=stop, run_manager=run_manager, **kwargs)
+        scheduler = get_llm_scheduler()
+        args = self._acquire_args(messages, run_manager)
+        for attempt in range(LLM_RATE_LIMIT_RETRIES + 1):
+            # the scheduler blocks, so waiting happens off the event loop
+            grant = await asyncio.to_thread(scheduler.acquire, *args)
+            used = None
+            reset = _scheduled.set(True)
+            try:
+                result = await super()._agenerate(messages, stop=stop, run_manager=run_manager, **kwargs)
+                used = sum(token_usage(result)) or self._streamed_tokens(
+                    messages, "".join(generation.text for generation in result.generations))
+                return result
+            except openai.RateLimitError as e:
+                scheduler.rate_limited(_retry_after(e))
+                if attempt >= LLM_RATE_LIMIT_RETRIES:
+                    raise
+            finally:
+                _scheduled.reset(reset)
+                scheduler.release(grant, used)
+
+    async def _astream(self, messages: List[Any], stop: Optional[List[str]] = None, run_manager: Any = None,
+                       **kwargs: Any) -> AsyncIterator[Any]:
+        if _scheduled.get():
+            async for chunk in super()._astream(messages, stop=stop, run_manager=run_manager, **kwargs):
+                yield chunk
+            return
+        scheduler = get_llm_scheduler()
+        args = self._acquire_args(messages, run_manager)
+        for attempt in range(LLM_RATE_LIMIT_RETRIES + 1):
+            grant = await asyncio.to_thread(scheduler.acquire, *args)
+            streamed = []
+            try:
+                async for chunk in super()._astream(messages, stop=stop, run_manager=run_manager, **kwargs):
+                    streamed.append(chunk.text)
+                    yield chunk
+                return
+            except openai.RateLimitError as e:
+                scheduler.rate_limited(_retry_after(e))
+                if streamed or attempt >= LLM_RATE_LIMIT_RETRIES:
+                    raise
+            finally:
+                scheduler.release(grant, self._streamed_tokens(messages, "".join(streamed)) if streamed else None)
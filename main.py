@@ -13,120 +13,252 @@ import json
 from langchain_core.agents import AgentAction, AgentFinish
 
 
-from calculator_tools import CalculatorTools
-from search_tools import SearchTools
-from powerpoint_tools import PowerpointTools
-
-from contextvars import ContextVar
-
-var = ContextVar('config')
-def get_config_context_var():
-    return var
-
-# Creating a dictionary to map string names to actual functions.
-tools_by_name = {
-    "SearchTools.search_internet": SearchTools.search_internet,
-    "SearchTools.search_internal_documents": SearchTools.search_internal_documents,
-    "CalculatorTools.calculate": CalculatorTools.calculate,
-    "PowerpointTools.generate_slide": PowerpointTools.generate_slide
-}
+from tool_registry import tool_registry
+from config_cache import create_config_cache
+from search_cache import SEARCH_INTERNAL_DOCUMENTS_TOOL, SEARCH_INTERNET_TOOL, SEARCH_NEWS_TOOL
+from dag_executor import run_crew_graph, sequential_dependencies
+from checkpoint_store import get_checkpoint_store
+from crew_plan import CrewPlan, compile_plan, reasking_planner
+from crew_factory import AGENT_MODEL_NAME, agent_pool, make_llm
+from llm_cache import llm_cache_enabled
+from execution_context import CancellationCallbackHandler, ExecutionContext, bind_tools, get_execution_context
+
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from langchain.callbacks.base import BaseCallbackHandler
+from incremental_json import IncrementalJsonScanner
+from tracing import SpanTimer, record_payload, record_span, record_tokens, span, token_usage
+
+STREAM_PLANNER = os.getenv("STREAM_PLANNER", "true").lower() == "true"
+STREAM_AGENT_TOKENS = os.getenv("STREAM_AGENT_TOKENS", "true").lower() == "true"
+
+# Mapping of tool names to tool objects; a tool module is imported the first time an agent uses it
+tools_by_name = tool_registry
 
 
 from crewai.agents.tools_handler import ToolsHandler
 from crewai.agents.cache.cache_handler import CacheHandler
 
 class CustomToolsHandler(ToolsHandler):
-    handler: Any = None
+    context: Any = None
     agent: Agent = None
 
-    def __init__(self, handler: Any, cache_handler: CacheHandler, agent: Agent, **kwargs: Any):
+    def __init__(self, context: ExecutionContext, cache_handler: CacheHandler, agent: Agent, **kwargs: Any):
         super().__init__(cache=cache_handler, **kwargs)        
-        self.handler = handler
+        self.context = context
         self.agent = agent
+        self.tool_timer = SpanTimer()
 
     async def on_agent_finish(self, finish: AgentFinish, *, run_id: UUID, parent_run_id: UUID | None = None, **kwargs: Any) -> Any:
         return super().on_agent_finish(finish, run_id=run_id, parent_run_id=parent_run_id, **kwargs)
     
     async def on_agent_action(self, action: AgentAction, *, run_id: UUID, parent_run_id: UUID | None = None, **kwargs: Any) -> Any:
-        await self.handler['callbacks'][0].send_log(f"Agent: {self.agent.role}\nTool: {action.messages}")
+        await self.context.send_log(f"{action.messages}", type="agent_action", agent=self.agent.role, tool=action.tool)
         return super().on_agent_action(action, run_id=run_id, parent_run_id=parent_run_id, **kwargs)
     
     async def on_tool_start(self, serialized: Dict[str, Any], input_str: str, **kwargs: Any) -> Any:
         super().on_tool_start(serialized, input_str, **kwargs)
 
         tool_name = serialized.get("name")
+        self.tool_timer.start(kwargs.get("run_id"))
     
-        await self.handler['callbacks'][0].send_log(f"Agent: {self.agent.role}\nTool: {tool_name}\nInput: {input_str}")
+        await self.context.send_log(input_str, type="tool_start", agent=self.agent.role, tool=tool_name)
 
     async def on_tool_end(self, output: str, **kwargs: Any) -> Any:
         super().on_tool_end(output, **kwargs)
-        await self.handler['callbacks'][0].send_log(f"Tool Output: {output}")
+        duration = self.tool_timer.stop(kwargs.get("run_id"))
+        if duration is not None:
+            record_span("tool", duration, self.context.session_id,
+                        agent=self.agent.role, output_bytes=len(f"{output}"))
+        record_payload("tool_output", len(f"{output}"))
+        await self.context.send_log(output, type="tool_end", agent=self.agent.role)
+
+# Tools that already cache their results in the shared search cache (search_tools.py, per-endpoint TTLs)
+SELF_CACHING_TOOLS = {SEARCH_INTERNAL_DOCUMENTS_TOOL, SEARCH_INTERNET_TOOL, SEARCH_NEWS_TOOL}
+
+class SearchCacheAwareHandler(CacheHandler):
+    """CrewAI tool cache that leaves the self-caching tools to the shared search cache instead of storing their output twice."""
+
+    def add(self, tool, input, output):
+        if tool not in SELF_CACHING_TOOLS:
+            super().add(tool, input, output)
+
+    def read(self, tool, input) -> Optional[str]:
+        if tool in SELF_CACHING_TOOLS:
+            return None
+        return super().read(tool, input)
 
 class CustomAgent(Agent):
 
-    handler: Any = None
+    execution_context: Any = None
 
-    def __init__(self, handler: Any, **kwargs):
+    def __init__(self, execution_context: ExecutionContext, **kwargs):
         super().__init__(**kwargs)
-        self.handler = handler
+        self.execution_context = execution_context
 
     def set_cache_handler(self, cache_handler) -> None:
+        # search tools answer from the shared search cache, shared with other crews
+        if not isinstance(cache_handler, SearchCacheAwareHandler):
+            cache_handler = SearchCacheAwareHandler()
         super().set_cache_handler(cache_handler)
    
-        self.tools_handler = CustomToolsHandler(handler=self.handler, cache_handler=cache_handler, agent=self)
-
-def create_crew_from_json(json_data):
-    # Converting JSON string to a Python dictionary
-    data = json.loads(json_data)
-
-    # Creating agent and task instances
+        self.tools_handler = CustomToolsHandler(context=self.execution_context, cache_handler=cache_handler, agent=self)
+
+class AgentTokenHandler(BaseCallbackHandler):
+    """Forwards the token deltas of an agent's LLM to the session's websocket handler."""
+
+    def __init__(self, context: ExecutionContext, agent_role: str):
+        self.context = context
+        self.agent_role = agent_role
+        self.timer = SpanTimer()
+        self.token_counts = {}
+
+    def on_llm_start(self, serialized: Dict[str, Any], prompts: Any, **kwargs: Any) -> Any:
+        self.timer.start(kwargs.get("run_id"))
+
+    def on_chat_model_start(self, serialized: Dict[str, Any], messages: Any, **kwargs: Any) -> Any:
+        self.timer.start(kwargs.get("run_id"))
+
+    def on_llm_new_token(self, token: str, **kwargs: Any) -> Any:
+        run_id = kwargs.get("run_id")
+        self.token_counts[run_id] = self.token_counts.get(run_id, 0) + 1
+        self.context.callback_handler.send_token(token, agent=self.agent_role, run_id=run_id)
+
+    def on_llm_end(self, response: Any, **kwargs: Any) -> Any:
+        run_id = kwargs.get("run_id")
+        prompt_tokens, completion_tokens = token_usage(response)
+        # streamed responses carry no usage; every delta is one token
+        completion_tokens = completion_tokens or self.token_counts.pop(run_id, 0)
+        record_tokens("agent", prompt_tokens, completion_tokens)
+        self.context.budget.charge_tokens(prompt_tokens + completion_tokens)
+        duration = self.timer.stop(run_id)
+        if duration is not None:
+            record_span("agent_llm", duration, self.context.session_id, agent=self.agent_role,
+                        prompt_tokens=prompt_tokens, completion_tokens=completion_tokens)
+
+
+def create_agents(agents_data, context: ExecutionContext):
     agents = []
-    tasks = []
     agent_by_name = {}  # Dictionary with agent names as keys and agent objects as values
 
-    for agent_data in data['agents']:
-
-        tools = [tools_by_name[tool_name] for tool_name in agent_data['tools']]
+    for agent_data in agents_data:
 
-        custom_handler = None
-        if var:
-            try:
-                websocketHandler = var.get()
-                
-                custom_handler = CustomToolsHandler(handler=websocketHandler, agent=agent)
-
-            except Exception as e:
-                print(f"Failed to get websocketHandler: {str(e)}")
-                custom_handler = None
+        # the agent's own copies of the tools, checked against this run's budget and cancel token
+        tools = bind_tools([tools_by_name[tool_name] for tool_name in agent_data['tools']], context)
 
+        # the tools handler (websocket logs) is created by CustomAgent.set_cache_handler from the context
         #llm = ChatOpenAI(model="gpt-3.5-turbo-16k", callbacks=[custom_handler])
-
-        agent = CustomAgent(
-            
-            handler=custom_handler,
-            allow_delegation=True,
-            role=agent_data['role'],
-            goal=agent_data['goal'],
-            backstory=agent_data['backstory'],
-            verbose=True,
-            tools=tools,  # In actual implementation, tools may need to be converted to appropriate objects.
-            
-            #llm=llm   # causes token limits occasionally 
+        # calls of runs without a client (scripts, benchmarks) wait behind interactive sessions
+        priority = "interactive" if context.callback_handler is not None else "batch"
+        session_key = str(context.session_id) if context.session_id is not None else None
+        if STREAM_AGENT_TOKENS and context.callback_handler is not None:
+            # stream the agent's thoughts token by token instead of waiting for each step to finish
+            token_handler = AgentTokenHandler(context, agent_data['role'])
+            llm = make_llm(AGENT_MODEL_NAME, streaming=True, callbacks=[token_handler, context.cancel_handler],
+                           priority=priority, session_key=session_key)
+        else:
+            # CrewAI would otherwise create a new OpenAI client for every agent
+            llm = make_llm(AGENT_MODEL_NAME, callbacks=[context.cancel_handler],
+                           priority=priority, session_key=session_key)
+
+        agent = agent_pool.acquire(
+            agent_data,
+            build=lambda: CustomAgent(
+
+                execution_context=context,
+                allow_delegation=True,
+                role=agent_data['role'],
+                goal=agent_data['goal'],
+                backstory=agent_data['backstory'],
+                verbose=True,
+                tools=tools,  # In actual implementation, tools may need to be converted to appropriate objects.
+                step_callback=context.check_step,  # stops the agent loop once the run is cancelled
+
+                llm=llm
+            ),
+            reset=lambda agent: reset_agent(agent, agent_data, context, tools, llm),
         )
 
-        #agent.custom_handler=custom_handler
-
-
 
         agents.append(agent)
         agent_by_name[agent_data['name']] = agent  # Mapping agent name to agent object
 
-    for task_data in data['tasks']:
-        # Finding the agent assigned to the task. In this example, matching by name.
-        assigned_agent = agent_by_name.get(task_data['agent'], None)
+    return agents, agent_by_name
+
+
+def reset_agent(agent, agent_data, context, tools, llm):
+    # A pooled agent already has its role; the Crew re-creates its tools handler and executor.
+    agent.goal = agent_data['goal']
+    agent.backstory = agent_data['backstory']
+    agent.execution_context = context
+    agent.tools = tools
+    # keep CrewAI's own token counter, drop the previous run's streaming and cancellation handlers
+    llm.callbacks = list(llm.callbacks or []) + [
+        callback for callback in (agent.llm.callbacks or [])
+        if not isinstance(callback, (AgentTokenHandler, CancellationCallbackHandler))]
+    agent.llm = llm
+    agent.crew = None
+    agent.step_callback = context.check_step
+    if hasattr(agent, "tools_results"):
+        agent.tools_results = []
+
+def release_crew(crew):
+    """Returns the crew's agents to the pool once the crew has finished."""
+    agent_pool.release(crew.agents)
+
+
+# Agents built ahead of time while the planner was still streaming its tasks.
+# Keyed by run and the canonical JSON of the agents array so create_crew_from_plan of the same run picks them up.
+# Written from the planner's stream and read from crew threads, so every access holds the lock.
+prebuilt_agents = {}
+prebuilt_agents_lock = threading.Lock()
+agent_builder = ThreadPoolExecutor(max_workers=2, thread_name_prefix="agent-builder")
+
+def agents_key(agents_data, context):
+    # only the fields a compiled plan keeps, so raw planner agents match their compiled form
+    fields = ("name", "role", "goal", "backstory", "tools")
+    agents_data = [{field: agent_data.get(field) for field in fields} if isinstance(agent_data, dict) else agent_data
+                   for agent_data in agents_data]
+    return context.run_id, json.dumps(agents_data, sort_keys=True, ensure_ascii=False)
+
+def release_prebuilt_agents(future):
+    if not future.cancelled() and future.exception() is None:
+        agent_pool.release(future.result()[0])
+
+def prebuild_agents(agents_data, context):
+    dropped = []
+    with prebuilt_agents_lock:
+        while len(prebuilt_agents) >= 64:
+            # drop plans that were never executed
+            dropped.append(prebuilt_agents.pop(next(iter(prebuilt_agents))))
+        prebuilt_agents[agents_key(agents_data, context)] = agent_builder.submit(create_agents, agents_data, context)
+    for future in dropped:
+        future.add_done_callback(release_prebuilt_agents)
+
+def create_crew_from_json(json_data, context: Optional[ExecutionContext] = None):
+    # Validating the planner output before anything expensive is built
+    return create_crew_from_plan(compile_plan(json_data, tools_by_name), context or ExecutionContext())
+
+def create_crew_from_plan(plan: CrewPlan, context: ExecutionContext):
+    # Creating agent and task instances
+    tasks = []
+    agents_data = plan.agents_data()
+
+    with prebuilt_agents_lock:
+        future = prebuilt_agents.pop(agents_key(agents_data, context), None)
+    try:
+        agents, agent_by_name = future.result() if future else create_agents(agents_data, context)
+    except Exception as e:
+        print(f"Failed to prebuild agents: {str(e)}")
+        agents, agent_by_name = create_agents(agents_data, context)
+
+    for task_spec in plan.tasks:
+        # The compiled plan guarantees that every task refers to an existing agent name
+        assigned_agent = agent_by_name[task_spec.agent]
 
         task = Task(
-            description=task_data['description']+ ". The result MUST be written in Korean language.",
+            description=task_spec.description+ ". The result MUST be written in Korean language.",
             agent=assigned_agent,
             expected_output="사용자의 요구 사항에 맞는 적절한 결과"
         )
@@ -142,8 +274,8 @@ prompt_template = """
 
     To achieve a certain Goal, multiple Agents will collaborate to solve problems. Therefore, divide the necessary expertise areas to solve the problem with at least two or more Agent if possible.
     It mainly consists of the configuration of Agents and the Tasks each Agent performs. And divide the Tasks so that each Agent can deal with problems in their expertise area by passing work among themselves.
-    The definition of tools that each Agent can use is as follows: SearchTools.search_internet, CalculatorTools.calculate, SearchTools.search_internal_documents, PowerpointTools.generate_slide
-    Since the Tasks will be executed sequentially, they must be defined in order.
+    The definition of tools that each Agent can use is as follows: {tools}
+    Tasks must be defined in order. Each Task has a unique name and lists in "depends_on" the names of the Tasks whose results it needs; Tasks that do not depend on each other are executed in parallel.
     the result MUST be written in Korean language.
     All results must be generated in JSON format with key values(as valid JSON using double quotes around keys and values).
 
@@ -162,8 +294,12 @@ prompt_template = """
         }}],
         "tasks":[
             {{
+            "name": "unique name of the task (e.g., news_research)",
             "description": "Task description (e.g., Collect and summarize recent news articles, press releases, and market analyses related to the stock and its industry. Pay special attention to any significant events, market sentiments, and analysts' opinions. Also include upcoming events like earnings and others. Your final answer MUST be a report that includes a comprehensive summary of the latest news, any notable shifts in market sentiment, and potential impacts on the stock. Also make sure to return the stock ticker. Make sure to use the most recent data as possible. Selected company by the customer: {{company}})",
-            "agent": "agent assigned to the task (e.g., agent)"
+            "agent": "agent assigned to the task (e.g., agent)",
+            "depends_on": [
+                "names of the tasks whose results this task needs, empty if none (e.g., news_research)"
+            ]
             }}
         ]
     }}
@@ -171,10 +307,29 @@ prompt_template = """
 
     Please configure a crew for the following mission: {topic}
     """
+# tool names only; listing them does not import the tools
+prompt_template = prompt_template.replace("{tools}", ", ".join(tools_by_name.names()))
 prompt = ChatPromptTemplate.from_template(prompt_template)
 
-# Setting up the OpenAI model
-model = ChatOpenAI(model="gpt-3.5-turbo", callbacks=[])
+# Asked when the planner output fails validation; only the listed problems need fixing
+reask_prompt = ChatPromptTemplate.from_template("""
+    You created the following CrewAI configuration for the mission: {topic}
+
+    {output}
+
+    It cannot be used because of these problems:
+    {errors}
+
+    Fix only these problems and return the complete corrected configuration as VALID JSON
+    (double-quoted keys and values, no comments, no code fences).
+    """)
+
+# Setting up the OpenAI model (streaming so that token deltas reach the callbacks);
+# created with the chain rather than at import
+def create_planner_model():
+    # served before agent calls; the session comes from the run metadata (ExecutionContext.to_config)
+    # the "planner" tag labels its calls in the websocket handler's token metrics
+    return make_llm("gpt-3.5-turbo", streaming=True, priority="planner").with_config(tags=["planner"])
 
 
 # Replace the StrOutputParser instance with JSONOutputParser
@@ -183,32 +338,80 @@ model = ChatOpenAI(model="gpt-3.5-turbo", callbacks=[])
 output_parser = StrOutputParser()
 
 # Defining a function to execute CrewAI kickoff
-def execute_crew_kickoff(crew_config):
-    crew = create_crew_from_json(crew_config)
+def execute_crew_kickoff(crew_config, config):
+    # per-run state comes from the invoke config, never from module globals
+    context = get_execution_context(config)
+    session_id = context.session_id
+    context.cancel_token.raise_if_cancelled()
+
+    plan = compile_plan(crew_config, tools_by_name)
+    with span("crew_construction", session_id):
+        crew = create_crew_from_plan(plan, context)
     #crew.language = "ko"
     print("Executing CrewAI kickoff with the following configuration:\n", json.dumps(crew_config, indent=4))
 
-
-    
-    if var:
-        try:
-            crew.config = var.get()
-        except:
-            crew.config = None
-
-    result = crew.kickoff()
+    # tasks of this session whose description, agent and upstream outputs are unchanged since an earlier
+    # run are restored; runs without a session never share outputs
+    checkpoint_store = get_checkpoint_store()
+    checkpoints = None
+    if checkpoint_store is not None and session_id is not None:
+        checkpoints = checkpoint_store.for_crew(crew, str(session_id), on_restore=lambda task, output: context.log(
+            output, type="task_restored", agent=task.agent.role if task.agent else None))
+
+    try:
+        with span("crew_execution", session_id, tasks=len(plan.tasks)):
+            if plan.parallel:
+                # Independent tasks run concurrently; wall-clock follows the critical path
+                result = run_crew_graph(crew, plan.dependencies(), checkpoints=checkpoints)
+            elif checkpoints is not None:
+                # the sequential process as a chain of tasks, so that each one can be checkpointed
+                result = run_crew_graph(crew, sequential_dependencies(len(crew.tasks)), max_workers=1,
+                                        checkpoints=checkpoints)
+            else:
+                result = crew.kickoff()
+    finally:
+        release_crew(crew)
     return result
 
 from langchain.schema.runnable import RunnableLambda
 
 
+# Caching planner output so that repeated topics skip the planner LLM call
+config_cache = create_config_cache(prompt_template)
+
+
+def streaming_planner(planner):
+    """
+    Streams the planner output and starts building the agents as soon as the
+    `agents` array is complete, overlapping agent construction with the rest of
+    the planner call.
+    """
+    def plan(inputs, config):
+        context = get_execution_context(config)
+        scanner = IncrementalJsonScanner()
+        chunks = []
+        for chunk in planner.stream(inputs, config=config):
+            chunks.append(chunk)
+            for key, value in scanner.feed(chunk):
+                if key == "agents" and isinstance(value, list):
+                    prebuild_agents(value, context)
+        return "".join(chunks)
+
+    return RunnableLambda(plan, name="streaming_planner")
+
+
 def create_chain():
 # Configuring the chain
+    model = create_planner_model()
+    planner = prompt | model | output_parser
+    # stream() bypasses LangChain's LLM cache, so a cached planner is invoked instead
+    if STREAM_PLANNER and not llm_cache_enabled():
+        planner = streaming_planner(planner)
+    # invalid configs are sent back to the planner instead of failing during crew construction
+    planner = reasking_planner(planner, reask_prompt | model | output_parser, tools_by_name)
     return (
         RunnablePassthrough()
-        | prompt
-        | model
-        | output_parser
+        | config_cache.wrap(planner)
         | execute_crew_kickoff
     )
 
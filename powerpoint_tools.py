@@ -1,5 +1,5 @@
 import openai, json
-from pptx import Presentation
+from slide_renderer import render_presentations
 from typing import Union
 #openai.api_key = "YOUR_API_KEY_HERE"
 
@@ -39,15 +39,20 @@ prompt_template = ChatPromptTemplate.from_template(
 from langchain.tools import tool
 
 from langchain.pydantic_v1 import BaseModel, Field
-from typing import List
+from typing import List, Optional
 import json
 
 class SlideModel(BaseModel):
     header: str = Field(..., description="The title or main heading of the slide.")
     content: str = Field(..., description="The main body text of the slide.")
+    layout: Optional[Union[str, int]] = Field(None, description="Layout name or index in the template (default: Title and Content).")
 
 class PresentationModel(BaseModel):
     slides: List[SlideModel] = Field(..., description="A list of slides that make up the presentation.")
+    template: Optional[str] = Field(None, description="Name of the template in templates/ (default: python-pptx default).")
+
+class PresentationBatchModel(BaseModel):
+    presentations: List[PresentationModel] = Field(..., description="Several presentations rendered in one call.")
 
     
 # Convert response to PresentationModel
@@ -58,42 +63,32 @@ class PowerpointTools():
     def generate_slide(slides: str):
         """
         This method takes string representing JSON presentation: ```{'slides':[{'header':'header of the slide', content:'content of the slide'}]}```.
+        Several presentations can be generated at once: ```{'presentations':[{'slides':[...]}, {'slides':[...]}]}```.
+        Optionally a presentation can set 'template' (a template name) and a slide can set 'layout' (a layout name).
         Each slide in the presentation is created based on the header and content provided in the presentation data.
         The final PowerPoint file is returned, ready for saving or further manipulation.
         """
-        prs = Presentation()
+        presentations = []
 
         # Check if slides input is a string, and if so, parse it as JSON into SlideModel
         if isinstance(slides, str):
             slides_dict = json.loads(slides)
-            slides = PresentationModel(**slides_dict).slides
+            if isinstance(slides_dict, dict) and "presentations" in slides_dict:
+                presentations = PresentationBatchModel(**slides_dict).presentations
+            else:
+                presentations = [PresentationModel(**slides_dict)]
         # If slides is already a SlideModel instance, use it directly
         elif isinstance(slides, SlideModel):
-            slides = [slides]  # Convert single SlideModel instance to list for iteration
-
-        for slide in slides:
-            if isinstance(slide, dict):
-                slide = SlideModel(**slide)
-
-            slide_layout = prs.slide_layouts[1]
-            new_slide = prs.slides.add_slide(slide_layout)
-            
-            if slide.header:
-                title = new_slide.shapes.title
-                title.text = slide.header
-            
-            if slide.content:
-                shapes = new_slide.shapes
-                body_shape = shapes.placeholders[1]
-                tf = body_shape.text_frame
-                tf.text = slide.content
-                tf.fit_text(font_family="Arial", max_size=18, bold=True)
-                
-        import uuid
-        filename = "output/" + str(uuid.uuid4()) + ".pptx"
-        prs.save(filename)
-
-        return filename
+            presentations = [PresentationModel(slides=[slides])]  # Convert single SlideModel instance to a deck
+        else:
+            presentations = [PresentationModel(slides=[SlideModel(**slide) if isinstance(slide, dict) else slide for slide in slides])]
+
+        decks = [presentation.dict() for presentation in presentations]
+
+        # Building and saving decks is CPU bound; it runs in the render process pool
+        filenames = render_presentations(decks)
+
+        return filenames[0] if len(filenames) == 1 else "\n".join(filenames)
 
 # prs = PowerpointTool.generate_slide(response)
 # prs.save("output.pptx")
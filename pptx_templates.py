@@ -0,0 +1,116 @@
+import glob
+import hashlib
+import io
+import os
+import threading
+from typing import Dict, NamedTuple, Optional, Union
+
+
+TEMPLATE_DIR = os.getenv("TEMPLATE_DIR", "templates")
+DEFAULT_TEMPLATE = "default"
+DEFAULT_LAYOUT = "Title and Content"
+
+TITLE_TYPES = ("TITLE", "CENTER_TITLE", "VERTICAL_TITLE")
+BODY_TYPES = ("BODY", "OBJECT", "SUBTITLE", "VERTICAL_BODY", "VERTICAL_OBJECT")
+
+
+class LayoutInfo(NamedTuple):
+    index: int
+    title_idx: Optional[int]  # placeholder idx of the title, None if the layout has none
+    body_idx: Optional[int]   # placeholder idx of the body text
+
+
+class Template():
+    """A .pptx template read once: its bytes are cached and the layout table precomputed; each deck re-parses the package."""
+
+    def __init__(self, name: str, blob: bytes):
+        from pptx import Presentation
+
+        self.name = name
+        self.blob = blob
+        self.layouts: Dict[str, LayoutInfo] = {}
+        self.layouts_by_index = []
+
+        prs = Presentation(io.BytesIO(blob))
+        for index, layout in enumerate(prs.slide_layouts):
+            title_idx = body_idx = None
+            for placeholder in layout.placeholders:
+                kind = placeholder.placeholder_format.type
+                kind = getattr(kind, "name", str(kind)).split(" ")[0]
+                if title_idx is None and kind in TITLE_TYPES:
+                    title_idx = placeholder.placeholder_format.idx
+                elif body_idx is None and kind in BODY_TYPES:
+                    body_idx = placeholder.placeholder_format.idx
+            info = LayoutInfo(index, title_idx, body_idx)
+            self.layouts_by_index.append(info)
+            self.layouts.setdefault(layout.name, info)
+
+    def layout(self, layout: Union[str, int, None] = None) -> LayoutInfo:
+        if layout is None:
+            layout = DEFAULT_LAYOUT if DEFAULT_LAYOUT in self.layouts else 1
+        if isinstance(layout, int) or (isinstance(layout, str) and layout.isdigit()):
+            index = int(layout)
+            if not 0 <= index < len(self.layouts_by_index):
+                raise ValueError(f"Template '{self.name}' has no layout {index}")
+            return self.layouts_by_index[index]
+        if layout not in self.layouts:
+            raise ValueError(f"Template '{self.name}' has no layout '{layout}'. Available: {sorted(self.layouts)}")
+        return self.layouts[layout]
+
+    def new_presentation(self):
+        """A fresh presentation parsed from the cached bytes (no disk access, but a full package parse per deck)."""
+        from pptx import Presentation
+
+        return Presentation(io.BytesIO(self.blob))
+
+
+class TemplateRegistry():
+    """
+    Process-wide registry of named templates. `default` is python-pptx's built-in
+    template; every `<TEMPLATE_DIR>/<name>.pptx` is available as `<name>`. Template
+    files are read and their layouts analyzed once per process, on first use.
+    """
+
+    def __init__(self, template_dir: str = TEMPLATE_DIR):
+        self.template_dir = template_dir
+        self.templates: Dict[str, Template] = {}
+        self.fingerprints: Dict[tuple, str] = {}
+        self.lock = threading.Lock()
+
+    def paths(self) -> Dict[str, str]:
+        import pptx
+
+        paths = {DEFAULT_TEMPLATE: os.path.join(os.path.dirname(pptx.__file__), "templates", "default.pptx")}
+        for path in glob.glob(os.path.join(self.template_dir, "*.pptx")):
+            paths[os.path.splitext(os.path.basename(path))[0]] = path
+        return paths
+
+    def get(self, name: Optional[str] = None) -> Template:
+        name = name or DEFAULT_TEMPLATE
+        template = self.templates.get(name)
+        if template is not None:
+            return template
+        with self.lock:
+            if name not in self.templates:
+                paths = self.paths()
+                if name not in paths:
+                    raise ValueError(f"Unknown template '{name}'. Available: {sorted(paths)}")
+                with open(paths[name], "rb") as file:
+                    self.templates[name] = Template(name, file.read())
+            return self.templates[name]
+
+    def fingerprint(self, name: Optional[str] = None) -> str:
+        """sha256 of the template file, memoized by path and mtime. Does not parse the template."""
+        name = name or DEFAULT_TEMPLATE
+        paths = self.paths()
+        if name not in paths:
+            raise ValueError(f"Unknown template '{name}'. Available: {sorted(paths)}")
+        stat = os.stat(paths[name])
+        key = (paths[name], stat.st_size, stat.st_mtime_ns)
+        if key not in self.fingerprints:
+            with open(paths[name], "rb") as file:
+                self.fingerprints[key] = hashlib.sha256(file.read()).hexdigest()
+        return self.fingerprints[key]
+
+
+template_registry = TemplateRegistry()
@@ -0,0 +1,115 @@
+import asyncio
+import contextvars
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict
+
+
+MAX_CONCURRENT_CREWS = int(os.getenv("MAX_CONCURRENT_CREWS", "4"))
+MAX_PENDING_PER_SESSION = int(os.getenv("MAX_PENDING_PER_SESSION", "2"))
+MAX_PENDING_TOTAL = int(os.getenv("MAX_PENDING_TOTAL", "32"))
+
+
+class AdmissionError(Exception):
+    """Raised when a crew run is rejected because the node is saturated."""
+
+
+class CrewScheduler():
+    """
+    Runs blocking crew executions on a bounded thread pool so that the websocket
+    event loop stays free to stream logs for every connected session.
+
+    Each session has its own FIFO queue (runs of one session never overlap), while
+    runs of different sessions execute in parallel up to `max_workers`.
+    """
+
+    def __init__(self,
+                 max_workers: int = MAX_CONCURRENT_CREWS,
+                 max_pending_per_session: int = MAX_PENDING_PER_SESSION,
+                 max_pending_total: int = MAX_PENDING_TOTAL):
+        self.max_workers = max_workers
+        self.max_pending_per_session = max_pending_per_session
+        self.max_pending_total = max_pending_total
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="crew")
+        self.session_queues: Dict[Any, asyncio.Queue] = {}
+        self.session_workers: Dict[Any, asyncio.Task] = {}
+        self.pending = 0
+        self.running = 0
+
+    def submit(self, session_id: Any, fn: Callable, *args: Any) -> asyncio.Future:
+        """
+        Queue `fn(*args)` for the given session and return a future with its result.
+        The caller's context variables are captured at submit time.
+        """
+        if self.pending >= self.max_pending_total:
+            raise AdmissionError(f"Server is busy ({self.pending} runs pending). Please retry later.")
+
+        queue = self.session_queues.get(session_id)
+        if queue is None:
+            queue = asyncio.Queue(maxsize=self.max_pending_per_session)
+            self.session_queues[session_id] = queue
+        if queue.full():
+            raise AdmissionError(f"Too many pending runs for this session (max {self.max_pending_per_session}).")
+
+        future = asyncio.get_running_loop().create_future()
+        queue.put_nowait((contextvars.copy_context(), fn, args, future))
+        self.pending += 1
+
+        worker = self.session_workers.get(session_id)
+        if worker is None or worker.done():
+            self.session_workers[session_id] = asyncio.create_task(self._drain(queue))
+        return future
+
+    async def _drain(self, queue: asyncio.Queue):
+        loop = asyncio.get_running_loop()
+        while True:
+            item = await queue.get()
+            if item is None:
+                # session closed
+                queue.task_done()
+                return
+            ctx, fn, args, future = item
+            try:
+                if future.cancelled():
+                    continue
+                self.running += 1
+                try:
+                    result = await loop.run_in_executor(self.executor, ctx.run, fn, *args)
+                finally:
+                    self.running -= 1
+                if not future.done():
+                    future.set_result(result)
+            except Exception as e:
+                if not future.done():
+                    future.set_exception(e)
+            finally:
+                self.pending -= 1
+                queue.task_done()
+
+    def close_session(self, session_id: Any):
+        """
+        Drop queued (not yet started) runs of a disconnected session. A run that is
+        already executing on a worker thread cannot be interrupted here; the session
+        worker exits as soon as it finishes.
+        """
+        queue = self.session_queues.pop(session_id, None)
+        self.session_workers.pop(session_id, None)
+        if queue is None:
+            return
+        while not queue.empty():
+            _, _, _, future = queue.get_nowait()
+            future.cancel()
+            self.pending -= 1
+            queue.task_done()
+        queue.put_nowait(None)
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "max_workers": self.max_workers,
+            "running": self.running,
+            "pending": self.pending,
+            "sessions": len(self.session_queues),
+        }
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,133 @@
+import asyncio
+import hashlib
+import json
+import os
+import threading
+from collections import defaultdict
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from cache_backends import SQLiteCacheBackend
+from config_cache import normalize_topic
+from tracing import record_cache
+
+
+SEARCH_CACHE_ENABLED = os.getenv("SEARCH_CACHE_ENABLED", "true").lower() == "true"
+SEARCH_CACHE_PATH = os.getenv("SEARCH_CACHE_PATH", "cache/search_cache.sqlite")
+SEARCH_CACHE_MAX_ENTRIES = int(os.getenv("SEARCH_CACHE_MAX_ENTRIES", "20000"))
+SEARCH_CACHE_MAX_BYTES = int(os.getenv("SEARCH_CACHE_MAX_BYTES", str(256 * 1024 * 1024)))
+SEARCH_CACHE_DEFAULT_TTL = float(os.getenv("SEARCH_CACHE_DEFAULT_TTL", "3600"))
+
+# Names of the search tools (search_tools.py), which cache their results here. CrewAI's tool cache skips
+# them (main.SELF_CACHING_TOOLS); defined here so main can use them without importing the tool module.
+SEARCH_INTERNAL_DOCUMENTS_TOOL = "Search Internal Documents"
+SEARCH_INTERNET_TOOL = "Search the internet"
+SEARCH_NEWS_TOOL = "Search news on the internet"
+
+# seconds per endpoint, overridable with e.g. SEARCH_CACHE_TTLS='{"serper:news": 600}'
+SEARCH_CACHE_TTLS = {
+    "serper:search": 6 * 3600,
+    "serper:news": 1800,
+    "memento:retrieve": 600,
+    **json.loads(os.getenv("SEARCH_CACHE_TTLS", "{}")),
+}
+
+
+class SearchResultCache():
+    """
+    Search results shared across crews and processes, stored in SQLite and keyed by
+    endpoint plus normalized query. Every endpoint has its own TTL.
+    """
+
+    def __init__(self, backend: SQLiteCacheBackend, ttls: Dict[str, float] = SEARCH_CACHE_TTLS,
+                 default_ttl: float = SEARCH_CACHE_DEFAULT_TTL):
+        self.backend = backend
+        self.ttls = ttls
+        self.default_ttl = default_ttl
+        self.hits = defaultdict(int)
+        self.misses = defaultdict(int)
+        self.lock = threading.Lock()
+
+    def key(self, endpoint: str, query: str) -> str:
+        digest = hashlib.sha256(normalize_topic(str(query)).encode("utf-8")).hexdigest()
+        return f"{endpoint}:{digest}"
+
+    def ttl(self, endpoint: str) -> float:
+        if endpoint in self.ttls:
+            return self.ttls[endpoint]
+        # e.g. "serper:images" falls back to "serper"
+        return self.ttls.get(endpoint.split(":", 1)[0], self.default_ttl)
+
+    def get(self, endpoint: str, query: str) -> Optional[str]:
+        value = self.backend.get(self.key(endpoint, query))
+        with self.lock:
+            if value is None:
+                self.misses[endpoint] += 1
+            else:
+                self.hits[endpoint] += 1
+        record_cache(endpoint, value is not None)
+        return value
+
+    def set(self, endpoint: str, query: str, value: str):
+        self.backend.set(self.key(endpoint, query), value, ttl=self.ttl(endpoint))
+
+    def get_or_fetch(self, endpoint: str, query: str, fetch: Callable[[], str]) -> str:
+        value = self.get(endpoint, query)
+        if value is None:
+            value = fetch()
+            if value:
+                self.set(endpoint, query, value)
+        return value
+
+    async def aget_or_fetch(self, endpoint: str, query: str, afetch: Callable[[], Awaitable[str]]) -> str:
+        value = await asyncio.to_thread(self.get, endpoint, query)
+        if value is None:
+            value = await afetch()
+            if value:
+                await asyncio.to_thread(self.set, endpoint, query, value)
+        return value
+
+    def stats(self) -> Dict[str, Any]:
+        with self.lock:
+            endpoints = sorted(set(self.hits) | set(self.misses))
+            per_endpoint = {endpoint: {"hits": self.hits[endpoint], "misses": self.misses[endpoint]}
+                            for endpoint in endpoints}
+        return {
+            "endpoints": per_endpoint,
+            "entries": len(self.backend),
+            "size_bytes": self.backend.size_bytes(),
+            "evictions": self.backend.evictions,
+        }
+
+
+class _NoSearchCache(SearchResultCache):
+    def __init__(self):
+        super().__init__(backend=None)
+
+    def get(self, endpoint, query):
+        return None
+
+    def set(self, endpoint, query, value):
+        pass
+
+    def stats(self):
+        return {"endpoints": {}, "entries": 0, "size_bytes": 0, "evictions": 0}
+
+
+_search_cache = None
+_search_cache_lock = threading.Lock()
+
+
+def get_search_cache() -> SearchResultCache:
+    """Process-wide search cache, opened on first use."""
+    global _search_cache
+    if _search_cache is None:
+        with _search_cache_lock:
+            if _search_cache is None:
+                if SEARCH_CACHE_ENABLED:
+                    backend = SQLiteCacheBackend(SEARCH_CACHE_PATH, table="search_results",
+                                                 max_entries=SEARCH_CACHE_MAX_ENTRIES,
+                                                 max_bytes=SEARCH_CACHE_MAX_BYTES)
+                    _search_cache = SearchResultCache(backend)
+                else:
+                    _search_cache = _NoSearchCache()
+    return _search_cache
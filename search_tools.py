@@ -1,84 +1,151 @@
-import json
+import asyncio
 import os
+from functools import partial
 
-import requests
 from langchain.tools import tool
 
+from http_client import apost_json, post_json
+from search_cache import SEARCH_INTERNAL_DOCUMENTS_TOOL, SEARCH_INTERNET_TOOL, SEARCH_NEWS_TOOL, get_search_cache
+from tool_output import (TOOL_OUTPUT_MAX_CANDIDATES, Passage, compact_passages, filter_metadata, iter_json_array,
+                         iter_response_text)
+
+
+INTERNAL_DOCS_BACKEND = os.getenv("INTERNAL_DOCS_BACKEND", "memento").lower()  # memento | local (vector_index.py)
+MEMENTO_URL = os.getenv("MEMENTO_URL", "http://memento.process-gpt.io/retrieve")
+# MEMENTO_URL = "http://localhost:8005/retrieve"
+SERPER_URL = os.getenv("SERPER_URL", "https://google.serper.dev")
+
+
+def _serper_headers():
+  return {'X-API-KEY': os.getenv('SERPER_API_KEY', '')}
+
+
+def _memento_passages(items):
+  # only whitelisted metadata is kept
+  passages = []
+  for item in items:
+    node = item.get('node') or {}
+    passages.append(Passage(text=node.get('text') or '', metadata=filter_metadata(node.get('metadata') or {}),
+                            score=item.get('score')))
+  return passages
+
+
+def _read_memento_passages(response):
+  # parsed item by item while the body streams in
+  return _memento_passages(iter_json_array(iter_response_text(response), limit=TOOL_OUTPUT_MAX_CANDIDATES))
+
+
+def _render_document(passage):
+  metadata_str = '\n'.join([f"{key}: {value}" for key, value in passage.metadata.items()])
+  return '\n'.join([
+      metadata_str,
+      "Content:",
+      passage.text,
+      "\n-----------------"
+  ])
+
+
+def _format_documents(query, passages):
+  return compact_passages(passages, query, _render_document)
+
+
+def _serper_passages(results, top_result_to_return=4):
+  passages = []
+  for i, result in enumerate(results[:top_result_to_return]):
+    try:
+      passages.append(Passage(text=result['snippet'], metadata={'title': result['title'], 'link': result['link']},
+                              score=-i))  # keep Google's order
+    except KeyError:
+      next
+  return passages
+
+
+def _render_serper(passage):
+  return '\n'.join([
+      f"Title: {passage.metadata['title']}", f"Link: {passage.metadata['link']}",
+      f"Snippet: {passage.text}", "\n-----------------"
+  ])
+
+
+def _format_serper(query, results):
+  return compact_passages(_serper_passages(results), query, _render_serper)
+
+
+def _fetch_internal_documents(query):
+  return _format_documents(query, post_json(MEMENTO_URL, {"query": query}, decode=_read_memento_passages))
+
+
+def _search_local_documents(query):
+  # INTERNAL_DOCS_BACKEND=local: the on-disk vector index answers in memento's result shape
+  from vector_index import get_vector_index
+  return _format_documents(query, _memento_passages(get_vector_index().search(query)))
+
+
+def _internal_documents_endpoint():
+  # the index generation is part of the cache key, so results cached before an update are not served
+  if INTERNAL_DOCS_BACKEND == "local":
+    from vector_index import get_vector_index
+    return f"local:retrieve:{get_vector_index().stats()['generation']}"
+  return "memento:retrieve"
+
+
+def _fetch_internet(query):
+  results = post_json(f"{SERPER_URL}/search", {"q": query}, headers=_serper_headers())
+  return _format_serper(query, results.get('organic', []))
+
+
+def _fetch_news(query):
+  results = post_json(f"{SERPER_URL}/news", {"q": query}, headers=_serper_headers())
+  return _format_serper(query, results.get('news', []))
+
 
 class SearchTools():
 
-  @tool("Search Internal Documents")
+  @tool(SEARCH_INTERNAL_DOCUMENTS_TOOL)
   def search_internal_documents(query):
     """Useful to search internal documents based on a given query and return relevant results"""
-    # url = "http://localhost:8005/retrieve"
-    url = "http://memento.process-gpt.io/retrieve"
-    payload = json.dumps({"query": query})
-    headers = {
-        'content-type': 'application/json'
-    }
-    response = requests.request("POST", url, headers=headers, data=payload)
-    results = response.json()
-    string = []
-    for item in results:
-        node = item['node']
-        metadata = node['metadata']
-        content = node['text']
-        metadata_str = '\n'.join([f"{key}: {value}" for key, value in metadata.items()])
-        string.append('\n'.join([
-            metadata_str,
-            "Content:",
-            content,
-            "\n-----------------"
-        ]))
-
-    return '\n'.join(string)
-
-  @tool("Search the internet")
+    fetch = _search_local_documents if INTERNAL_DOCS_BACKEND == "local" else _fetch_internal_documents
+    return get_search_cache().get_or_fetch(_internal_documents_endpoint(), query, partial(fetch, query))
+
+  @tool(SEARCH_INTERNET_TOOL)
   def search_internet(query):
-    """Useful to search the internet 
+    """Useful to search the internet
     about a a given topic and return relevant results"""
-    top_result_to_return = 4
-    url = "https://google.serper.dev/search"
-    payload = json.dumps({"q": query})
-    headers = {
-        'X-API-KEY': os.getenv('SERPER_API_KEY', ''),
-        'content-type': 'application/json'
-    }
-    response = requests.request("POST", url, headers=headers, data=payload)
-    results = response.json()['organic']
-    string = []
-    for result in results[:top_result_to_return]:
-      try:
-        string.append('\n'.join([
-            f"Title: {result['title']}", f"Link: {result['link']}",
-            f"Snippet: {result['snippet']}", "\n-----------------"
-        ]))
-      except KeyError:
-        next
-
-    return '\n'.join(string)
-
-  @tool("Search news on the internet")
+    return get_search_cache().get_or_fetch("serper:search", query, partial(_fetch_internet, query))
+
+  @tool(SEARCH_NEWS_TOOL)
   def search_news(query):
     """Useful to search news about a company, stock or any other
     topic and return relevant results"""""
-    top_result_to_return = 4
-    url = "https://google.serper.dev/news"
-    payload = json.dumps({"q": query})
-    headers = {
-        'X-API-KEY': os.getenv('SERPER_API_KEY', ''),
-        'content-type': 'application/json'
-    }
-    response = requests.request("POST", url, headers=headers, data=payload)
-    results = response.json()['news']
-    string = []
-    for result in results[:top_result_to_return]:
-      try:
-        string.append('\n'.join([
-            f"Title: {result['title']}", f"Link: {result['link']}",
-            f"Snippet: {result['snippet']}", "\n-----------------"
-        ]))
-      except KeyError:
-        next
-
-    return '\n'.join(string)
+    return get_search_cache().get_or_fetch("serper:news", query, partial(_fetch_news, query))
+
+
+# Async variants used when the tools are awaited (e.g. tool.ainvoke from async agents).
+# They share the pooled connections and the in-flight coalescing of the sync versions.
+
+async def asearch_internal_documents(query):
+  async def fetch():
+    if INTERNAL_DOCS_BACKEND == "local":
+      return await asyncio.to_thread(_search_local_documents, query)
+    return _format_documents(query, await apost_json(MEMENTO_URL, {"query": query}, decode=_read_memento_passages))
+  endpoint = await asyncio.to_thread(_internal_documents_endpoint)
+  return await get_search_cache().aget_or_fetch(endpoint, query, fetch)
+
+
+async def asearch_internet(query):
+  async def fetch():
+    results = await apost_json(f"{SERPER_URL}/search", {"q": query}, headers=_serper_headers())
+    return _format_serper(query, results.get('organic', []))
+  return await get_search_cache().aget_or_fetch("serper:search", query, fetch)
+
+
+async def asearch_news(query):
+  async def fetch():
+    results = await apost_json(f"{SERPER_URL}/news", {"q": query}, headers=_serper_headers())
+    return _format_serper(query, results.get('news', []))
+  return await get_search_cache().aget_or_fetch("serper:news", query, fetch)
+
+
+SearchTools.search_internal_documents.coroutine = asearch_internal_documents
+SearchTools.search_internet.coroutine = asearch_internet
+SearchTools.search_news.coroutine = asearch_news
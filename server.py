@@ -1,119 +1,234 @@
 import asyncio
-from uuid import UUID
 import websockets
-from main import create_chain
-from langchain.callbacks import StdOutCallbackHandler
-from typing import Dict, Any, List, Union, Optional
-from main import get_config_context_var
-from langchain_core.agents import AgentAction, AgentFinish
+from crew_factory import agent_pool, get_chain
 import os
+import sys
+import json
+import time
+import uuid
+
+from scheduler import CrewScheduler, AdmissionError, MAX_PENDING_PER_SESSION
+from search_cache import get_search_cache
+from event_stream import FINAL_EVENT_TYPES, EventStream, make_event
+from file_transfer import serve_file_request
+from execution_context import ExecutionContext, RunCancelled, RUN_TIMEOUT, get_execution_context
+from job_queue import create_job_queue
+from llm_cache import get_llm_cache
+from checkpoint_store import get_checkpoint_store
+from tracing import start_metrics_server
+from websocket_callbacks import WebSocketCallbackHandler
 
 # 세션별 체인 실행 상태를 관리하기 위한 딕셔너리
 session_chains = {}
 
+# 세션별 진행 중인 실행 컨텍스트 (연결 종료/새 메시지 시 취소)
+session_runs = {}
+
+# 새 메시지가 오면 같은 세션의 이전 실행을 취소합니다.
+SUPERSEDE_RUNS = os.getenv("SUPERSEDE_RUNS", "true").lower() == "true"
+
+# 진행 중인 파일 전송 태스크
+file_transfers = set()
+
+# standalone: 이 프로세스에서 크루를 실행합니다.
+# frontend: 웹소켓 세션만 받고 작업은 공유 큐(JOB_QUEUE_URL)로 보내며, worker.py 프로세스가 실행 후 이벤트를 돌려보냅니다.
+SERVER_MODE = os.getenv("SERVER_MODE", "standalone")
+NODE_ID = os.getenv("NODE_ID") or uuid.uuid4().hex
+job_queue = create_job_queue() if SERVER_MODE == "frontend" else None
+
+# frontend 모드: 세션 키 -> 이벤트 버퍼, 세션 키 -> 진행 중인 작업 ID
+session_streams = {}
+session_jobs = {}
+
+# 서버는 체인(main, crewai, 도구 모듈)을 임포트하지 않고 먼저 리슨을 시작하고, 체인은 백그라운드에서 미리 생성합니다.
+# (콜백 핸들러와 LLM 캐시 때문에 langchain 은 시작 시 임포트됩니다.)
+PRELOAD_CHAIN = os.getenv("PRELOAD_CHAIN", "true").lower() == "true"
+
+# 크루 실행은 블로킹이므로 워커 스레드 풀에서 실행하여 이벤트 루프를 막지 않도록 합니다.
+scheduler = CrewScheduler()
+
+def config_cache_stats():
+    # main 모듈은 체인 생성 시 로드되므로, 통계 요청만으로 crewai 를 임포트하지 않습니다.
+    main = sys.modules.get("main")
+    return main.config_cache.stats() if main is not None else None
+
+def llm_cache_stats():
+    cache = get_llm_cache()
+    return cache.stats() if cache is not None else None
+
+def llm_scheduler_stats():
+    # 스케줄러는 첫 LLM 호출 시 로드됩니다.
+    module = sys.modules.get("llm_scheduler")
+    return module.get_llm_scheduler().stats() if module is not None else None
+
+def checkpoint_stats():
+    store = get_checkpoint_store()
+    return store.stats() if store is not None else None
+
+def run_chain(message, config):
+    # 워커 스레드에서 실행됩니다. 체인은 프로세스당 한 번만 생성됩니다.
+    # 대기열에 있는 동안 취소된 실행은 시작하지 않습니다.
+    get_execution_context(config).cancel_token.raise_if_cancelled()
+    chain = get_chain()
+    return chain.invoke({"topic": message}, config=config)
+
+async def wait_chain(event_stream, future, context):
+    try:
+        result = await future
+        # 실행 완료를 알리는 이벤트 (버퍼가 가득 차도 버려지지 않습니다)
+        event_stream.emit(make_event("result", f"{result}"))
+    except asyncio.CancelledError:
+        pass
+    except RunCancelled as e:
+        event_stream.emit(make_event("cancelled", context.cancel_token.reason or str(e)))
+    except Exception as e:
+        print(f"Chain execution failed: {str(e)}")
+        event_stream.emit(make_event("error", f"Chain execution failed: {str(e)}"))
+    finally:
+        session_runs.get(context.session_id, set()).discard(context)
+
+def cancel_session_runs(session_id, reason):
+    for context in session_runs.get(session_id, ()):
+        context.cancel(reason)
+
+async def submit_job(session_key, message):
+    # frontend 모드: 작업을 큐에 넣기만 하고 실행은 워커가 담당합니다.
+    jobs = session_jobs.setdefault(session_key, set())
+    if SUPERSEDE_RUNS:
+        await cancel_session_jobs(session_key, "superseded by a new message")
+    elif len(jobs) >= MAX_PENDING_PER_SESSION:
+        raise AdmissionError(f"Too many pending runs for this session (max {MAX_PENDING_PER_SESSION}).")
+    job = {
+        "job_id": uuid.uuid4().hex,
+        "node_id": NODE_ID,
+        "session_id": session_key,
+        "topic": message,
+        "deadline": time.time() + RUN_TIMEOUT if RUN_TIMEOUT else None,
+    }
+    await asyncio.to_thread(job_queue.enqueue, job)
+    jobs.add(job["job_id"])
+
+async def cancel_session_jobs(session_key, reason):
+    for job_id in list(session_jobs.get(session_key, ())):
+        await asyncio.to_thread(job_queue.cancel, job_id, reason)
+
+async def relay_events():
+    # 워커가 보낸 이벤트를 해당 세션의 이벤트 버퍼로 전달합니다.
+    while True:
+        try:
+            messages = await asyncio.to_thread(job_queue.consume, NODE_ID, 1.0)
+        except Exception as e:
+            print(f"Failed to read events from the job queue: {str(e)}")
+            await asyncio.sleep(1)
+            continue
+        for message in messages:
+            session_key = message["session_id"]
+            if message["event"].get("type") in FINAL_EVENT_TYPES:
+                session_jobs.get(session_key, set()).discard(message["job_id"])
+            event_stream = session_streams.get(session_key)
+            if event_stream is not None:
+                event_stream.emit(message["event"])
+
 async def server(websocket, path):
-    # 세션 식별을 위해 websocket 객체를 키로 사용
-    session_id = id(websocket)
+    # 세션 식별자: id(websocket) 는 연결이 끝난 뒤 재사용될 수 있어 체크포인트 범위로 쓸 수 없습니다.
+    session_id = uuid.uuid4().hex
     print(f"New session: {session_id}")
 
-    async for message in websocket:
-        if message.startswith("request_file:"):
-            filename = message.split(":", 1)[1]
-            await send_file(websocket, f"output/{filename}")
-        else:
-            # 세션별 체인 실행 로직
-            callback_handler = WebSocketCallbackHandler(websocket)
-            chain = create_chain()
-            
-            config = {
-                "callbacks": [callback_handler]
-            }
-
-            # 컨텍스트 변수 생성
-            var = get_config_context_var()
-            var.set(config)
-
-            await chain.ainvoke({"topic": message}, config=config)
-        # 체인 실행 결과를 클라이언트에게 전송
-        # 체인 실행 결과를 클라이언트에게 전송
-        # await websocket.send(f"Chain started for session {session_id} with topic: {message}")
-
-# start_server = websockets.serve(server, "localhost", 6789)
-start_server = websockets.serve(server, "0.0.0.0", 6789)
-
-asyncio.get_event_loop().run_until_complete(start_server)
-
-
-class WebSocketCallbackHandler(StdOutCallbackHandler):
-    def __init__(self, websocket):
-        self.websocket = websocket  # 웹소켓 클라이언트 객체를 직접 저장
+    # 로그 이벤트를 모아서 프레임 단위로 전송하는 세션별 버퍼
+    event_stream = EventStream(websocket, session_id=session_id).start()
+
+    # 세션의 파일 전송 순서를 보장하는 잠금
+    transfer_lock = asyncio.Lock()
+
+    # 여러 프론트엔드 노드에서도 유일한 세션 키
+    session_key = f"{NODE_ID}:{session_id}"
+    if job_queue is not None:
+        session_streams[session_key] = event_stream
+
+    try:
+        async for message in websocket:
+            if message.startswith("request_file:"):
+                # 큰 파일 전송 중에도 같은 세션의 다른 메시지를 처리할 수 있도록 별도 태스크로 스트리밍합니다.
+                # 같은 세션의 전송은 프레임이 섞이지 않도록 하나씩 순서대로 보냅니다.
+                task = asyncio.create_task(serve_file_request(websocket, message.split(":", 1)[1], transfer_lock))
+                file_transfers.add(task)
+                task.add_done_callback(file_transfers.discard)
+            elif message == "request_stats":
+                await websocket.send(json.dumps({
+                    "scheduler": scheduler.stats(),
+                    "config_cache": config_cache_stats(),
+                    "search_cache": get_search_cache().stats(),
+                    "agent_pool": agent_pool.stats(),
+                    "llm_cache": llm_cache_stats(),
+                    "llm_scheduler": llm_scheduler_stats(),
+                    "checkpoints": checkpoint_stats(),
+                    "job_queue": (await asyncio.to_thread(job_queue.stats)) if job_queue is not None else None,
+                }))
+            elif job_queue is not None:
+                try:
+                    await submit_job(session_key, message)
+                except AdmissionError as e:
+                    event_stream.emit(make_event("error", str(e)))
+            else:
+                # 세션별 체인 실행 로직
+                callback_handler = WebSocketCallbackHandler(event_stream)
 
-    async def send_log(self, message):
-        # 저장된 웹소켓 클라이언트 객체를 사용하여 로그 메시지를 전송
-        await self.websocket.send(message)
+                # 실행별 컨텍스트는 config 를 통해 명시적으로 전달됩니다 (전역 ContextVar 를 공유하지 않습니다).
+                context = ExecutionContext(session_id=session_id, callback_handler=callback_handler)
+                config = context.to_config()
 
-    async def on_chain_start(self, serialized: Dict[str, Any], inputs: Dict[str, Any], **kwargs: Any) -> Any:
-        await self.send_log(f"Chain started with inputs: {inputs}")
+                if SUPERSEDE_RUNS:
+                    # 이전 실행은 다음 단계/토큰/도구 호출 시점에 중단됩니다.
+                    cancel_session_runs(session_id, "superseded by a new message")
 
-    async def on_chain_end(self, outputs: Dict[str, Any], **kwargs: Any) -> Any:
-        try:
-            await self.send_log(f"{outputs['kwargs']['messages'][0]['kwargs']['content']}")
-        except:
-            try:
-                await self.send_log(f"{outputs['text']}")
-            except:
                 try:
-                    await self.send_log(f"{outputs['return_values']}")
-                except:
-                    await self.send_log(f"{outputs}")
-
-    async def on_agent_action(
-        self, action: AgentAction, color: Optional[str] = None, **kwargs: Any
-    ) -> Any:
-        """Run on agent action."""
-        await self.send_log(f"{action.log}")
-
-    def on_agent_finish(self, finish: AgentFinish, color: str | None = None, **kwargs: Any) -> None:
-        return super().on_agent_finish(finish, color, **kwargs)
-    
-    def on_tool_start(self, serialized: Dict[str, Any], input_str: str, *, run_id: UUID, parent_run_id: UUID | None = None, tags: List[str] | None = None, metadata: Dict[str, Any] | None = None, inputs: Dict[str, Any] | None = None, **kwargs: Any) -> Any:
-        return super().on_tool_start(serialized, input_str, run_id=run_id, parent_run_id=parent_run_id, tags=tags, metadata=metadata, inputs=inputs, **kwargs)
-    
-
-    async def on_tool_end(
-        self,
-        output: str,
-        color: Optional[str] = None,
-        observation_prefix: Optional[str] = None,
-        llm_prefix: Optional[str] = None,
-        **kwargs: Any,
-    ) -> None:
-        """If not the final action, print out observation."""
-        if observation_prefix is not None:
-            await self.send_log(f"{observation_prefix}")
-        await self.send_log(output, color=color or self.color)
-
-
-    async def on_text(
-        self,
-        text: str,
-        color: Optional[str] = None,
-        end: str = "",
-        **kwargs: Any,
-    ) -> None:
-        await self.send_log(f"{text}")
-
-    async def on_chain_error(self, error: Union[Exception, KeyboardInterrupt], **kwargs: Any) -> Any:
-        await self.send_log(f"{error}")
-
-async def send_file(websocket, filepath):
-    if os.path.exists(filepath):
-        with open(filepath, "rb") as file:
-            data = await file.read()  # 파일을 비동기적으로 읽습니다.
-            await websocket.send(data)  # 파일 데이터를 WebSocket을 통해 전송합니다.
-    else:
-        await websocket.send("File not found.")
-
-
-
-asyncio.get_event_loop().run_forever()
\ No newline at end of file
+                    future = scheduler.submit(session_id, run_chain, message, config)
+                except AdmissionError as e:
+                    event_stream.emit(make_event("error", str(e)))
+                    continue
+
+                session_runs.setdefault(session_id, set()).add(context)
+                # 체인 실행을 기다리지 않고 다음 메시지(파일 요청 등)를 계속 수신합니다.
+                session_chains[session_id] = asyncio.create_task(wait_chain(event_stream, future, context))
+            # 체인 실행 결과를 클라이언트에게 전송
+            # await websocket.send(f"Chain started for session {session_id} with topic: {message}")
+    except websockets.ConnectionClosed:
+        pass
+    finally:
+        print(f"Session closed: {session_id}")
+        # 실행 중인 크루도 협조적으로 중단시켜 토큰/검색 할당량/워커를 반환합니다.
+        cancel_session_runs(session_id, "client disconnected")
+        if job_queue is not None:
+            session_streams.pop(session_key, None)
+            await cancel_session_jobs(session_key, "client disconnected")
+            session_jobs.pop(session_key, None)
+        session_runs.pop(session_id, None)
+        scheduler.close_session(session_id)
+        session_chains.pop(session_id, None)
+        await event_stream.close()
+
+def log_preload_failure(future):
+    # 미리 생성에 실패해도 첫 요청에서 get_chain() 이 다시 시도하므로 로그만 남깁니다.
+    if not future.cancelled() and future.exception() is not None:
+        print(f"Failed to preload the chain: {future.exception()!r}")
+
+if __name__ == "__main__":
+    # start_server = websockets.serve(server, "localhost", 6789)
+    start_server = websockets.serve(server, "0.0.0.0", int(os.getenv("SERVER_PORT", "6789")))
+
+    asyncio.get_event_loop().run_until_complete(start_server)
+
+    # Prometheus 형식의 메트릭 엔드포인트 (METRICS_PORT=0 이면 비활성화)
+    try:
+        start_metrics_server()
+    except OSError as e:
+        print(f"Failed to start metrics endpoint: {str(e)}")
+
+    if job_queue is not None:
+        print(f"Front-end node {NODE_ID}: crews run on worker.py processes")
+        relay_task = asyncio.get_event_loop().create_task(relay_events())
+    elif PRELOAD_CHAIN:
+        preload = asyncio.get_event_loop().run_in_executor(None, get_chain)
+        preload.add_done_callback(log_preload_failure)
+
+    asyncio.get_event_loop().run_forever()
\ No newline at end of file
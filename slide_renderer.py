@@ -0,0 +1,240 @@
+import asyncio
+import io
+import multiprocessing
+import os
+import threading
+import uuid
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from functools import lru_cache
+from typing import Any, Dict, List, Optional
+
+from artifact_store import content_hash, get_artifact_store
+from execution_context import wait_future
+from pptx_templates import DEFAULT_TEMPLATE, template_registry
+
+
+SLIDE_RENDER_WORKERS = int(os.getenv("SLIDE_RENDER_WORKERS", str(os.cpu_count() or 1)))  # 0 renders in-process
+SLIDE_FONT_FAMILY = os.getenv("SLIDE_FONT_FAMILY", "Arial")
+SLIDE_MAX_FONT_SIZE = int(os.getenv("SLIDE_MAX_FONT_SIZE", "18"))
+
+
+# ---- worker side: runs inside the render processes -------------------------------------
+
+@lru_cache(maxsize=64)
+def _font_file(font_family: str, bold: bool, italic: bool) -> str:
+    # FontFiles.find() scans the system font directories on every call
+    from pptx.text.fonts import FontFiles
+
+    return FontFiles.find(font_family, bold, italic)
+
+
+@lru_cache(maxsize=4096)
+def _best_fit_font_size(text: str, extents: tuple, font_family: str, max_size: int, bold: bool, italic: bool) -> int:
+    from pptx.text.layout import TextFitter
+
+    return TextFitter.best_fit_font_size(text, extents, max_size, _font_file(font_family, bold, italic))
+
+
+def fit_text(text_frame, font_family: str = SLIDE_FONT_FAMILY, max_size: int = SLIDE_MAX_FONT_SIZE,
+             bold: bool = True, italic: bool = False):
+    """
+    Same result as `TextFrame.fit_text`, but the font lookup and the best-fit size are
+    memoized per (text, extents, font, size), so repeated texts and layouts skip the
+    font-metric measurement.
+    """
+    if text_frame.text == "":
+        return
+    extents = tuple(text_frame._extents)
+    font_size = _best_fit_font_size(text_frame.text, extents, font_family, max_size, bold, italic)
+    text_frame._apply_fit(font_family, font_size, bold, italic)
+
+
+def build_presentation(presentation: Dict[str, Any]):
+    """Builds a deck from `{"template": name, "slides": [{"header", "content", "layout"}]}`."""
+    template = template_registry.get(presentation.get("template"))
+    prs = template.new_presentation()
+    slide_layouts = prs.slide_layouts
+    for slide in presentation["slides"]:
+        layout = template.layout(slide.get("layout"))
+        new_slide = prs.slides.add_slide(slide_layouts[layout.index])
+
+        if slide.get("header") and layout.title_idx is not None:
+            title = new_slide.placeholders[layout.title_idx]
+            title.text = slide["header"]
+
+        if slide.get("content") and layout.body_idx is not None:
+            body_shape = new_slide.placeholders[layout.body_idx]
+            tf = body_shape.text_frame
+            tf.text = slide["content"]
+            fit_text(tf)
+    return prs
+
+
+def render_deck(presentation: Dict[str, Any]) -> bytes:
+    """Builds one deck and returns the .pptx bytes. Executed in a render process."""
+    prs = build_presentation(presentation)
+    buffer = io.BytesIO()
+    prs.save(buffer)
+    return buffer.getvalue()
+
+
+# ---- parent side -------------------------------------------------------------------------
+
+_render_pool = None
+_render_pool_broken = False
+_writer_pool = ThreadPoolExecutor(max_workers=4, thread_name_prefix="deck-writer")
+_pool_lock = threading.Lock()
+
+
+def get_render_pool() -> Optional[ProcessPoolExecutor]:
+    global _render_pool
+    if SLIDE_RENDER_WORKERS <= 0 or _render_pool_broken:
+        return None
+    if _render_pool is None:
+        with _pool_lock:
+            if _render_pool is None:
+                # spawn: forking a multi-threaded server process is not safe
+                _render_pool = ProcessPoolExecutor(max_workers=SLIDE_RENDER_WORKERS,
+                                                   mp_context=multiprocessing.get_context("spawn"))
+    return _render_pool
+
+
+def _discard_render_pool(pool: ProcessPoolExecutor):
+    """
+    Renders in-process from now on. Spawned workers re-import the launching script,
+    and a pool whose workers die on start (e.g. a script without a __main__ guard)
+    would break again if recreated.
+    """
+    global _render_pool, _render_pool_broken
+    with _pool_lock:
+        if _render_pool is pool:
+            print("Slide render pool is broken, rendering in-process")
+            _render_pool = None
+            _render_pool_broken = True
+    pool.shutdown(wait=False)
+
+
+def _write_file(filename: str, data: bytes) -> str:
+    os.makedirs(os.path.dirname(filename) or ".", exist_ok=True)
+    tmp = f"{filename}.{uuid.uuid4().hex}.tmp"
+    with open(tmp, "wb") as file:
+        file.write(data)
+    os.replace(tmp, filename)  # readers never see a partially written deck
+    return filename
+
+
+def deck_hash(presentation: Dict[str, Any]) -> str:
+    """Content address of a deck: its canonical JSON plus the template file it is built from."""
+    template = presentation.get("template") or DEFAULT_TEMPLATE
+    return content_hash({
+        "deck": dict(presentation, template=template),
+        "template_sha256": template_registry.fingerprint(template),
+    })
+
+
+_in_flight: Dict[str, Future] = {}  # deck hash -> pending render
+_in_flight_lock = threading.Lock()
+
+
+def submit_deck(presentation: Dict[str, Any], filename: Optional[str] = None) -> Future:
+    """
+    Renders a deck in the process pool and writes it on a writer thread.
+    Returns a future with the written file name.
+
+    Without an explicit `filename` decks are content addressed (`output/<hash>.pptx`):
+    a deck that was rendered before is returned immediately, and identical decks
+    submitted concurrently share one render.
+    """
+    if filename is not None:
+        return _render(presentation, filename)
+
+    store = get_artifact_store()
+    digest = deck_hash(presentation)
+    with _in_flight_lock:
+        pending = _in_flight.get(digest)
+        if pending is not None:
+            return pending
+        result = Future()
+        existing = store.lookup(digest, ".pptx")
+        if existing is not None:
+            result.set_result(existing)
+            return result
+        _in_flight[digest] = result
+
+    def done(_):
+        with _in_flight_lock:
+            _in_flight.pop(digest, None)
+
+    result.add_done_callback(done)
+    # rendered outside the lock: without a pool (SLIDE_RENDER_WORKERS=0) it runs on this thread
+    return _render(presentation, store.path_for(digest, ".pptx"),
+                   on_written=lambda path: store.register(digest, path, {
+                       "template": presentation.get("template") or DEFAULT_TEMPLATE,
+                       "slides": len(presentation["slides"]),
+                   }), result=result)
+
+
+def _render(presentation: Dict[str, Any], filename: str, on_written=None,
+            result: Optional[Future] = None) -> Future:
+    def write_file(data: bytes) -> str:
+        _write_file(filename, data)
+        if on_written is not None:
+            on_written(filename)
+        return filename
+
+    result = result or Future()
+
+    def render_in_process():
+        _writer_pool.submit(lambda: write_file(render_deck(presentation))).add_done_callback(
+            lambda f: _copy_result(f, result))
+
+    def write(render_future):
+        try:
+            data = render_future.result()
+            write_future = _writer_pool.submit(write_file, data)
+            write_future.add_done_callback(lambda f: _copy_result(f, result))
+        except BrokenProcessPool:
+            _discard_render_pool(pool)
+            render_in_process()
+        except BaseException as e:
+            result.set_exception(e)
+
+    pool = get_render_pool()
+    if pool is None:
+        try:
+            result.set_result(write_file(render_deck(presentation)))
+        except BaseException as e:
+            result.set_exception(e)
+        return result
+
+    try:
+        pool.submit(render_deck, presentation).add_done_callback(write)
+    except BrokenProcessPool:
+        _discard_render_pool(pool)
+        render_in_process()
+    return result
+
+
+def _copy_result(source: Future, target: Future):
+    error = source.exception()
+    if error is not None:
+        target.set_exception(error)
+    else:
+        target.set_result(source.result())
+
+
+def render_presentations(decks: List[Dict[str, Any]]) -> List[str]:
+    """
+    Renders a batch of decks in parallel across the pool; returns file names in order.
+    Inside a tool call of a cancelled run it stops waiting with RunCancelled. Renders
+    already submitted still finish (they may be shared with identical requests) and
+    remain available through the artifact store.
+    """
+    futures = [submit_deck(presentation) for presentation in decks]
+    return [wait_future(future) for future in futures]
+
+
+async def arender_presentations(decks: List[Dict[str, Any]]) -> List[str]:
+    futures = [asyncio.wrap_future(submit_deck(presentation)) for presentation in decks]
+    return list(await asyncio.gather(*futures))
@@ -0,0 +1,244 @@
+import json
+import os
+import re
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Sequence
+
+from tracing import metrics
+
+
+TOOL_OUTPUT_MAX_TOKENS = int(os.getenv("TOOL_OUTPUT_MAX_TOKENS", "1500"))          # per tool call
+TOOL_OUTPUT_MAX_PASSAGE_TOKENS = int(os.getenv("TOOL_OUTPUT_MAX_PASSAGE_TOKENS", "400"))
+TOOL_OUTPUT_MAX_CANDIDATES = int(os.getenv("TOOL_OUTPUT_MAX_CANDIDATES", "50"))    # results read from a response
+TOOL_OUTPUT_DEDUP_THRESHOLD = float(os.getenv("TOOL_OUTPUT_DEDUP_THRESHOLD", "0.8"))  # word-shingle Jaccard
+TOOL_OUTPUT_METADATA_FIELDS = [name.strip() for name in os.getenv(
+    "TOOL_OUTPUT_METADATA_FIELDS", "file_name,title,page_label,url,source,author,creation_date").split(",")
+    if name.strip()]
+TOOL_OUTPUT_TOKENIZER = os.getenv("TOOL_OUTPUT_TOKENIZER", "cl100k_base")
+
+MIN_TRUNCATED_TOKENS = 40  # a passage cut shorter than this is dropped instead
+SUMMARY_TOKENS = 24  # reserved for the "(n more results omitted ...)" line
+
+
+@dataclass(frozen=True)
+class Passage:
+    text: str
+    metadata: Dict[str, Any] = field(default_factory=dict)
+    score: Optional[float] = None  # retrieval score of the source, higher is better
+
+
+# ---- incremental JSON ----------------------------------------------------------------------
+
+_decoder = json.JSONDecoder()
+_WHITESPACE = " \t\r\n"
+
+
+def iter_json_array(chunks: Iterable[str], limit: Optional[int] = None) -> Iterator[Any]:
+    """
+    Yields the items of a JSON array as they arrive in `chunks`, decoding one item
+    at a time with `raw_decode` instead of holding and parsing the whole body.
+    Stops after `limit` items without reading the rest. A body that is not an
+    array (e.g. an error object like `{"detail": ...}`) raises ValueError.
+    """
+    buffer = ""
+    position = 0
+    started = False
+    count = 0
+    chunks = iter(chunks)
+    exhausted = False
+
+    while True:
+        while position < len(buffer) and buffer[position] in _WHITESPACE:
+            position += 1
+        if position >= len(buffer):
+            if exhausted:
+                return
+            chunk = next(chunks, None)
+            if chunk is None:
+                exhausted = True
+                continue
+            buffer = buffer[position:] + chunk
+            position = 0
+            continue
+
+        if not started:
+            if buffer[position] != "[":
+                rest = buffer[position:] + "".join(chunks)
+                raise ValueError(f"expected a JSON array, got: {rest[:200]}")
+            started = True
+            position += 1
+            continue
+
+        if buffer[position] == "]":
+            return
+        if buffer[position] == ",":
+            position += 1
+            continue
+
+        try:
+            item, end = _decoder.raw_decode(buffer, position)
+        except json.JSONDecodeError:
+            if exhausted:
+                raise
+            chunk = next(chunks, None)
+            if chunk is None:
+                exhausted = True
+            else:
+                buffer = buffer[position:] + chunk
+                position = 0
+            continue
+        if end == len(buffer) and not exhausted and not isinstance(item, (dict, list, str)):
+            # a number or literal may continue in the next chunk
+            chunk = next(chunks, None)
+            if chunk is None:
+                exhausted = True
+            else:
+                buffer = buffer[position:] + chunk
+                position = 0
+            continue
+        position = end
+        yield item
+        count += 1
+        if limit is not None and count >= limit:
+            return
+
+
+def iter_response_text(response: Any, chunk_size: int = 64 * 1024) -> Iterator[str]:
+    """Decoded text chunks of a streamed `requests` response."""
+    response.encoding = response.encoding or "utf-8"
+    return response.iter_content(chunk_size=chunk_size, decode_unicode=True)
+
+
+# ---- tokens --------------------------------------------------------------------------------
+
+_encoding = None
+
+
+def _get_encoding():
+    global _encoding
+    if _encoding is None:
+        try:
+            import tiktoken
+            _encoding = tiktoken.get_encoding(TOOL_OUTPUT_TOKENIZER)
+        except Exception:  # tiktoken missing or its encoding files unavailable offline
+            _encoding = False
+    return _encoding
+
+
+def count_tokens(text: str) -> int:
+    encoding = _get_encoding()
+    if encoding:
+        return len(encoding.encode(text, disallowed_special=()))
+    return (len(text) + 3) // 4  # ~4 characters per token
+
+
+def truncate_tokens(text: str, max_tokens: int) -> str:
+    encoding = _get_encoding()
+    if encoding:
+        tokens = encoding.encode(text, disallowed_special=())
+        if len(tokens) <= max_tokens:
+            return text
+        return encoding.decode(tokens[:max_tokens]).rstrip() + " …"
+    if len(text) <= max_tokens * 4:
+        return text
+    return text[:max_tokens * 4].rstrip() + " …"
+
+
+# ---- compaction ----------------------------------------------------------------------------
+
+_WORD = re.compile(r"\w+", re.UNICODE)
+
+
+def words(text: str) -> List[str]:
+    return _WORD.findall(text.lower())
+
+
+def shingles(text: str, size: int = 4) -> frozenset:
+    tokens = words(text)
+    if len(tokens) <= size:
+        return frozenset([" ".join(tokens)])
+    return frozenset(hash(" ".join(tokens[i:i + size])) for i in range(len(tokens) - size + 1))
+
+
+def similarity(a: frozenset, b: frozenset) -> float:
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+def filter_metadata(metadata: Dict[str, Any], fields: Sequence[str] = TOOL_OUTPUT_METADATA_FIELDS) -> Dict[str, Any]:
+    """Only the whitelisted fields, in whitelist order; empty values are dropped."""
+    return {name: metadata[name] for name in fields if metadata.get(name) not in (None, "", [], {})}
+
+
+def rank_passages(passages: Sequence[Passage], query: str) -> List[Passage]:
+    """
+    Orders by the source's retrieval score when present; passages without one are
+    ranked by the share of query words they contain. Ties keep the source order.
+    """
+    query_words = set(words(query))
+
+    def key(item):
+        i, passage = item
+        if passage.score is not None:
+            relevance = float(passage.score)
+        elif query_words:
+            relevance = len(query_words & set(words(passage.text))) / len(query_words)
+        else:
+            relevance = 0.0
+        return -relevance, i
+
+    return [passage for _, passage in sorted(enumerate(passages), key=key)]
+
+
+def compact_passages(passages: Sequence[Passage], query: str, render: Callable[[Passage], str],
+                     max_tokens: int = TOOL_OUTPUT_MAX_TOKENS,
+                     max_passage_tokens: int = TOOL_OUTPUT_MAX_PASSAGE_TOKENS,
+                     dedup_threshold: float = TOOL_OUTPUT_DEDUP_THRESHOLD) -> str:
+    """
+    Tool output that fits `max_tokens`: passages are ranked, near-duplicates of a
+    higher ranked passage are dropped, each passage is cut to `max_passage_tokens`
+    and passages are added until the budget is spent.
+    """
+    kept: List[frozenset] = []
+    blocks: List[str] = []
+    used = 0
+    counts = {"kept": 0, "duplicate": 0, "truncated": 0, "over_budget": 0}
+
+    for passage in rank_passages(passages, query):
+        signature = shingles(passage.text)
+        if any(similarity(signature, other) >= dedup_threshold for other in kept):
+            counts["duplicate"] += 1
+            continue
+
+        remaining = max_tokens - SUMMARY_TOKENS - used - 1  # 1 for the joining newline
+        text = truncate_tokens(passage.text, max_passage_tokens)
+        block = render(Passage(text, passage.metadata, passage.score))
+        size = count_tokens(block)
+        target = count_tokens(text)
+        while size > remaining and target >= MIN_TRUNCATED_TOKENS:
+            # token counts of the parts do not add up exactly, so shrink until the block fits
+            target -= size - remaining
+            text = truncate_tokens(passage.text, target)
+            block = render(Passage(text, passage.metadata, passage.score))
+            size = count_tokens(block)
+        if size > remaining:
+            counts["over_budget"] += 1
+            continue
+        if text != passage.text:
+            counts["truncated"] += 1
+
+        kept.append(signature)
+        blocks.append(block)
+        used += size + 1
+        counts["kept"] += 1
+
+    for result, count in counts.items():
+        if count:
+            metrics.inc("crew_tool_output_passages_total", count, help="Search passages by compaction result",
+                        result=result)
+    omitted = counts["duplicate"] + counts["over_budget"]
+    if omitted:
+        blocks.append(f"({omitted} more results omitted: {counts['duplicate']} duplicates, "
+                      f"{counts['over_budget']} over the token budget)")
+    return "\n".join(blocks)
@@ -0,0 +1,100 @@
+import os
+import threading
+from collections.abc import Mapping
+from importlib import import_module
+from typing import Any, Dict, Iterator, List, Union
+
+
+TOOLS_ENTRY_POINT_GROUP = os.getenv("TOOLS_ENTRY_POINT_GROUP", "process_gpt.tools")
+
+# planner-visible tool name -> "module:attribute.path"; imported on first use only
+BUILTIN_TOOLS = {
+    "SearchTools.search_internet": "search_tools:SearchTools.search_internet",
+    "SearchTools.search_internal_documents": "search_tools:SearchTools.search_internal_documents",
+    "CalculatorTools.calculate": "calculator_tools:CalculatorTools.calculate",
+    "PowerpointTools.generate_slide": "powerpoint_tools:PowerpointTools.generate_slide",
+}
+
+
+def load_object(target: str) -> Any:
+    module_name, _, attribute = target.partition(":")
+    obj = import_module(module_name)
+    for part in filter(None, attribute.split(".")):
+        obj = getattr(obj, part)
+    return obj
+
+
+class ToolRegistry(Mapping):
+    """
+    Tool name -> tool object, resolved lazily: listing or validating names never
+    imports a tool module, so a process only pays for (python-pptx, openai, ...)
+    the tools its crews actually use. Besides BUILTIN_TOOLS, installed packages
+    can contribute tools through the `process_gpt.tools` entry point group:
+
+        [project.entry-points."process_gpt.tools"]
+        "MyTools.lookup" = "my_package.tools:MyTools.lookup"
+    """
+
+    def __init__(self, builtins: Dict[str, str] = BUILTIN_TOOLS, entry_point_group: str = TOOLS_ENTRY_POINT_GROUP):
+        self.targets: Dict[str, Union[str, Any]] = dict(builtins)
+        self.loaded: Dict[str, Any] = {}
+        self.entry_point_group = entry_point_group
+        self.discovered = not entry_point_group
+        self.lock = threading.Lock()
+
+    def discover(self):
+        if self.discovered:
+            return
+        with self.lock:
+            if self.discovered:
+                return
+            from importlib.metadata import entry_points
+
+            for entry_point in entry_points(group=self.entry_point_group):
+                # tools registered explicitly or built in win over entry points of the same name
+                self.targets.setdefault(entry_point.name, entry_point)
+            self.discovered = True
+
+    def register(self, name: str, target: Union[str, Any]):
+        """Adds a tool as a "module:attribute" string (lazy) or as the tool object itself."""
+        with self.lock:
+            self.targets[name] = target
+            self.loaded.pop(name, None)
+
+    def names(self) -> List[str]:
+        self.discover()
+        return list(self.targets)
+
+    def __getitem__(self, name: str) -> Any:
+        tool = self.loaded.get(name)
+        if tool is not None:
+            return tool
+        self.discover()
+        target = self.targets[name]  # KeyError for unknown tools, like the dict it replaces
+        with self.lock:
+            tool = self.loaded.get(name)
+            if tool is None:
+                if isinstance(target, str):
+                    tool = load_object(target)
+                elif hasattr(target, "load") and hasattr(target, "group"):  # importlib.metadata.EntryPoint
+                    tool = target.load()
+                else:
+                    tool = target
+                self.loaded[name] = tool
+        return tool
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.names())
+
+    def __len__(self) -> int:
+        return len(self.names())
+
+    def __contains__(self, name: object) -> bool:
+        self.discover()
+        return name in self.targets
+
+    def stats(self) -> Dict[str, Any]:
+        return {"registered": len(self), "loaded": sorted(self.loaded)}
+
+
+tool_registry = ToolRegistry()
@@ -0,0 +1,176 @@
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, Optional, Tuple
+
+
+TRACE_DIR = os.getenv("TRACE_DIR")  # per-session JSONL traces are written here when set
+METRICS_PORT = int(os.getenv("METRICS_PORT", "9100"))  # 0 disables the metrics endpoint
+METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")  # 0.0.0.0 to let a remote Prometheus scrape it
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+SIZE_BUCKETS = (64, 256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+
+class MetricsRegistry():
+    """Minimal thread-safe counters and histograms rendered in the Prometheus text format."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.help = {}
+        self.counters: Dict[str, Dict[Tuple, float]] = {}
+        self.histograms: Dict[str, Dict[Tuple, list]] = {}
+        self.buckets: Dict[str, Tuple] = {}
+
+    def inc(self, name: str, value: float = 1, help: str = "", **labels: Any):
+        key = tuple(sorted((k, str(v)) for k, v in labels.items()))
+        with self.lock:
+            self.help.setdefault(name, help)
+            series = self.counters.setdefault(name, {})
+            series[key] = series.get(key, 0) + value
+
+    def observe(self, name: str, value: float, help: str = "", buckets: Tuple = DURATION_BUCKETS, **labels: Any):
+        key = tuple(sorted((k, str(v)) for k, v in labels.items()))
+        with self.lock:
+            self.help.setdefault(name, help)
+            self.buckets.setdefault(name, buckets)
+            series = self.histograms.setdefault(name, {})
+            # [bucket counts..., sum, count]
+            state = series.setdefault(key, [0] * len(self.buckets[name]) + [0.0, 0])
+            for i, bound in enumerate(self.buckets[name]):
+                if value <= bound:
+                    state[i] += 1
+            state[-2] += value
+            state[-1] += 1
+
+    def render(self) -> str:
+        def fmt(labels):
+            if not labels:
+                return ""
+            return "{" + ",".join(f'{k}="{v}"' for k, v in labels) + "}"
+
+        lines = []
+        with self.lock:
+            for name, series in sorted(self.counters.items()):
+                lines.append(f"# HELP {name} {self.help.get(name, '')}")
+                lines.append(f"# TYPE {name} counter")
+                for labels, value in sorted(series.items()):
+                    lines.append(f"{name}{fmt(labels)} {value}")
+            for name, series in sorted(self.histograms.items()):
+                lines.append(f"# HELP {name} {self.help.get(name, '')}")
+                lines.append(f"# TYPE {name} histogram")
+                for labels, state in sorted(series.items()):
+                    for bound, count in zip(self.buckets[name], state):
+                        lines.append(f"{name}_bucket{fmt(labels + (('le', str(bound)),))} {count}")
+                    lines.append(f"{name}_bucket{fmt(labels + (('le', '+Inf'),))} {state[-1]}")
+                    lines.append(f"{name}_sum{fmt(labels)} {state[-2]}")
+                    lines.append(f"{name}_count{fmt(labels)} {state[-1]}")
+        return "\n".join(lines) + "\n"
+
+
+metrics = MetricsRegistry()
+
+_trace_lock = threading.Lock()
+
+
+def write_trace(session_id: Any, record: Dict[str, Any]):
+    if not TRACE_DIR or session_id is None:
+        return
+    os.makedirs(TRACE_DIR, exist_ok=True)
+    line = json.dumps(record, ensure_ascii=False, default=str)
+    with _trace_lock:
+        with open(os.path.join(TRACE_DIR, f"{session_id}.jsonl"), "a", encoding="utf-8") as file:
+            file.write(line + "\n")
+
+
+def record_span(name: str, duration: float, session_id: Any = None, **attrs: Any):
+    """Records a finished span: duration histogram by span name plus the optional trace line."""
+    metrics.observe("crew_span_duration_seconds", duration, help="Duration of pipeline steps", span=name)
+    if attrs.get("error"):
+        metrics.inc("crew_span_errors_total", help="Failed pipeline steps", span=name)
+    write_trace(session_id, {"span": name, "ts": time.time() - duration, "duration": duration,
+                             **{k: v for k, v in attrs.items() if v is not None}})
+
+
+@contextmanager
+def span(name: str, session_id: Any = None, **attrs: Any):
+    """
+    Times the enclosed block. The yielded dict can be filled with attributes
+    (tokens, sizes, cache hits) that end up in the trace line.
+    """
+    started = time.perf_counter()
+    try:
+        yield attrs
+    except BaseException as e:
+        attrs["error"] = type(e).__name__
+        raise
+    finally:
+        record_span(name, time.perf_counter() - started, session_id, **attrs)
+
+
+class SpanTimer():
+    """Pairs start/end callbacks (keyed by run id) into durations."""
+
+    def __init__(self):
+        self.started = {}
+        self.lock = threading.Lock()
+
+    def start(self, key: Any):
+        with self.lock:
+            self.started[key] = time.perf_counter()
+
+    def stop(self, key: Any) -> Optional[float]:
+        with self.lock:
+            started = self.started.pop(key, None)
+        return time.perf_counter() - started if started is not None else None
+
+
+def record_tokens(step: str, prompt_tokens: int = 0, completion_tokens: int = 0):
+    if prompt_tokens:
+        metrics.inc("crew_llm_tokens_total", prompt_tokens, help="LLM tokens used", step=step, kind="prompt")
+    if completion_tokens:
+        metrics.inc("crew_llm_tokens_total", completion_tokens, help="LLM tokens used", step=step, kind="completion")
+
+
+def record_cache(cache: str, hit: bool):
+    metrics.inc("crew_cache_requests_total", help="Cache lookups", cache=cache, result="hit" if hit else "miss")
+
+
+def record_payload(kind: str, size: int):
+    metrics.observe("crew_payload_bytes", size, help="Payload sizes", buckets=SIZE_BUCKETS, kind=kind)
+
+
+def token_usage(response: Any) -> Tuple[int, int]:
+    """Extracts (prompt, completion) token counts from a langchain LLMResult, when the provider reports them."""
+    usage = ((getattr(response, "llm_output", None) or {}).get("token_usage") or {})
+    return usage.get("prompt_tokens", 0) or 0, usage.get("completion_tokens", 0) or 0
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_response(404)
+            self.end_headers()
+            return
+        body = metrics.render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def start_metrics_server(port: int = METRICS_PORT, host: str = METRICS_HOST):
+    """Serves GET /metrics on a daemon thread. Returns the server, or None when disabled."""
+    if not port:
+        return None
+    server = ThreadingHTTPServer((host, port), _MetricsHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
@@ -0,0 +1,465 @@
+"""
+Local retrieval engine for `SearchTools.search_internal_documents`
+(INTERNAL_DOCS_BACKEND=local), an alternative to the remote memento service.
+
+Documents are split into chunks kept in SQLite; their embeddings are rows of a
+float32 matrix memory-mapped from disk, so the index is not loaded into the heap
+and is shared through the page cache by every process that opens it. Queries are
+answered with one matrix product per block of rows, several queries at a time.
+
+    python -m vector_index ingest docs/ [more paths...]   # add or update documents
+    python -m vector_index remove docs/old.pdf
+    python -m vector_index query "cloud native migration" [-k 5]
+    python -m vector_index compact                        # drop the rows of replaced documents
+"""
+import argparse
+import hashlib
+import json
+import math
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import Counter
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from tracing import metrics
+
+
+VECTOR_INDEX_PATH = os.getenv("VECTOR_INDEX_PATH", "index/internal_docs")  # directory
+VECTOR_INDEX_EMBEDDER = os.getenv("VECTOR_INDEX_EMBEDDER", "hashing").lower()  # hashing | openai
+VECTOR_INDEX_DIM = int(os.getenv("VECTOR_INDEX_DIM", "512"))  # hashing embedder only
+VECTOR_INDEX_OPENAI_MODEL = os.getenv("VECTOR_INDEX_OPENAI_MODEL", "text-embedding-3-small")
+VECTOR_INDEX_CHUNK_CHARS = int(os.getenv("VECTOR_INDEX_CHUNK_CHARS", "1200"))
+VECTOR_INDEX_CHUNK_OVERLAP = int(os.getenv("VECTOR_INDEX_CHUNK_OVERLAP", "200"))
+VECTOR_INDEX_TOP_K = int(os.getenv("VECTOR_INDEX_TOP_K", "8"))
+VECTOR_INDEX_MIN_SCORE = float(os.getenv("VECTOR_INDEX_MIN_SCORE", "0"))  # chunks must score above it
+VECTOR_INDEX_BLOCK_ROWS = int(os.getenv("VECTOR_INDEX_BLOCK_ROWS", "65536"))  # rows scored per matrix product
+
+INITIAL_CAPACITY = 1024  # rows; the matrix file doubles when full
+EMBED_BATCH_SIZE = 256
+INGEST_EXTENSIONS = (".txt", ".md", ".pdf")
+SEARCH_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1)
+
+
+# ---- embedders -----------------------------------------------------------------------------
+
+_TOKEN = re.compile(r"\w+", re.UNICODE)
+
+
+class HashingEmbedder():
+    """
+    Signed feature hashing of words and word bigrams, L2-normalized. Needs no model
+    or network, so the index works offline; similarity is lexical, not semantic.
+    """
+
+    def __init__(self, dim: int = VECTOR_INDEX_DIM):
+        self.dim = dim
+        self.name = f"hashing-{dim}"
+
+    def _features(self, text: str) -> Iterator[str]:
+        words = _TOKEN.findall(text.lower())
+        yield from words
+        for i in range(len(words) - 1):
+            yield words[i] + " " + words[i + 1]
+
+    def embed(self, texts: Sequence[str]) -> np.ndarray:
+        vectors = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for feature, count in Counter(self._features(text)).items():
+                digest = int.from_bytes(hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest(), "little")
+                # sublinear term frequency, so repeated boilerplate does not drown rare terms
+                weight = 1.0 + math.log(count)
+                vectors[row, digest % self.dim] += weight if digest >> 63 else -weight
+        return _normalize(vectors)
+
+
+class OpenAIEmbedder():
+    """OpenAI embeddings through the configured OpenAI base URL."""
+
+    def __init__(self, model: str = VECTOR_INDEX_OPENAI_MODEL):
+        import openai
+
+        self.client = openai.OpenAI(base_url=os.getenv("OPENAI_API_BASE") or os.getenv("OPENAI_BASE_URL") or None)
+        self.model = model
+        self.name = f"openai-{model}"
+        self.dim = len(self.client.embeddings.create(model=model, input=["dimension probe"]).data[0].embedding)
+
+    def embed(self, texts: Sequence[str]) -> np.ndarray:
+        response = self.client.embeddings.create(model=self.model, input=list(texts))
+        return _normalize(np.array([item.embedding for item in response.data], dtype=np.float32))
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+def create_embedder(kind: str = VECTOR_INDEX_EMBEDDER):
+    if kind == "hashing":
+        return HashingEmbedder()
+    if kind == "openai":
+        return OpenAIEmbedder()
+    raise ValueError(f"Unknown VECTOR_INDEX_EMBEDDER: {kind}")
+
+
+# ---- chunking ------------------------------------------------------------------------------
+
+def split_text(text: str, chunk_chars: int = VECTOR_INDEX_CHUNK_CHARS,
+               overlap: int = VECTOR_INDEX_CHUNK_OVERLAP) -> List[str]:
+    """Chunks of at most `chunk_chars` characters, cut at whitespace, each repeating the last `overlap` of the previous."""
+    text = re.sub(r"[ \t]+", " ", text).strip()
+    chunks = []
+    start = 0
+    while start < len(text):
+        end = min(len(text), start + chunk_chars)
+        if end < len(text):
+            cut = max(text.rfind("\n", start, end), text.rfind(" ", start, end))
+            if cut > start + chunk_chars // 2:
+                end = cut
+        chunk = text[start:end].strip()
+        if chunk:
+            chunks.append(chunk)
+        if end >= len(text):
+            break
+        start = max(end - overlap, start + 1)
+        space = text.find(" ", start, end)
+        if 0 <= space < end:
+            start = space + 1  # do not start in the middle of a word
+    return chunks
+
+
+def read_document(path: str) -> List[Tuple[str, Dict[str, Any]]]:
+    """(text, metadata) sections of a file: one per PDF page, one for a text file."""
+    file_name = os.path.basename(path)
+    creation_date = time.strftime("%Y-%m-%d", time.localtime(os.path.getmtime(path)))
+    if path.lower().endswith(".pdf"):
+        from pypdf import PdfReader
+
+        reader = PdfReader(path)
+        return [(page.extract_text() or "", {"file_name": file_name, "page_label": str(i + 1),
+                                             "source": path, "creation_date": creation_date})
+                for i, page in enumerate(reader.pages)]
+    with open(path, encoding="utf-8", errors="replace") as file:
+        return [(file.read(), {"file_name": file_name, "source": path, "creation_date": creation_date})]
+
+
+def iter_document_paths(paths: Iterable[str]) -> Iterator[str]:
+    for path in paths:
+        if os.path.isdir(path):
+            for root, _, files in os.walk(path):
+                for name in sorted(files):
+                    if name.lower().endswith(INGEST_EXTENSIONS):
+                        yield os.path.join(root, name)
+        else:
+            yield path
+
+
+# ---- index ---------------------------------------------------------------------------------
+
+class VectorIndex():
+    """
+    Chunk store (`chunks.sqlite`) plus embedding matrix (`embeddings.f32`, row i is
+    chunk i). Adding a document appends rows; replacing or removing one marks its
+    rows dead, so updates never rebuild the matrix. `compact` reclaims dead rows.
+    Every change bumps `generation`, which readers in other processes pick up on
+    their next search. Writes must come from one process at a time.
+    """
+
+    def __init__(self, path: str = VECTOR_INDEX_PATH, embedder: Any = None):
+        self.path = path
+        self.embedder = embedder or create_embedder()
+        self.dim = self.embedder.dim
+        self.lock = threading.RLock()
+        os.makedirs(path, exist_ok=True)
+
+        self.conn = sqlite3.connect(os.path.join(path, "chunks.sqlite"), timeout=30, check_same_thread=False,
+                                    isolation_level=None)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS documents (
+                doc_id TEXT PRIMARY KEY,
+                content_hash TEXT NOT NULL,
+                updated_at REAL NOT NULL
+            )""")
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS chunks (
+                row INTEGER PRIMARY KEY,
+                doc_id TEXT NOT NULL,
+                text TEXT NOT NULL,
+                metadata TEXT NOT NULL,
+                live INTEGER NOT NULL DEFAULT 1
+            )""")
+        self.conn.execute("CREATE INDEX IF NOT EXISTS chunks_doc ON chunks(doc_id)")
+
+        embedder_name = self._meta("embedder")
+        if embedder_name is None:
+            self._set_meta("embedder", self.embedder.name)
+            self._set_meta("dim", str(self.dim))
+            self._set_meta("generation", "0")
+        elif embedder_name != self.embedder.name:
+            raise ValueError(f"Index at {path} was built with {embedder_name}, not {self.embedder.name}")
+
+        self.matrix_path = os.path.join(path, "embeddings.f32")
+        self.matrix: Optional[np.memmap] = None
+        self.generation = -1
+        self._sync()
+
+    # -- bookkeeping
+
+    def _meta(self, key: str) -> Optional[str]:
+        row = self.conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def _set_meta(self, key: str, value: str):
+        self.conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, value))
+
+    def _map(self, capacity: int):
+        if self.matrix is not None:
+            self.matrix.flush()
+        size = capacity * self.dim * 4
+        if not os.path.exists(self.matrix_path) or os.path.getsize(self.matrix_path) < size:
+            with open(self.matrix_path, "ab") as file:
+                file.truncate(size)
+        self.matrix = np.memmap(self.matrix_path, dtype=np.float32, mode="r+", shape=(capacity, self.dim))
+
+    def _sync(self):
+        """Reloads the row count and live mask when the index changed since the last look (here or elsewhere)."""
+        generation = int(self._meta("generation") or 0)
+        if generation == self.generation:
+            return
+        self.rows = self.conn.execute("SELECT COALESCE(MAX(row) + 1, 0) FROM chunks").fetchone()[0]
+        self.live = np.zeros(self.rows, dtype=bool)
+        live_rows = [row for row, in self.conn.execute("SELECT row FROM chunks WHERE live = 1")]
+        self.live[live_rows] = True
+        capacity = max(INITIAL_CAPACITY, self.rows)
+        if os.path.exists(self.matrix_path):
+            capacity = max(capacity, os.path.getsize(self.matrix_path) // (self.dim * 4))
+        if self.matrix is None or self.matrix.shape[0] < capacity:
+            self._map(capacity)
+        self.generation = generation
+
+    def _bump(self):
+        self.matrix.flush()
+        self.generation += 1
+        self._set_meta("generation", str(self.generation))
+
+    # -- updates
+
+    def add_document(self, doc_id: str, sections: Sequence[Tuple[str, Dict[str, Any]]]) -> int:
+        """
+        Indexes the (text, metadata) sections of a document, replacing an earlier
+        version. Unchanged documents are skipped. Returns the number of chunks added.
+        """
+        content_hash = hashlib.sha256(json.dumps(sections, sort_keys=True, ensure_ascii=False).encode("utf-8")).hexdigest()
+        chunks = [(chunk, metadata) for text, metadata in sections for chunk in split_text(text)]
+
+        with self.lock:
+            self._sync()
+            row = self.conn.execute("SELECT content_hash FROM documents WHERE doc_id = ?", (doc_id,)).fetchone()
+            if row is not None and row[0] == content_hash:
+                return 0
+            # embedded before the transaction so that a failing embedder leaves the index untouched
+            vectors = np.concatenate([self.embedder.embed([text for text, _ in chunks[i:i + EMBED_BATCH_SIZE]])
+                                      for i in range(0, len(chunks), EMBED_BATCH_SIZE)]) \
+                if chunks else np.zeros((0, self.dim), dtype=np.float32)
+
+            start = self.rows
+            if start + len(chunks) > self.matrix.shape[0]:
+                capacity = self.matrix.shape[0]
+                while start + len(chunks) > capacity:
+                    capacity *= 2
+                self._map(capacity)
+            self.matrix[start:start + len(chunks)] = vectors
+
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                dead = [r for r, in self.conn.execute("SELECT row FROM chunks WHERE doc_id = ? AND live = 1", (doc_id,))]
+                self.conn.execute("UPDATE chunks SET live = 0 WHERE doc_id = ?", (doc_id,))
+                self.conn.executemany(
+                    "INSERT INTO chunks (row, doc_id, text, metadata) VALUES (?, ?, ?, ?)",
+                    [(start + i, doc_id, text, json.dumps(metadata, ensure_ascii=False))
+                     for i, (text, metadata) in enumerate(chunks)])
+                self.conn.execute("INSERT OR REPLACE INTO documents (doc_id, content_hash, updated_at) VALUES (?, ?, ?)",
+                                  (doc_id, content_hash, time.time()))
+                self._bump()
+                self.conn.execute("COMMIT")
+            except BaseException:
+                self.conn.execute("ROLLBACK")
+                self.generation = -1  # reload from the committed state
+                raise
+
+            self.rows = start + len(chunks)
+            self.live = np.concatenate([self.live, np.ones(len(chunks), dtype=bool)])
+            self.live[dead] = False
+        return len(chunks)
+
+    def add_path(self, path: str) -> int:
+        return self.add_document(os.path.abspath(path), read_document(path))
+
+    def remove_document(self, doc_id: str) -> bool:
+        with self.lock:
+            self._sync()
+            dead = [r for r, in self.conn.execute("SELECT row FROM chunks WHERE doc_id = ? AND live = 1", (doc_id,))]
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                removed = self.conn.execute("DELETE FROM documents WHERE doc_id = ?", (doc_id,)).rowcount > 0
+                self.conn.execute("UPDATE chunks SET live = 0 WHERE doc_id = ?", (doc_id,))
+                self._bump()
+                self.conn.execute("COMMIT")
+            except BaseException:
+                self.conn.execute("ROLLBACK")
+                self.generation = -1  # reload from the committed state
+                raise
+            self.live[dead] = False
+        return removed
+
+    def compact(self) -> int:
+        """
+        Rewrites the matrix and chunk rows without dead rows. Returns the number of
+        rows dropped. Row numbers change, so run it while no process is searching.
+        """
+        with self.lock:
+            self._sync()
+            keep = np.flatnonzero(self.live)
+            dropped = self.rows - len(keep)
+            if not dropped:
+                return 0
+            vectors = np.array(self.matrix[keep])
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                self.conn.execute("DELETE FROM chunks WHERE live = 0")
+                # rows only move down, so renumbering in ascending order never collides
+                self.conn.executemany("UPDATE chunks SET row = ? WHERE row = ?",
+                                      [(new, int(old)) for new, old in enumerate(keep) if new != old])
+                self.matrix[:len(keep)] = vectors
+                self.matrix[len(keep):self.rows] = 0
+                self._bump()
+                self.conn.execute("COMMIT")
+            except BaseException:
+                self.conn.execute("ROLLBACK")
+                raise
+            finally:
+                self.generation = -1
+                self._sync()
+        return dropped
+
+    # -- queries
+
+    def search(self, query: str, k: int = VECTOR_INDEX_TOP_K,
+               min_score: float = VECTOR_INDEX_MIN_SCORE) -> List[Dict[str, Any]]:
+        return self.search_batch([query], k, min_score)[0]
+
+    def search_batch(self, queries: Sequence[str], k: int = VECTOR_INDEX_TOP_K,
+                     min_score: float = VECTOR_INDEX_MIN_SCORE) -> List[List[Dict[str, Any]]]:
+        """
+        Top `k` chunks per query by cosine similarity, in memento's result shape
+        (`{"node": {"text", "metadata"}, "score"}`), best first. Chunks scoring
+        `min_score` or less are dropped, so a query may return fewer than `k`.
+        """
+        started = time.perf_counter()
+        k = max(1, k)
+        vectors = self.embedder.embed(list(queries))
+        with self.lock:
+            self._sync()
+            rows, live, matrix = self.rows, self.live, self.matrix
+        best_scores = np.full((len(queries), 0), -np.inf, dtype=np.float32)
+        best_rows = np.zeros((len(queries), 0), dtype=np.int64)
+
+        for start in range(0, rows, VECTOR_INDEX_BLOCK_ROWS):
+            end = min(rows, start + VECTOR_INDEX_BLOCK_ROWS)
+            scores = vectors @ matrix[start:end].T
+            scores[:, ~live[start:end]] = -np.inf
+            scores[scores <= min_score] = -np.inf
+            # keep the running top k: this block's candidates merged with the best so far
+            take = min(k, end - start)
+            candidates = np.argpartition(-scores, take - 1, axis=1)[:, :take]
+            best_scores = np.concatenate([best_scores, np.take_along_axis(scores, candidates, axis=1)], axis=1)
+            best_rows = np.concatenate([best_rows, candidates + start], axis=1)
+            if best_scores.shape[1] > k:
+                keep = np.argpartition(-best_scores, k - 1, axis=1)[:, :k]
+                best_scores = np.take_along_axis(best_scores, keep, axis=1)
+                best_rows = np.take_along_axis(best_rows, keep, axis=1)
+
+        order = np.argsort(-best_scores, axis=1, kind="stable")
+        best_scores = np.take_along_axis(best_scores, order, axis=1)
+        best_rows = np.take_along_axis(best_rows, order, axis=1)
+        wanted = {int(row) for row, score in zip(best_rows.ravel(), best_scores.ravel()) if np.isfinite(score)}
+        chunks = self._chunks(wanted)
+
+        results = []
+        for query_rows, query_scores in zip(best_rows, best_scores):
+            results.append([{"node": {"id_": str(int(row)), "text": chunks[int(row)][0],
+                                      "metadata": chunks[int(row)][1]}, "score": float(score)}
+                            for row, score in zip(query_rows, query_scores)
+                            if np.isfinite(score) and int(row) in chunks])
+        metrics.observe("crew_vector_search_seconds", time.perf_counter() - started,
+                        help="Local vector index search time per batch", buckets=SEARCH_BUCKETS)
+        return results
+
+    def _chunks(self, rows: Iterable[int]) -> Dict[int, Tuple[str, Dict[str, Any]]]:
+        rows = list(rows)
+        if not rows:
+            return {}
+        placeholders = ",".join("?" * len(rows))
+        with self.lock:
+            found = self.conn.execute(f"SELECT row, text, metadata FROM chunks WHERE row IN ({placeholders})",
+                                      rows).fetchall()
+        return {row: (text, json.loads(metadata)) for row, text, metadata in found}
+
+    def stats(self) -> Dict[str, Any]:
+        with self.lock:
+            self._sync()
+            documents = self.conn.execute("SELECT COUNT(*) FROM documents").fetchone()[0]
+            live = int(self.live.sum())
+            return {"documents": documents, "chunks": live, "dead_rows": self.rows - live,
+                    "capacity": self.matrix.shape[0], "dim": self.dim, "embedder": self.embedder.name,
+                    "generation": self.generation}
+
+
+_vector_index = None
+_vector_index_lock = threading.Lock()
+
+
+def get_vector_index() -> VectorIndex:
+    """Process-wide index at VECTOR_INDEX_PATH, opened on first use."""
+    global _vector_index
+    if _vector_index is None:
+        with _vector_index_lock:
+            if _vector_index is None:
+                _vector_index = VectorIndex()
+    return _vector_index
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest="command", required=True)
+    ingest = commands.add_parser("ingest", help="add or update documents (files or directories)")
+    ingest.add_argument("paths", nargs="+")
+    remove = commands.add_parser("remove", help="remove documents")
+    remove.add_argument("paths", nargs="+")
+    query = commands.add_parser("query", help="print the top chunks for a query")
+    query.add_argument("text")
+    query.add_argument("-k", type=int, default=VECTOR_INDEX_TOP_K)
+    commands.add_parser("compact", help="drop the rows of replaced and removed documents")
+    commands.add_parser("stats")
+    args = parser.parse_args()
+
+    index = get_vector_index()
+    if args.command == "ingest":
+        for path in iter_document_paths(args.paths):
+            print(f"{path}: {index.add_path(path)} chunks")
+    elif args.command == "remove":
+        for path in args.paths:
+            print(f"{path}: {'removed' if index.remove_document(os.path.abspath(path)) else 'not indexed'}")
+    elif args.command == "query":
+        print(json.dumps(index.search(args.text, args.k), indent=2, ensure_ascii=False))
+    elif args.command == "compact":
+        print(f"{index.compact()} rows dropped")
+    print(json.dumps(index.stats()))
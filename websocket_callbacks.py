@@ -0,0 +1,122 @@
+from typing import Any, Dict, List, Optional, Union
+from uuid import UUID
+
+from langchain.callbacks import StdOutCallbackHandler
+from langchain_core.agents import AgentAction, AgentFinish
+
+from event_stream import make_event
+from tracing import SpanTimer, record_span, record_tokens, token_usage
+
+
+class WebSocketCallbackHandler(StdOutCallbackHandler):
+    def __init__(self, event_stream):
+        self.event_stream = event_stream  # 세션별 이벤트 버퍼
+        self.websocket = event_stream.websocket
+        self.session_id = event_stream.session_id
+        self.llm_timer = SpanTimer()  # LLM 호출 시간 측정 (run_id 기준)
+        self.token_counts = {}
+        self.planner_runs = set()  # "planner" 태그가 붙은 LLM 호출의 run_id
+
+    def emit_log(self, message, type="log", agent=None, tool=None, **kwargs):
+        # 웹소켓으로 바로 보내지 않고 세션 버퍼에 구조화된 이벤트로 쌓습니다.
+        # 어느 스레드/루프에서 호출되어도 되며 클라이언트 전송 속도를 기다리지 않습니다.
+        self.event_stream.emit(make_event(type, message, agent=agent, tool=tool))
+
+    async def send_log(self, message, type="log", agent=None, tool=None, **kwargs):
+        self.emit_log(message, type=type, agent=agent, tool=tool, **kwargs)
+
+    def send_token(self, token, agent=None, run_id=None):
+        # 토큰 델타는 이벤트 버퍼에서 프레임 단위로 묶여 전송됩니다.
+        self.event_stream.emit(make_event("token", token, agent=agent, run_id=str(run_id) if run_id else None))
+
+    def start_llm_run(self, run_id, tags):
+        # 플래너 모델은 "planner" 태그로 구분합니다 (main.create_planner_model).
+        # 에이전트 호출은 에이전트별 핸들러가 기록하므로 여기서는 세지 않습니다.
+        if "planner" in (tags or []):
+            self.planner_runs.add(run_id)
+        self.llm_timer.start(run_id)
+
+    def on_llm_start(self, serialized: Dict[str, Any], prompts: List[str], **kwargs: Any) -> Any:
+        self.start_llm_run(kwargs.get("run_id"), kwargs.get("tags"))
+
+    def on_chat_model_start(self, serialized: Dict[str, Any], messages: List[Any], **kwargs: Any) -> Any:
+        self.start_llm_run(kwargs.get("run_id"), kwargs.get("tags"))
+
+    def on_llm_new_token(self, token: str, **kwargs: Any) -> Any:
+        run_id = kwargs.get("run_id")
+        self.token_counts[run_id] = self.token_counts.get(run_id, 0) + 1
+        self.send_token(token, run_id=run_id)
+
+    def on_llm_end(self, response: Any, **kwargs: Any) -> Any:
+        run_id = kwargs.get("run_id")
+        streamed_tokens = self.token_counts.pop(run_id, 0)
+        duration = self.llm_timer.stop(run_id)
+        if run_id not in self.planner_runs:
+            return
+        self.planner_runs.discard(run_id)
+        prompt_tokens, completion_tokens = token_usage(response)
+        completion_tokens = completion_tokens or streamed_tokens
+        record_tokens("planner", prompt_tokens, completion_tokens)
+        if duration is not None:
+            record_span("planner_llm", duration, self.session_id,
+                        prompt_tokens=prompt_tokens, completion_tokens=completion_tokens)
+
+    def on_llm_error(self, error: BaseException, **kwargs: Any) -> Any:
+        run_id = kwargs.get("run_id")
+        self.token_counts.pop(run_id, None)
+        self.llm_timer.stop(run_id)
+        self.planner_runs.discard(run_id)
+
+    async def on_chain_start(self, serialized: Dict[str, Any], inputs: Dict[str, Any], **kwargs: Any) -> Any:
+        await self.send_log(f"Chain started with inputs: {inputs}", type="chain_start")
+
+    async def on_chain_end(self, outputs: Dict[str, Any], **kwargs: Any) -> Any:
+        try:
+            await self.send_log(f"{outputs['kwargs']['messages'][0]['kwargs']['content']}", type="chain_end")
+        except:
+            try:
+                await self.send_log(f"{outputs['text']}", type="chain_end")
+            except:
+                try:
+                    await self.send_log(f"{outputs['return_values']}", type="chain_end")
+                except:
+                    await self.send_log(f"{outputs}", type="chain_end")
+
+    async def on_agent_action(
+        self, action: AgentAction, color: Optional[str] = None, **kwargs: Any
+    ) -> Any:
+        """Run on agent action."""
+        await self.send_log(f"{action.log}", type="agent_action", tool=action.tool)
+
+    def on_agent_finish(self, finish: AgentFinish, color: str | None = None, **kwargs: Any) -> None:
+        return super().on_agent_finish(finish, color, **kwargs)
+    
+    def on_tool_start(self, serialized: Dict[str, Any], input_str: str, *, run_id: UUID, parent_run_id: UUID | None = None, tags: List[str] | None = None, metadata: Dict[str, Any] | None = None, inputs: Dict[str, Any] | None = None, **kwargs: Any) -> Any:
+        return super().on_tool_start(serialized, input_str, run_id=run_id, parent_run_id=parent_run_id, tags=tags, metadata=metadata, inputs=inputs, **kwargs)
+    
+
+    async def on_tool_end(
+        self,
+        output: str,
+        color: Optional[str] = None,
+        observation_prefix: Optional[str] = None,
+        llm_prefix: Optional[str] = None,
+        **kwargs: Any,
+    ) -> None:
+        """If not the final action, print out observation."""
+        if observation_prefix is not None:
+            await self.send_log(f"{observation_prefix}", type="tool_end")
+        await self.send_log(output, type="tool_end")
+
+
+    async def on_text(
+        self,
+        text: str,
+        color: Optional[str] = None,
+        end: str = "",
+        **kwargs: Any,
+    ) -> None:
+        await self.send_log(f"{text}", type="text")
+
+    async def on_chain_error(self, error: Union[Exception, KeyboardInterrupt], **kwargs: Any) -> Any:
+        await self.send_log(f"{error}", type="error")
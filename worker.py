@@ -0,0 +1,164 @@
+"""
+Crew worker for SERVER_MODE=frontend. Takes jobs from the shared queue (JOB_QUEUE_URL),
+runs the chain and publishes the session's events back to the front-end node holding
+the websocket. Start as many workers, on as many nodes, as needed:
+
+    SERVER_MODE=frontend python server.py       # websocket front-end(s)
+    python worker.py                            # worker(s), WORKER_CONCURRENCY crews each
+
+Generated files are written to OUTPUT_DIR, which must be storage shared with the
+front-ends so that `request_file:` finds them.
+"""
+import os
+import threading
+import time
+from collections import defaultdict
+from typing import Any, Dict
+
+from crew_factory import get_chain
+from event_stream import EVENT_FLUSH_INTERVAL, FINAL_EVENT_TYPES, make_event
+from execution_context import CancelToken, ExecutionContext, RunCancelled
+from job_queue import JobQueue, create_job_queue
+from scheduler import MAX_CONCURRENT_CREWS
+from tracing import start_metrics_server
+from websocket_callbacks import WebSocketCallbackHandler
+
+
+WORKER_CONCURRENCY = int(os.getenv("WORKER_CONCURRENCY", str(MAX_CONCURRENT_CREWS)))
+CANCEL_CHECK_INTERVAL = float(os.getenv("CANCEL_CHECK_INTERVAL", "0.5"))
+
+
+class EventPublisher():
+    """Batches events per front-end node and publishes them every `flush_interval` seconds."""
+
+    def __init__(self, job_queue: JobQueue, flush_interval: float = EVENT_FLUSH_INTERVAL):
+        self.job_queue = job_queue
+        self.flush_interval = flush_interval
+        self.pending = defaultdict(list)  # node_id -> messages
+        self.lock = threading.Lock()
+        self.thread = threading.Thread(target=self.run, name="event-publisher", daemon=True)
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def emit(self, node_id: str, message: Dict[str, Any]):
+        with self.lock:
+            self.pending[node_id].append(message)
+
+    def flush(self):
+        with self.lock:
+            pending, self.pending = self.pending, defaultdict(list)
+        for node_id, messages in pending.items():
+            try:
+                self.job_queue.publish(node_id, messages)
+            except Exception as e:
+                print(f"Failed to publish {len(messages)} events: {str(e)}")
+
+    def run(self):
+        while True:
+            time.sleep(self.flush_interval)
+            self.flush()
+
+
+class QueueEventStream():
+    """Stand-in for the websocket EventStream on a worker: events go back through the job queue."""
+
+    websocket = None
+
+    def __init__(self, publisher: EventPublisher, job: Dict[str, Any]):
+        self.publisher = publisher
+        self.job = job
+        self.session_id = job["session_id"]
+
+    def emit(self, event: Dict[str, Any]):
+        self.publisher.emit(self.job["node_id"], {
+            "job_id": self.job["job_id"], "session_id": self.session_id, "event": event})
+        if event.get("type") in FINAL_EVENT_TYPES:
+            self.publisher.flush()
+
+
+def run_job(job_queue: JobQueue, publisher: EventPublisher, job: Dict[str, Any], running: Dict[str, ExecutionContext]):
+    event_stream = QueueEventStream(publisher, job)
+    deadline = job.get("deadline")
+    context = ExecutionContext(
+        session_id=job["session_id"],
+        callback_handler=WebSocketCallbackHandler(event_stream),
+        cancel_token=CancelToken(timeout=max(0.001, deadline - time.time()) if deadline else None),
+    )
+    running[job["job_id"]] = context
+    try:
+        reason = job_queue.cancelled(job["job_id"])
+        if reason:
+            context.cancel(reason)
+        context.cancel_token.raise_if_cancelled()
+
+        result = get_chain().invoke({"topic": job["topic"]}, config=context.to_config())
+        event_stream.emit(make_event("result", f"{result}"))
+    except RunCancelled as e:
+        event_stream.emit(make_event("cancelled", context.cancel_token.reason or str(e)))
+    except Exception as e:
+        print(f"Chain execution failed: {str(e)}")
+        event_stream.emit(make_event("error", f"Chain execution failed: {str(e)}"))
+    finally:
+        running.pop(job["job_id"], None)
+        job_queue.complete(job["job_id"])
+
+
+def watch_cancellations(job_queue: JobQueue, running: Dict[str, ExecutionContext], stop: threading.Event):
+    """Forwards cancellations requested by the front-ends (disconnect, new message) to running jobs."""
+    while not stop.wait(CANCEL_CHECK_INTERVAL):
+        for job_id, context in list(running.items()):
+            try:
+                reason = job_queue.cancelled(job_id)
+            except Exception as e:
+                print(f"Failed to check cancellation of {job_id}: {str(e)}")
+                continue
+            if reason:
+                context.cancel(reason)
+
+
+def work(job_queue: JobQueue, publisher: EventPublisher, running: Dict[str, ExecutionContext], stop: threading.Event):
+    while not stop.is_set():
+        try:
+            job = job_queue.dequeue(timeout=1.0)
+        except Exception as e:
+            print(f"Failed to read from the job queue: {str(e)}")
+            stop.wait(1.0)
+            continue
+        if job is not None:
+            run_job(job_queue, publisher, job, running)
+
+
+def main():
+    job_queue = create_job_queue()
+    publisher = EventPublisher(job_queue).start()
+    running: Dict[str, ExecutionContext] = {}
+    stop = threading.Event()
+
+    try:
+        start_metrics_server()
+    except OSError as e:
+        print(f"Failed to start metrics endpoint: {str(e)}")
+
+    threads = [threading.Thread(target=watch_cancellations, args=(job_queue, running, stop), daemon=True)]
+    threads += [threading.Thread(target=work, args=(job_queue, publisher, running, stop), name=f"crew-{i}")
+                for i in range(WORKER_CONCURRENCY)]
+    for thread in threads:
+        thread.start()
+    print(f"Worker started with {WORKER_CONCURRENCY} crew threads")
+
+    try:
+        while any(thread.is_alive() for thread in threads[1:]):
+            time.sleep(1)
+    except KeyboardInterrupt:
+        stop.set()
+        for context in list(running.values()):
+            context.cancel("worker shutting down")
+        for thread in threads[1:]:
+            thread.join()
+        publisher.flush()
+
+
+if __name__ == "__main__":
+    main()